@@ -0,0 +1,122 @@
+# apps/eval/embedding_server.py
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+import numpy as np
+from django.conf import settings
+
+from apps.inference.batching import MicroBatcher
+from .embeddings import load_model
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """
+    One copy of each embedding model per host, shared by every web/Celery worker.
+
+    Texts from concurrent requests are pooled by a MicroBatcher (grouped by model and runtime)
+    so they go through one `encode` call, however many clients sent them.
+    """
+
+    def __init__(self, max_batch: int = 256, window_ms: float = 5.0):
+        self.batcher = MicroBatcher(self._run_batch, max_batch=max_batch, window_ms=window_ms, name="embeddings")
+        self.requests = 0
+
+    @staticmethod
+    def _run_batch(texts: list[str], params: dict) -> list[np.ndarray]:
+        vecs = load_model(params["model"], params["runtime"]).encode(
+            texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False,
+        )
+        return list(np.asarray(vecs, dtype=np.float32))
+
+    def embed(self, model: str, texts: list[str], runtime: str = "torch") -> np.ndarray:
+        self.requests += 1
+        params = {"model": model, "runtime": runtime}
+        futures = [self.batcher.submit(t, params, (model, runtime)) for t in texts]
+        return np.stack([f.result() for f in futures]).astype(np.float32)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batcher.batches,
+            "texts": self.batcher.items,
+            "mean_batch": self.batcher.mean_batch_size,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """POST /embed {"model", "runtime", "texts"} -> float32 rows (X-Embedding-Dim); GET /health -> stats."""
+    service: EmbeddingService
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, code: int, body: bytes, content_type: str, headers: Optional[dict] = None) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, code: int, payload: dict) -> None:
+        self._send(code, json.dumps(payload).encode(), "application/json")
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._json(404, {"error": "not_found"})
+        self._json(200, {"ok": True, **self.service.stats()})
+
+    def do_POST(self):
+        if self.path != "/embed":
+            return self._json(404, {"error": "not_found"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model, texts, runtime = body["model"], body["texts"], body.get("runtime", "torch")
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("texts must be a list of strings")
+        except (KeyError, ValueError) as e:
+            return self._json(400, {"error": "bad_request", "detail": str(e)})
+        try:
+            vecs = self.service.embed(model, texts, runtime) if texts else np.zeros((0, 0), dtype=np.float32)
+        except Exception as e:
+            logger.exception("Embedding %s texts with %s failed", len(texts), model)
+            return self._json(500, {"error": "embed_failed", "detail": str(e)})
+        self._send(200, vecs.tobytes(), "application/octet-stream", {"X-Embedding-Dim": vecs.shape[1]})
+
+    def address_string(self) -> str:  # unix sockets have no (host, port)
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, fmt, *args):
+        logger.debug("embedding server: " + fmt, *args)
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)  # stale socket from a previous run
+        super().server_bind()
+
+
+def make_server(bind: str, service: Optional[EmbeddingService] = None):
+    """HTTP server on `http://host:port` or `unix:///path/to.sock` (not started)."""
+    service = service or EmbeddingService(
+        max_batch=int(getattr(settings, "EMBEDDING_SERVER_MAX_BATCH", 256)),
+        window_ms=float(getattr(settings, "EMBEDDING_SERVER_WINDOW_MS", 5)),
+    )
+    handler = type("EmbeddingHandler", (_Handler,), {"service": service})
+    url = urlparse(bind)
+    if url.scheme == "unix":
+        return _ThreadingUnixHTTPServer(url.path, handler)
+    server = ThreadingHTTPServer((url.hostname or "127.0.0.1", url.port or 8765), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,305 @@
+# apps/eval/embeddings.py
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from apps.inference.providers import Provider
+
+try:  # POSIX: serialize appends from several web/Celery processes
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev boxes: one process per store
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_DIGEST = 20  # sha1
+
+# fp32 PyTorch, int8 dynamic quantization of the Linear layers (CPU), or ONNX Runtime.
+# scripts/bench_embedder_runtimes.py measures speed and score drift against "torch".
+EMBEDDING_RUNTIMES = ("torch", "int8", "onnx")
+
+_models: dict[tuple[str, str], Provider] = {}
+_models_lock = threading.Lock()
+
+
+def _sentence_transformer(name: str, runtime: str = "torch"):
+    from sentence_transformers import SentenceTransformer  # imports torch + transformers
+
+    if runtime == "onnx":
+        if not (importlib.util.find_spec("onnxruntime") and importlib.util.find_spec("optimum")):
+            raise ImproperlyConfigured('EMBEDDING_RUNTIME="onnx" needs `pip install "sentence-transformers[onnx]"`')
+        return SentenceTransformer(name, backend="onnx", device="cpu")
+    if runtime == "int8":
+        import torch
+        model = SentenceTransformer(name, device="cpu")  # quantized kernels are CPU-only
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(name)
+
+
+def load_model(name: str, runtime: str = "torch"):
+    """One SentenceTransformer per (model name, runtime) for the whole process, loaded on first use."""
+    if runtime not in EMBEDDING_RUNTIMES:
+        raise ImproperlyConfigured(f"Unknown EMBEDDING_RUNTIME {runtime!r}; use one of {EMBEDDING_RUNTIMES}")
+    with _models_lock:
+        if (name, runtime) not in _models:
+            _models[name, runtime] = Provider(
+                f"sentence_transformers:{name}@{runtime}", lambda: _sentence_transformer(name, runtime),
+            )
+        provider = _models[name, runtime]
+    return provider()
+
+
+class EmbeddingServerClient:
+    """
+    Client for `manage.py embedding_server` (apps.eval.embedding_server) at EMBEDDING_SERVER_URL,
+    either http://host:port or unix:///path/to.sock. After a failed call the server is skipped
+    for EMBEDDING_SERVER_RETRY_SECS, so an outage costs one timeout, not one per request.
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0, retry_secs: float = 30.0):
+        import httpx
+
+        self.url = url
+        self.retry_secs = retry_secs
+        self._down_until = 0.0
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self._client = httpx.Client(
+                transport=httpx.HTTPTransport(uds=parsed.path), base_url="http://embedding-server", timeout=timeout,
+            )
+        else:
+            self._client = httpx.Client(base_url=url, timeout=timeout)
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def mark_down(self) -> None:
+        self._down_until = time.monotonic() + self.retry_secs
+
+    def encode(self, model_name: str, texts: list[str], runtime: str = "torch") -> np.ndarray:
+        resp = self._client.post("/embed", json={"model": model_name, "runtime": runtime, "texts": texts})
+        resp.raise_for_status()
+        dim = int(resp.headers["X-Embedding-Dim"])
+        return np.frombuffer(resp.content, dtype=np.float32).reshape(len(texts), dim)
+
+
+_server_client: Optional[EmbeddingServerClient] = None
+_server_client_lock = threading.Lock()
+
+
+def embedding_server_client() -> Optional[EmbeddingServerClient]:
+    """Shared client when EMBEDDING_SERVER_URL is set, else None (embed in-process)."""
+    global _server_client
+    url = getattr(settings, "EMBEDDING_SERVER_URL", "")
+    if not url:
+        return None
+    with _server_client_lock:
+        if _server_client is None or _server_client.url != url:
+            _server_client = EmbeddingServerClient(
+                url,
+                timeout=float(getattr(settings, "EMBEDDING_SERVER_TIMEOUT_SECS", 30)),
+                retry_secs=float(getattr(settings, "EMBEDDING_SERVER_RETRY_SECS", 30)),
+            )
+        return _server_client
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """
+    Append-only on-disk embedding cache for one model.
+
+    <dir>/vectors.f32 holds float32 rows, read through np.memmap, and <dir>/keys.bin holds the
+    sha1 of each row's text in the same order. Writers append vectors before keys under an
+    exclusive file lock, so readers never see a key without its vector. Rows added by other
+    processes are picked up on the next lookup.
+    """
+
+    def __init__(self, root: Path | str, model_name: str):
+        self.model_name = model_name
+        self.dir = Path(root) / re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+        self.dim: Optional[int] = None
+        self._index: dict[bytes, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _keys_path(self) -> Path:
+        return self.dir / "keys.bin"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.dir / "vectors.f32"
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _refresh(self) -> None:
+        """Caller holds self._lock."""
+        if not self._keys_path.exists():
+            return
+        rows = self._keys_path.stat().st_size // _DIGEST
+        known = len(self._vectors) if self._vectors is not None else 0
+        if rows == known:
+            return
+        if self.dim is None:
+            self.dim = int(json.loads((self.dir / "meta.json").read_text())["dim"])
+        with open(self._keys_path, "rb") as f:
+            f.seek(known * _DIGEST)
+            data = f.read((rows - known) * _DIGEST)
+        for i in range(len(data) // _DIGEST):
+            self._index[data[i * _DIGEST:(i + 1) * _DIGEST]] = known + i
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def get(self, digests: list[bytes]) -> dict[bytes, np.ndarray]:
+        with self._lock:
+            self._refresh()
+            rows = {d: self._index[d] for d in digests if d in self._index}
+            if not rows:
+                return {}
+            block = np.asarray(self._vectors[list(rows.values())])  # one gather from the memmap
+        return dict(zip(rows, block))
+
+    def put(self, digests: list[bytes], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.dir / "lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                meta = self.dir / "meta.json"
+                if not meta.exists():
+                    meta.write_text(json.dumps({"model": self.model_name, "dim": int(vectors.shape[1])}))
+                self._refresh()
+                self.dim = self.dim or int(vectors.shape[1])
+                if vectors.shape[1] != self.dim:
+                    raise ValueError(f"{self.dir} holds {self.dim}-d vectors, got {vectors.shape[1]}-d")
+                rows = self._keys_path.stat().st_size // _DIGEST if self._keys_path.exists() else 0
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(rows * self.dim * 4)  # drop vectors of a writer that died before its keys
+                    f.write(vectors.tobytes())
+                with open(self._keys_path, "ab") as f:
+                    f.write(b"".join(digests))
+                self._refresh()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class Embedder:
+    """
+    Normalized sentence embeddings for a list of texts.
+
+    Each distinct text is embedded once: hits come from the EmbeddingStore, and the misses are
+    encoded together (by the embedding server if configured, else in batches of
+    EMBEDDING_BATCH_SIZE in-process) and then appended to the store.
+    """
+
+    def __init__(self, model_name: str, store: Optional[EmbeddingStore] = None, batch_size: int = 128,
+                 runtime: str = "torch"):
+        self.model_name = model_name
+        self.runtime = runtime
+        self.store = store
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """(len(texts), dim) float32 matrix aligned with `texts`, rows L2-normalized."""
+        unique = list(dict.fromkeys(texts))
+        if not unique:
+            return np.zeros((0, 0), dtype=np.float32)
+        digests = [text_digest(t) for t in unique]
+        cached = self.store.get(digests) if self.store is not None else {}
+        missing = [i for i, d in enumerate(digests) if d not in cached]
+        self.hits += len(unique) - len(missing)
+        self.misses += len(missing)
+
+        vectors: dict[bytes, np.ndarray] = dict(cached)
+        if missing:
+            new = self._encode([unique[i] for i in missing])
+            if self.store is not None:
+                try:
+                    self.store.put([digests[i] for i in missing], new)
+                except Exception:
+                    logger.exception("Could not persist %s embeddings (non-fatal).", len(missing))
+            vectors.update(zip((digests[i] for i in missing), new))
+
+        position = {t: i for i, t in enumerate(unique)}
+        matrix = np.stack([vectors[d] for d in digests])
+        return matrix[[position[t] for t in texts]]
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        """The shared embedding server when one is configured and up, else this process's own model copy."""
+        client = embedding_server_client()
+        if client is not None and client.available:
+            try:
+                return client.encode(self.model_name, texts, self.runtime)
+            except Exception as e:
+                logger.warning("Embedding server %s failed (%s); embedding in-process.", client.url, e)
+                client.mark_down()
+        return load_model(self.model_name, self.runtime).encode(
+            texts, batch_size=self.batch_size,
+            normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False,
+        ).astype(np.float32)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "runtime": self.runtime,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stored": len(self.store) if self.store is not None else None,
+            "path": str(self.store.dir) if self.store is not None else None,
+        }
+
+
+_embedders: dict[tuple[str, str], Embedder] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(model_name: Optional[str] = None, runtime: Optional[str] = None) -> Embedder:
+    """
+    Shared Embedder for `model_name` (default EMBEDDING_MODEL) on `runtime` (default
+    EMBEDDING_RUNTIME). EMBEDDING_CACHE_DIR="" disables the store. Non-fp32 runtimes get their
+    own store, so their vectors never mix with the baseline's.
+    """
+    name = model_name or getattr(settings, "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    runtime = runtime or getattr(settings, "EMBEDDING_RUNTIME", "torch")
+    with _embedders_lock:
+        if (name, runtime) not in _embedders:
+            root = getattr(settings, "EMBEDDING_CACHE_DIR", "")
+            store_key = name if runtime == "torch" else f"{name}@{runtime}"
+            _embedders[name, runtime] = Embedder(
+                name,
+                store=EmbeddingStore(root, store_key) if root else None,
+                batch_size=int(getattr(settings, "EMBEDDING_BATCH_SIZE", 128)),
+                runtime=runtime,
+            )
+        return _embedders[name, runtime]
+
+
+def cosine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """All-pairs cosine of L2-normalized rows: (len(a), len(b))."""
+    return a @ b.T
+
+
+def paired_cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine of a[i] with b[i] for every i."""
+    return np.einsum("ij,ij->i", a, b)
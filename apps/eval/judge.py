@@ -1,23 +1,24 @@
 # apps/eval/judge.py
 from __future__ import annotations
+from functools import lru_cache
 from typing import Dict, Any
+import hashlib
 import json
 
 from django.conf import settings
-from apps.inference.backends import OllamaBackend
-
-PROMPT_TEMPLATE = """
+from apps.inference.router import cache_namespace, generate_shared, get_ollama
+from apps.inference.prompts import PrefixedPrompt
+from apps.models_registry.models import ModelBackend
+from .models import JudgeEvaluation
+
+# The rubric is identical for every call and comes first; only the REFERENCE/CANDIDATE
+# suffix varies, so the judge backend can reuse the rubric's KV cache across rows.
+PROMPT_PREFIX = """
 You are a strict evaluator.
-Compare the CANDIDATE answer to the REFERENCE answer and assign numeric scores from 1 to 5 for each metric.
+Compare the CANDIDATE answer to the REFERENCE answer given at the end and assign numeric scores from 1 to 5 for each metric.
 
 Return ONLY a JSON object in this exact format (no explanations, no text, no code fences):
-{{"correctness": 1-5, "relevance": 1-5, "fluency": 1-5, "overall": 1-5}}
-
-REFERENCE:
-{reference}
-
-CANDIDATE:
-{candidate}
+{"correctness": 1-5, "relevance": 1-5, "fluency": 1-5, "overall": 1-5}
 
 SCORING CRITERIA:
 
@@ -51,12 +52,88 @@ Compute using the following guideline:
 - If correctness = 1 or relevance = 1, set overall = 1.
 
 INSTRUCTIONS:
-1. Read REFERENCE and CANDIDATE carefully.
+1. Read REFERENCE and CANDIDATE below carefully.
 2. Score each metric (1–5) according to the rubric above.
 3. Compute overall using the given formula.
 4. Return ONLY the JSON object — no commentary, no extra text.
 
 """
+# Stored with every JudgeEvaluation; bump it when the rubric or suffix changes so
+# `batch_judge --resume` re-scores rows judged with the old prompt.
+PROMPT_VERSION = "v2"
+
+PROMPT_SUFFIX = """REFERENCE:
+{reference}
+
+CANDIDATE:
+{candidate}
+"""
+
+def reference_hash(reference: str) -> str:
+    """sha256 of the reference as the judge sees it (stripped), for JudgeEvaluation.reference_hash."""
+    return hashlib.sha256(reference.strip().encode("utf-8")).hexdigest()
+
+@lru_cache(maxsize=None)
+def _judge_fields() -> frozenset:
+    """Column names of JudgeEvaluation, introspected once per process."""
+    try:
+        return frozenset(f.name for f in JudgeEvaluation._meta.concrete_fields)
+    except Exception:
+        return frozenset()
+
+def _judge_model_has_scores_field() -> bool:
+    """Detect if JudgeEvaluation has a JSONField named 'scores'."""
+    return "scores" in _judge_fields()
+
+def judge_row(
+    *,
+    generation_id: int,
+    reference: str,
+    judge_model: str,
+    scores: Dict[str, Any],
+    prompt_version: str | None = None,
+    raw_text: str | None = None,
+    row_status: str | None = None,
+) -> JudgeEvaluation:
+    """
+    Build (unsaved) a JudgeEvaluation row in a way that works for either schema:
+    - JSONField: scores
+    - or explicit numeric columns: correctness/relevance/fluency/overall
+    prompt_version (default: the current judge.PROMPT_VERSION) / reference_hash / status / raw_text
+    are only set when the model has those columns.
+    """
+    fields = _judge_fields()
+
+    base_kwargs = dict(
+        generation_id=generation_id,
+        reference=reference,
+        judge_model=judge_model,
+    )
+    optional = {
+        "prompt_version": prompt_version or PROMPT_VERSION,
+        "reference_hash": reference_hash(reference),
+        "status": row_status,
+        "raw_text": raw_text,
+    }
+    base_kwargs.update({k: v for k, v in optional.items() if v is not None and k in fields})
+
+    if "scores" in fields:
+        return JudgeEvaluation(scores=scores, **base_kwargs)
+
+    # Fallback to explicit numeric columns
+    return JudgeEvaluation(
+        correctness=float(scores.get("correctness", 0)),
+        relevance=float(scores.get("relevance", 0)),
+        fluency=float(scores.get("fluency", 0)),
+        overall=float(scores.get("overall", 0)),
+        **base_kwargs,
+    )
+
+def judge_concurrency(requested: int | None = None) -> int:
+    """Judge calls in flight for one bulk job: requested (or JUDGE_CONCURRENCY), capped by JUDGE_MAX_CONCURRENCY."""
+    n = requested or getattr(settings, "JUDGE_CONCURRENCY", 4)
+    return max(1, min(int(n), int(getattr(settings, "JUDGE_MAX_CONCURRENCY", 16))))
+
 def _extract_json(text: str) -> Dict[str, Any]:
     """
     Pull the first {...} JSON-looking block from the model output and parse it.
@@ -111,28 +188,32 @@ def _coerce_scores(d: Dict[str, Any]) -> Dict[str, float]:
         out[k] = round(out[k], 1)
     return out
 
-def judge_with_mistral(candidate: str, reference: str, *, judge_model: str | None = None) -> Dict[str, Any]:
+def judge_with_mistral(candidate: str, reference: str, *, judge_model: str | None = None,
+                       use_cache: bool = True) -> Dict[str, Any]:
     """
     Evaluate candidate vs reference using an Ollama model (default: settings.JUDGE_MODEL_OLLAMA or 'mistral:7b').
     Returns either a dict of scores {correctness, relevance, fluency, overall} or {"error": "...", "raw": "..."}.
+    The judge runs at temperature 0, so identical (model, prompt) pairs are served from the
+    generation cache, and concurrent ones share one call, unless use_cache=False.
     """
     model = judge_model or getattr(settings, "JUDGE_MODEL_OLLAMA", "mistral:7b")
-    client = OllamaBackend()
+    client = get_ollama()  # shared instance: pooled connections and replica routing state
 
-    prompt = PROMPT_TEMPLATE.format(
+    prompt = PrefixedPrompt(PROMPT_PREFIX, PROMPT_SUFFIX.format(
         reference=reference.strip(),
         candidate=candidate.strip(),
-    )
-
-    res = client.generate(
-        model,
-        prompt,
-        {
-            "temperature": 0.0,   # reduce drift
-            "top_p": 0.9,
-            "top_k": 50,
-            "max_new_tokens": 128,
-        },
+    ))
+
+    params = {
+        "temperature": 0.0,   # reduce drift
+        "top_p": 0.9,
+        "top_k": 50,
+        "max_new_tokens": 128,
+    }
+    # Same namespace as generate_for_model for an endpoint-less Ollama model, so the two share entries.
+    res = generate_shared(
+        cache_namespace(ModelBackend.OLLAMA), model, prompt, params,
+        lambda: client.generate(model, prompt, params), use_cache=use_cache,
     )
 
     try:
@@ -1,38 +1,88 @@
 # apps/eval/management/commands/batch_judge.py
+import time
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from apps.models_registry.models import Generation
-from apps.eval.judge import judge_with_mistral
+
+from apps.history.models import Generation
+from apps.inference.concurrency import bounded_map
+from apps.eval.judge import PROMPT_VERSION, judge_concurrency, judge_row, judge_with_mistral, reference_hash
 from apps.eval.models import JudgeEvaluation
 
+
 class Command(BaseCommand):
-    help = "Batch judge generations"
+    help = "Judge stored generations against one reference, concurrently and resumably"
 
     def add_arguments(self, parser):
         parser.add_argument("--ref", required=True)
-        parser.add_argument("--model", default="mistral:7b")
+        parser.add_argument("--model", default="", help="judge model (default: JUDGE_MODEL_OLLAMA)")
         parser.add_argument("--since-id", type=int)
         parser.add_argument("--limit", type=int)
+        parser.add_argument("--workers", type=int, default=0,
+                            help="judge calls in flight (default: JUDGE_CONCURRENCY, capped by JUDGE_MAX_CONCURRENCY)")
+        parser.add_argument("--resume", action="store_true",
+                            help="skip generations already judged ok with this judge model, prompt version and reference")
+        parser.add_argument("--prompt-version", default=PROMPT_VERSION)
+        parser.add_argument("--batch-size", type=int, default=200, help="rows per bulk INSERT (and progress line)")
+        parser.add_argument("--no-cache", action="store_true", help="bypass the generation cache")
 
     def handle(self, *args, **opts):
-        qs = Generation.objects.order_by("id")
+        judge_model = opts["model"] or getattr(settings, "JUDGE_MODEL_OLLAMA", "mistral:7b")
+        reference, prompt_version = opts["ref"], opts["prompt_version"]
+        workers = judge_concurrency(opts["workers"])
+        batch_size = max(1, opts["batch_size"])
+
+        qs = Generation.objects.only("id", "output").order_by("id")
         if opts.get("since_id"):
             qs = qs.filter(id__gt=opts["since_id"])
+        if opts["resume"]:
+            done = JudgeEvaluation.objects.filter(
+                judge_model=judge_model, prompt_version=prompt_version,
+                reference_hash=reference_hash(reference), status="ok",
+            ).values("generation_id")
+            qs = qs.exclude(id__in=done)
         if opts.get("limit"):
             qs = qs[:opts["limit"]]
+        total = qs.count()
+        self.stdout.write(f"judging {total} generations with {judge_model} (prompt {prompt_version}), {workers} workers")
+
+        def work(gen):
+            try:
+                return gen.id, judge_with_mistral(gen.output or "", reference, judge_model=judge_model,
+                                                  use_cache=not opts["no_cache"])
+            except Exception as e:
+                return gen.id, {"error": str(e)}
+
+        t0 = time.perf_counter()
+        rows, judged, errors = [], 0, 0
+
+        def flush():
+            nonlocal rows
+            JudgeEvaluation.objects.bulk_create(rows)
+            rows = []
+            elapsed = time.perf_counter() - t0
+            rate = judged / elapsed if elapsed else 0.0
+            eta = (total - judged) / rate if rate else 0.0
+            self.stdout.write(f"{judged}/{total} judged, {errors} errors, {rate:.2f}/s, "
+                              f"elapsed {elapsed:.0f}s, eta {eta:.0f}s")
 
-        for gen in qs.iterator(chunk_size=100):
-            scores = judge_with_mistral(gen.output or "", opts["ref"], judge_model=opts["model"])
-            status = "ok" if "error" not in scores else scores["error"]
-            JudgeEvaluation.objects.create(
-                generation=gen,
-                reference=opts["ref"],
-                correctness=scores.get("correctness", 0),
-                relevance=scores.get("relevance", 0),
-                fluency=scores.get("fluency", 0),
-                overall=scores.get("overall", 0),
-                judge_model=opts["model"],
-                prompt_version="v1",
-                raw_text=scores.get("raw", ""),
-                status=status,
-            )
-            self.stdout.write(f"gen {gen.id}: {status}")
+        try:
+            for gen_id, scores in bounded_map(work, qs.iterator(chunk_size=batch_size), concurrency=workers):
+                ok = isinstance(scores, dict) and "error" not in scores
+                judged += 1
+                errors += not ok
+                rows.append(judge_row(
+                    generation_id=gen_id,
+                    reference=reference,
+                    judge_model=judge_model,
+                    scores=(scores if isinstance(scores, dict) else {}),
+                    prompt_version=prompt_version,
+                    raw_text=(scores.get("raw") if isinstance(scores, dict) else None),
+                    row_status="ok" if ok else "error",
+                ))
+                if len(rows) >= batch_size:
+                    flush()
+        finally:
+            # Interrupted (Ctrl-C, judge down): keep what was judged so --resume starts after it.
+            if rows:
+                flush()
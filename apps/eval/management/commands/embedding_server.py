@@ -0,0 +1,30 @@
+# apps/eval/management/commands/embedding_server.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.eval.embedding_server import make_server
+from apps.eval.embeddings import load_model
+
+
+class Command(BaseCommand):
+    help = "Serve sentence embeddings to every worker on this host (see EMBEDDING_SERVER_URL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default="", help="unix:///path.sock or http://127.0.0.1:8765 "
+                                                       "(default: EMBEDDING_SERVER_URL)")
+        parser.add_argument("--model", action="append", dest="models", help="model to load up front "
+                                                                             "(repeatable; default: EMBEDDING_MODEL)")
+
+    def handle(self, *args, **opts):
+        bind = opts["bind"] or settings.EMBEDDING_SERVER_URL or "http://127.0.0.1:8765"
+        for name in opts["models"] or [settings.EMBEDDING_MODEL]:
+            load_model(name, settings.EMBEDDING_RUNTIME)
+            self.stdout.write(f"loaded {name} ({settings.EMBEDDING_RUNTIME})")
+        server = make_server(bind)
+        self.stdout.write(f"embedding server listening on {bind}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -1,29 +1,120 @@
-import sacrebleu
-from rouge_score import rouge_scorer
-from sentence_transformers import SentenceTransformer
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+from django.conf import settings
+
+from apps.inference.providers import Provider
+from .embeddings import get_embedder, paired_cosine
+
+logger = logging.getLogger(__name__)
+
+
+def _make_rouge():
+    from rouge_score import rouge_scorer  # pulls in nltk + scipy, about 1.5 s
+    return rouge_scorer.RougeScorer(['rouge1','rougeLsum'], use_stemmer=True)
 
-_EMB = None
-def _embedder():
-    global _EMB
-    if _EMB is None:
-        _EMB = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-    return _EMB
+def _make_bleu():
+    import sacrebleu
+    return sacrebleu.metrics.BLEU()
+
+# Built on first use, once per process (and once per pool worker): importing the libraries and
+# building the stemmer/tokenizers is the expensive part, scoring a pair is cheap.
+_rouge_scorer = Provider("rouge_score", _make_rouge)
+_bleu_metric = Provider("sacrebleu", _make_bleu)
 
 def compute_bleu(candidate: str, reference: str) -> float:
     """Compute BLEU score normalized to [0, 1]."""
-    bleu = sacrebleu.corpus_bleu([candidate], [[reference]])
-    return bleu.score / 100.0
+    return _bleu_metric().corpus_score([candidate], [[reference]]).score / 100.0
 
 def compute_rouge(candidate: str, reference: str) -> dict:
-    scorer = rouge_scorer.RougeScorer(['rouge1','rougeLsum'], use_stemmer=True)
-    r = scorer.score(reference, candidate)
+    r = _rouge_scorer().score(reference, candidate)
     return {"rouge1": r["rouge1"].fmeasure, "rougeL": r["rougeLsum"].fmeasure}
 
 def compute_cosine(candidate: str, reference: str) -> float:
-    m = _embedder()
-    emb = m.encode([candidate, reference], normalize_embeddings=True)
-    return float(np.dot(emb[0], emb[1]))
+    emb = get_embedder().encode([candidate, reference])  # cached by text, see embeddings.Embedder
+    return float(emb[0] @ emb[1])
+
+# --- batch forms: same scores as the single-pair functions ---
+def compute_bleu_batch(candidates: list[str], references: list[str]) -> list[float]:
+    return [compute_bleu(c, r) for c, r in zip(candidates, references)]
+
+def compute_rouge_batch(candidates: list[str], references: list[str]) -> list[dict]:
+    return [compute_rouge(c, r) for c, r in zip(candidates, references)]
+
+def compute_cosine_batch(candidates: list[str], references: list[str]) -> list[float]:
+    """Embed all distinct texts once (cached, batched), then row-wise dot products."""
+    if not candidates:
+        return []
+    emb = get_embedder().encode([*candidates, *references])
+    return paired_cosine(emb[:len(candidates)], emb[len(candidates):]).tolist()
+
+# --- multi-core BLEU/ROUGE for large jobs ---
+def lexical_scores(candidates: list[str], references: list[str], want) -> dict:
+    """Aligned float arrays {"bleu", "rouge1", "rougeL"} for the metrics in `want`, in this process."""
+    out = {}
+    if "bleu" in want:
+        out["bleu"] = np.array(compute_bleu_batch(candidates, references), dtype=float)
+    if "rouge" in want:
+        rouge = compute_rouge_batch(candidates, references)
+        out["rouge1"] = np.array([r["rouge1"] for r in rouge], dtype=float)
+        out["rougeL"] = np.array([r["rougeL"] for r in rouge], dtype=float)
+    return out
+
+def _score_shard(shard: tuple) -> dict:
+    return lexical_scores(*shard)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def metric_workers() -> int:
+    return int(getattr(settings, "METRICS_WORKERS", 0)) or os.cpu_count() or 1
+
+def _metric_pool():
+    """
+    Long-lived worker processes for BLEU/ROUGE, or None when scoring should stay in-process:
+    one worker configured, or we are ourselves a daemon (Celery prefork child) and cannot fork.
+    """
+    global _pool
+    if metric_workers() < 2 or multiprocessing.current_process().daemon:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the web/Celery parent runs threads (and maybe torch), which fork does not copy safely
+            _pool = ProcessPoolExecutor(max_workers=metric_workers(), mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_metric_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def score_lexical(candidates: list[str], references: list[str], want) -> dict:
+    """
+    lexical_scores(), sharded across the metric pool once a job has METRICS_POOL_MIN_PAIRS
+    pairs. Shards are contiguous slices, so the concatenated arrays stay aligned with the input.
+    """
+    want = tuple(m for m in ("bleu", "rouge") if m in want)
+    n = len(candidates)
+    pool = _metric_pool() if want and n >= int(getattr(settings, "METRICS_POOL_MIN_PAIRS", 500)) else None
+    if pool is None:
+        return lexical_scores(candidates, references, want)
+
+    size = -(-n // (metric_workers() * 4))  # a few shards per worker to even out stragglers
+    shards = [(candidates[i:i + size], references[i:i + size], want) for i in range(0, n, size)]
+    try:
+        parts = list(pool.map(_score_shard, shards))
+    except Exception:
+        logger.exception("Metric pool failed; scoring %s pairs in-process.", n)
+        shutdown_metric_pool()
+        return lexical_scores(candidates, references, want)
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
 # --- aliases expected by the views ---
 def bleu(candidate: str, reference: str) -> float:
     return compute_bleu(candidate, reference)
@@ -33,3 +124,10 @@ def rouge(candidate: str, reference: str) -> dict:
 
 def cosine(candidate: str, reference: str) -> float:
     return compute_cosine(candidate, reference)
+
+def metrics_batch(candidates: list[str], references: list[str], want) -> list[dict]:
+    """{"bleu", "rouge1", "rougeL", "cosine"} per pair, for the metrics in `want`."""
+    columns = {k: v.tolist() for k, v in score_lexical(candidates, references, want).items()}
+    if "cosine" in want:
+        columns["cosine"] = compute_cosine_batch(candidates, references)
+    return [{k: col[i] for k, col in columns.items()} for i in range(len(candidates))]
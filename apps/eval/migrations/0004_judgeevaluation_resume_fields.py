@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eval', '0003_judgeevaluation_eval_judgee_judge_m_7b9d37_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='judgeevaluation',
+            name='prompt_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='judgeevaluation',
+            name='raw_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='judgeevaluation',
+            name='reference_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='judgeevaluation',
+            name='status',
+            field=models.CharField(default='ok', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='judgeevaluation',
+            index=models.Index(fields=['judge_model', 'prompt_version', 'reference_hash', 'generation_id'], name='eval_judgee_judge_m_e6defd_idx'),
+        ),
+    ]
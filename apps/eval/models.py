@@ -11,7 +11,15 @@ class JudgeEvaluation(models.Model):
     reference     = models.TextField()
     judge_model   = models.CharField(max_length=100, default="mistral:7b")
     scores        = models.JSONField()                    # {"correctness":..., "relevance":..., "fluency":..., "overall":...}
+    prompt_version = models.CharField(max_length=32, blank=True, default="")   # apps.eval.judge.PROMPT_VERSION
+    reference_hash = models.CharField(max_length=64, blank=True, default="")   # apps.eval.judge.reference_hash(reference)
+    status        = models.CharField(max_length=32, default="ok")            # "ok" or "error" (scores then holds the error)
+    raw_text      = models.TextField(blank=True, default="")                 # judge output that failed to parse
     created_at    = models.DateTimeField(auto_now_add=True)
     class Meta:
-        indexes = [models.Index(fields=["judge_model", "created_at"])]
+        indexes = [
+            models.Index(fields=["judge_model", "created_at"]),
+            # batch_judge --resume: "already judged with this judge, prompt and reference?"
+            models.Index(fields=["judge_model", "prompt_version", "reference_hash", "generation_id"]),
+        ]
 
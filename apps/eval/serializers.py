@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 class EvaluateRequestSerializer(serializers.Serializer):
@@ -9,11 +10,57 @@ class EvaluateRequestSerializer(serializers.Serializer):
     )
 
 
+class EvaluateBatchItemSerializer(serializers.Serializer):
+    generation_id = serializers.IntegerField()
+    reference     = serializers.CharField()
+
+
+class EvaluateBatchRequestSerializer(serializers.Serializer):
+    items   = EvaluateBatchItemSerializer(many=True, allow_empty=False)
+    metrics = serializers.ListField(
+        child=serializers.ChoiceField(choices=["bleu", "rouge", "cosine"]),
+        allow_empty=False
+    )
+
+    def validate_items(self, items):
+        limit = getattr(settings, "EVALUATE_BATCH_MAX_ITEMS", 5000)
+        if len(items) > limit:
+            raise serializers.ValidationError(f"At most {limit} items per batch.")
+        return items
+
+
 class JudgeRequestSerializer(serializers.Serializer):
     generation_id = serializers.IntegerField()
     reference = serializers.CharField()
     judge_model = serializers.CharField(required=False, allow_blank=True)
     candidate = serializers.CharField(required=False, allow_blank=True)  # <-- NEW
+    use_cache = serializers.BooleanField(required=False, default=True)  # false = re-run the judge
+
+class JudgeBatchItemSerializer(serializers.Serializer):
+    generation_id = serializers.IntegerField(required=False, allow_null=True)  # rows are saved only for stored generations
+    reference = serializers.CharField()
+    candidate = serializers.CharField(required=False, allow_blank=True)  # default: the generation's output
+
+
+class JudgeBatchRequestSerializer(serializers.Serializer):
+    items = JudgeBatchItemSerializer(many=True, allow_empty=False)
+    judge_model = serializers.CharField(required=False, allow_blank=True)
+    concurrency = serializers.IntegerField(required=False, min_value=1)  # capped by JUDGE_MAX_CONCURRENCY
+    use_cache = serializers.BooleanField(required=False, default=True)
+
+    def validate_items(self, items):
+        limit = getattr(settings, "JUDGE_BATCH_MAX_ITEMS", 1000)
+        if len(items) > limit:
+            raise serializers.ValidationError(f"At most {limit} items per batch.")
+        return items
+
+class RejudgeRequestSerializer(serializers.Serializer):
+    generation_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    reference = serializers.CharField()
+    judge_model = serializers.CharField(required=False, allow_blank=True)
+    prompt_version = serializers.CharField(required=False, allow_blank=True)
+    concurrency = serializers.IntegerField(required=False, min_value=1)  # capped by JUDGE_MAX_CONCURRENCY
+    use_cache = serializers.BooleanField(required=False, default=True)
 
 class CombinedEvalSerializer(serializers.Serializer):
     generation_id = serializers.IntegerField()
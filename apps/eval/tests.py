@@ -1,8 +1,36 @@
+import importlib.util
 import json
-from unittest.mock import patch
-from django.test import TestCase
-from apps.inference.models import Generation
-from apps.eval.judge import judge_with_mistral
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+
+import tempfile
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from apps.inference.backends import GenResult
+from apps.inference.models import Generation, GenerationCacheEntry
+from apps.inference.prompts import PrefixedPrompt
+from apps.inference.router import generate_for_model
+from apps.models_registry.models import HFModel, ModelBackend
+from apps.eval.judge import PROMPT_PREFIX, PROMPT_SUFFIX, judge_with_mistral
+from apps.eval.embeddings import Embedder, EmbeddingStore, cosine_matrix, embedding_server_client, get_embedder
+
+
+class FakeModel:
+    """Stands in for a SentenceTransformer: deterministic 2-d vectors, counts encoded texts."""
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=64, **kwargs):
+        self.encoded.extend(texts)
+        vecs = np.array([[len(t), 1.0] for t in texts])
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
 
 class JudgeSmokeTest(TestCase):
     def setUp(self):
@@ -23,3 +51,355 @@ class JudgeSmokeTest(TestCase):
         self.assertEqual(scores["relevance"], 9.0)
         self.assertEqual(scores["fluency"], 8.5)
         self.assertEqual(scores["overall"], 9.0)
+
+    def test_judge_shares_cache_entries_with_the_router(self):
+        model = HFModel.objects.create(slug="mistral", display_name="Mistral", repo_id="mistral:7b",
+                                       backend=ModelBackend.OLLAMA, is_active=True)
+        reply = GenResult(text='{"correctness": 4, "relevance": 4, "fluency": 4, "overall": 4}', latency_ms=5)
+        with patch("apps.inference.backends.OllamaBackend.generate", return_value=reply) as gen:
+            judged = judge_with_mistral("cand", "ref", judge_model="mistral:7b")
+            prompt = PrefixedPrompt(PROMPT_PREFIX, PROMPT_SUFFIX.format(reference="ref", candidate="cand"))
+            routed = generate_for_model(model, prompt, {
+                "temperature": 0.0, "top_p": 0.9, "top_k": 50, "max_new_tokens": 128})
+        self.assertEqual(gen.call_count, 1)
+        self.assertTrue(routed.cached)
+        self.assertEqual(judged["overall"], 4.0)
+        self.assertEqual(GenerationCacheEntry.objects.count(), 1)
+
+    @override_settings(GENERATION_CACHE_ENABLED=False)  # leave only single-flight to dedupe
+    def test_identical_concurrent_judge_calls_share_one_backend_call(self):
+        def slow(*args):
+            threading.Event().wait(0.1)
+            return GenResult(text='{"overall": 4}', latency_ms=100)
+
+        with patch("apps.inference.backends.OllamaBackend.generate", side_effect=slow) as gen, \
+                ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda _: judge_with_mistral("cand", "ref"), range(4)))
+        self.assertEqual(gen.call_count, 1)
+        self.assertEqual([r["overall"] for r in results], [4.0] * 4)
+
+
+class EvaluateBatchTests(APITestCase):
+    def setUp(self):
+        from apps.history.models import Generation as HistoryGeneration
+        self.gens = HistoryGeneration.objects.bulk_create([
+            HistoryGeneration(model_slug="m", prompt=f"p{i}", output=text)
+            for i, text in enumerate(["the cat sat on the mat", "paris is in france"])
+        ])
+
+    def test_batch_matches_single_pair_metrics_and_saves_once(self):
+        from apps.eval.metrics import bleu, rouge
+        from apps.eval.models import Evaluation
+
+        items = [
+            {"generation_id": self.gens[0].id, "reference": "the cat is on the mat"},
+            {"generation_id": 999999, "reference": "missing"},
+            {"generation_id": self.gens[1].id, "reference": "the cat is on the mat"},
+        ]
+        with patch("apps.eval.embeddings.load_model", return_value=FakeModel()), \
+                patch("apps.eval.metrics.get_embedder", return_value=Embedder("fake")), \
+                patch.object(Evaluation.objects, "bulk_create", wraps=Evaluation.objects.bulk_create) as bulk:
+            resp = self.client.post(reverse("evaluate_batch"), {"items": items, "metrics": ["bleu", "rouge", "cosine"]}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        results = resp.data["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2])
+        self.assertEqual(results[1]["error"], "not_found")
+        self.assertEqual(resp.data["stats"]["evaluated"], 2)
+        for r, gen in ((results[0], self.gens[0]), (results[2], self.gens[1])):
+            self.assertAlmostEqual(r["metrics"]["bleu"], bleu(gen.output, "the cat is on the mat"))
+            self.assertAlmostEqual(r["metrics"]["rougeL"], rouge(gen.output, "the cat is on the mat")["rougeL"])
+            self.assertIn("cosine", r["metrics"])
+            self.assertEqual(Evaluation.objects.get(pk=r["evaluation_id"]).metrics, r["metrics"])
+        bulk.assert_called_once()
+
+
+class RejudgeTests(APITestCase):
+    def setUp(self):
+        from apps.history.models import Generation as HistoryGeneration
+        self.gens = HistoryGeneration.objects.bulk_create([
+            HistoryGeneration(model_slug="m", prompt=f"p{i}", output=f"answer {i}") for i in range(5)
+        ])
+
+    def test_loads_once_judges_concurrently_and_inserts_once(self):
+        from apps.eval import judge
+        from apps.eval.models import JudgeEvaluation
+
+        in_flight, peak, lock = [0], [0], threading.Lock()
+        release = threading.Event()
+
+        def fake_judge(candidate, reference, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+                if in_flight[0] == 3:
+                    release.set()
+            release.wait(2)
+            with lock:
+                in_flight[0] -= 1
+            if candidate == "answer 1":
+                return {"error": "parse_failed", "raw": "??"}
+            return {"overall": 8.0, "candidate": candidate}
+
+        ids = [g.id for g in self.gens] + [999999]
+        judge._judge_fields.cache_clear()
+        with patch("apps.eval.views.judge_with_mistral", side_effect=fake_judge), \
+                patch.object(JudgeEvaluation.objects, "bulk_create", wraps=JudgeEvaluation.objects.bulk_create) as bulk, \
+                self.assertNumQueries(2):  # one SELECT for the generations, one INSERT
+            resp = self.client.post(reverse("rejudge"), {"generation_ids": ids, "reference": "ref", "concurrency": 3}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        results = resp.data["results"]
+        self.assertEqual([r["generation_id"] for r in results], ids)
+        self.assertEqual([r["status"] for r in results], ["ok", "error", "ok", "ok", "ok", "not_found"])
+        self.assertEqual(resp.data["stats"], {**resp.data["stats"], "items": 6, "judged": 4, "errors": 1, "concurrency": 3})
+        self.assertEqual(peak[0], 3)
+        bulk.assert_called_once()
+        self.assertEqual(JudgeEvaluation.objects.get(pk=results[2]["evaluation_id"]).scores["candidate"], "answer 2")
+        self.assertEqual(judge._judge_fields.cache_info().misses, 1)
+
+
+    def test_ids_are_coerced_and_malformed_bodies_are_rejected(self):
+        with patch("apps.eval.views.judge_with_mistral", return_value={"overall": 4.0}):
+            resp = self.client.post(reverse("rejudge"), {
+                "generation_ids": [str(self.gens[0].id), self.gens[0].id, self.gens[1].id], "reference": "ref",
+            }, format="json")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual([(r["generation_id"], r["status"]) for r in resp.data["results"]],
+                             [(self.gens[0].id, "ok"), (self.gens[1].id, "ok")])
+
+            for body in ({"generation_ids": [[1]], "reference": "ref"},
+                         {"generation_ids": [{"id": 1}], "reference": "ref"},
+                         {"generation_ids": [1], "reference": "ref", "concurrency": "many"}):
+                resp = self.client.post(reverse("rejudge"), body, format="json")
+                self.assertEqual(resp.status_code, 400, body)
+            resp = self.client.post(reverse("rejudge"), {"generation_ids": [1]}, format="json")
+            self.assertEqual((resp.status_code, resp.data["error"]), (400, "missing_reference"))
+
+
+class JudgeBatchTests(APITestCase):
+    def setUp(self):
+        from apps.history.models import Generation as HistoryGeneration
+        self.gens = HistoryGeneration.objects.bulk_create([
+            HistoryGeneration(model_slug="m", prompt=f"p{i}", output=f"stored {i}") for i in range(2)
+        ])
+
+    def test_per_row_references_are_judged_concurrently_and_saved_once(self):
+        from apps.eval.models import JudgeEvaluation
+
+        def fake_judge(candidate, reference, **kwargs):
+            if candidate == "garbled":
+                return {"error": "parse_error", "raw": "??"}
+            return {"overall": 4.0, "pair": f"{candidate}|{reference}"}
+
+        items = [
+            {"generation_id": self.gens[0].id, "reference": "ref a"},                   # candidate from the DB
+            {"generation_id": self.gens[1].id, "reference": "ref b", "candidate": "own text"},
+            {"reference": "ref c", "candidate": "no generation"},                       # judged, not saved
+            {"generation_id": 999999, "reference": "ref d", "candidate": "garbled"},
+            {"generation_id": 999998, "reference": "ref e"},                            # nothing to judge
+        ]
+        with patch("apps.eval.views.judge_with_mistral", side_effect=fake_judge), \
+                patch.object(JudgeEvaluation.objects, "bulk_create", wraps=JudgeEvaluation.objects.bulk_create) as bulk:
+            resp = self.client.post(reverse("judge_batch"), {"items": items, "concurrency": 3}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        results = resp.data["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual([r.get("scores", {}).get("pair") for r in results[:3]],
+                         ["stored 0|ref a", "own text|ref b", "no generation|ref c"])
+        self.assertEqual((results[3]["error"], results[4]["error"]), ("parse_error", "missing_candidate"))
+        self.assertEqual([("evaluation_id" in r) for r in results], [True, True, False, False, False])
+        self.assertEqual(resp.data["stats"], {**resp.data["stats"], "items": 5, "judged": 3, "errors": 2, "concurrency": 3})
+        bulk.assert_called_once()
+        self.assertEqual(JudgeEvaluation.objects.get(pk=results[1]["evaluation_id"]).reference, "ref b")
+
+
+class BatchJudgeCommandTests(TestCase):
+    def setUp(self):
+        from apps.history.models import Generation as HistoryGeneration
+        self.gens = HistoryGeneration.objects.bulk_create([
+            HistoryGeneration(model_slug="m", prompt=f"p{i}", output=f"answer {i}") for i in range(5)
+        ])
+
+    def run_command(self, judge, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        with patch("apps.eval.management.commands.batch_judge.judge_with_mistral", side_effect=judge):
+            call_command("batch_judge", "--ref", "ref", "--model", "judge:7b", "--workers", "3", *args, stdout=out)
+        return out.getvalue()
+
+    def test_commits_in_batches_and_resume_skips_judged_rows(self):
+        from apps.eval.judge import PROMPT_VERSION, reference_hash
+        from apps.eval.models import JudgeEvaluation
+
+        def flaky(candidate, reference, **kwargs):
+            if candidate == "answer 3":
+                return {"error": "parse_error", "raw": "not json"}
+            return {"overall": 4.0}
+
+        with patch.object(JudgeEvaluation.objects, "bulk_create", wraps=JudgeEvaluation.objects.bulk_create) as bulk:
+            out = self.run_command(flaky, "--batch-size", "2")
+        self.assertEqual(bulk.call_count, 3)
+        self.assertIn("5/5 judged, 1 errors", out)
+        failed = JudgeEvaluation.objects.get(generation_id=self.gens[3].id)
+        self.assertEqual((failed.status, failed.raw_text), ("error", "not json"))
+        self.assertEqual(
+            set(JudgeEvaluation.objects.values_list("judge_model", "prompt_version", "reference_hash")),
+            {("judge:7b", PROMPT_VERSION, reference_hash("ref"))},
+        )
+
+        seen = []
+        self.run_command(lambda candidate, reference, **kw: seen.append(candidate) or {"overall": 5.0}, "--resume")
+        self.assertEqual(seen, ["answer 3"])  # only the failed row is judged again
+        self.run_command(lambda candidate, reference, **kw: seen.append(candidate) or {"overall": 5.0},
+                         "--resume", "--prompt-version", "v3")
+        self.assertEqual(len(seen), 6)  # a new prompt version re-judges everything
+
+
+class EmbeddingCacheTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="emb-")
+        self.model = FakeModel()
+        patcher = patch("apps.eval.embeddings.load_model", return_value=self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unique_texts_are_encoded_once_and_persisted(self):
+        emb = Embedder("fake/model", store=EmbeddingStore(self.root, "fake/model"))
+        out = emb.encode(["a", "bbb", "a", "cc"])
+        self.assertEqual(out.shape, (4, 2))
+        np.testing.assert_allclose(out[0], out[2])
+        self.assertEqual(self.model.encoded, ["a", "bbb", "cc"])
+
+        # A fresh store (another process) reads the vectors back from disk.
+        again = Embedder("fake/model", store=EmbeddingStore(self.root, "fake/model"))
+        np.testing.assert_allclose(again.encode(["cc", "bbb", "dddd"])[:2], out[[3, 1]])
+        self.assertEqual(self.model.encoded, ["a", "bbb", "cc", "dddd"])
+        self.assertEqual((again.hits, again.misses), (2, 1))
+        self.assertEqual(len(again.store), 4)
+
+    def test_models_do_not_share_vectors(self):
+        Embedder("model-a", store=EmbeddingStore(self.root, "model-a")).encode(["x"])
+        Embedder("model-b", store=EmbeddingStore(self.root, "model-b")).encode(["x"])
+        self.assertEqual(self.model.encoded, ["x", "x"])
+
+    def test_cosine_matrix_matches_pairwise_dot(self):
+        vecs = Embedder("fake").encode(["a", "bb", "ccc"])
+        m = cosine_matrix(vecs, vecs)
+        self.assertEqual(m.shape, (3, 3))
+        self.assertAlmostEqual(float(m[0, 2]), float(vecs[0] @ vecs[2]), places=6)
+        np.testing.assert_allclose(np.diag(m), 1.0, rtol=1e-6)
+
+    @override_settings(EMBEDDING_CACHE_DIR="")
+    def test_store_can_be_disabled(self):
+        self.assertIsNone(get_embedder("uncached/model").store)
+
+
+class MetricPoolTests(TestCase):
+    def test_scorers_are_reused(self):
+        from apps.eval import metrics
+        metrics.compute_rouge("a b", "a c")
+        scorer = metrics._rouge_scorer()
+        metrics.compute_rouge("x y", "x z")
+        self.assertIs(metrics._rouge_scorer(), scorer)
+
+    @override_settings(METRICS_WORKERS=2, METRICS_POOL_MIN_PAIRS=1)
+    def test_pool_results_are_aligned_with_in_process_scores(self):
+        from apps.eval import metrics
+        self.addCleanup(metrics.shutdown_metric_pool)
+        candidates = [f"the cat number {i} sat on the mat" for i in range(25)]
+        references = [f"a cat number {i % 7} is on the mat" for i in range(25)]
+        pooled = metrics.score_lexical(candidates, references, ["bleu", "rouge"])
+        self.assertIsNotNone(metrics._pool)
+        local = metrics.lexical_scores(candidates, references, ["bleu", "rouge"])
+        for key in ("bleu", "rouge1", "rougeL"):
+            np.testing.assert_allclose(pooled[key], local[key])
+
+
+class EmbeddingServerTests(TestCase):
+    def setUp(self):
+        from apps.eval import embeddings
+        self.model = FakeModel()
+        patcher = patch("apps.eval.embeddings.load_model", return_value=self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, embeddings, "_server_client", None)
+
+    def _serve(self, **kwargs):
+        from apps.eval.embedding_server import EmbeddingService, make_server
+        sock = os.path.join(tempfile.mkdtemp(prefix="emb-srv-"), "embed.sock")
+        self.service = EmbeddingService(**kwargs)
+        with patch("apps.eval.embedding_server.load_model", return_value=self.model):
+            server = make_server(f"unix://{sock}", self.service)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"unix://{sock}"
+
+    def test_workers_share_the_server_model_and_batches(self):
+        url = self._serve(max_batch=64, window_ms=50)
+        local = MagicMock(side_effect=AssertionError("must not load in-process"))
+        with override_settings(EMBEDDING_SERVER_URL=url), \
+                patch("apps.eval.embeddings.load_model", local), \
+                patch("apps.eval.embedding_server.load_model", return_value=self.model):
+            texts = [[f"text {i}", f"text {i} again"] for i in range(6)]
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                out = list(pool.map(lambda t: Embedder("fake").encode(t), texts))
+
+        expected = Embedder("fake").encode(["text 3", "text 3 again"])
+        np.testing.assert_allclose(out[3], expected, rtol=1e-6)
+        self.assertEqual(self.service.stats()["texts"], 12)
+        self.assertLess(self.service.stats()["batches"], 6)  # requests from several clients shared encodes
+
+    def test_falls_back_in_process_when_server_is_down(self):
+        with override_settings(EMBEDDING_SERVER_URL="unix:///nonexistent/embed.sock"):
+            emb = Embedder("fake")
+            self.assertEqual(emb.encode(["a", "bb"]).shape, (2, 2))
+            self.assertFalse(embedding_server_client().available)  # skipped until the retry window passes
+            emb.encode(["ccc"])
+        self.assertEqual(self.model.encoded, ["a", "bb", "ccc"])
+
+
+class EmbeddingRuntimeTests(TestCase):
+    def _tiny_model(self) -> str:
+        import torch
+        from tokenizers import Tokenizer, models, pre_tokenizers
+        from transformers import BertConfig, BertModel, PreTrainedTokenizerFast
+
+        path = tempfile.mkdtemp(prefix="tiny-bert-")
+        vocab = {w: i for i, w in enumerate(["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + [f"w{i}" for i in range(50)])}
+        tk = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+        tk.pre_tokenizer = pre_tokenizers.Whitespace()
+        PreTrainedTokenizerFast(tokenizer_object=tk, unk_token="[UNK]", pad_token="[PAD]",
+                                cls_token="[CLS]", sep_token="[SEP]").save_pretrained(path)
+        torch.manual_seed(0)
+        BertModel(BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=1,
+                             num_attention_heads=2, intermediate_size=64)).save_pretrained(path)
+        return path
+
+    @skipUnless(importlib.util.find_spec("torch"), "needs torch")
+    def test_int8_runtime_stays_close_to_fp32(self):
+        from apps.eval.embeddings import load_model
+        path = self._tiny_model()
+        texts = ["w1 w2 w3", "w4 w5", "w10 w11 w12 w13"]
+        fp32 = load_model(path, "torch").encode(texts, normalize_embeddings=True)
+        int8 = load_model(path, "int8").encode(texts, normalize_embeddings=True)
+        self.assertIsNot(load_model(path, "int8"), load_model(path, "torch"))
+        self.assertGreater(float(np.einsum("ij,ij->i", fp32, int8).min()), 0.99)
+
+    def test_runtimes_keep_separate_stores(self):
+        with override_settings(EMBEDDING_CACHE_DIR=tempfile.mkdtemp(prefix="emb-")):
+            fp32, int8 = get_embedder("some/model", "torch"), get_embedder("some/model", "int8")
+        self.assertNotEqual(fp32.store.dir, int8.store.dir)
+        self.assertEqual(int8.runtime, "int8")
+
+    def test_unknown_or_missing_runtime_is_a_configuration_error(self):
+        from apps.eval.embeddings import load_model
+        with self.assertRaises(ImproperlyConfigured):
+            load_model("some/model", "tensorrt")
+        if not importlib.util.find_spec("onnxruntime"):
+            with self.assertRaises(ImproperlyConfigured):
+                load_model("some/model", "onnx")
@@ -1,10 +1,12 @@
 from django.urls import path
-from .views import EvaluateView, JudgeView, CombinedEvalView, RejudgeView
+from .views import EvaluateView, EvaluateBatchView, JudgeView, JudgeBatchView, CombinedEvalView, RejudgeView
 
 
 urlpatterns = [
     path("", EvaluateView.as_view(), name="evaluate"),
+    path("batch/", EvaluateBatchView.as_view(), name="evaluate_batch"),
     path("judge/", JudgeView.as_view(), name="judge"),
+    path("judge/batch/", JudgeBatchView.as_view(), name="judge_batch"),
     path("combined/", CombinedEvalView.as_view(), name="combined"),
     path("rejudge/", RejudgeView.as_view(), name="rejudge"),
     
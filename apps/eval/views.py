@@ -2,6 +2,7 @@
 from __future__ import annotations
 from typing import Any, Dict
 import logging
+import time
 
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
@@ -11,69 +12,27 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from apps.history.models import Generation
+from apps.inference.concurrency import bounded_map
 from .models import Evaluation, JudgeEvaluation
 from .serializers import (
     EvaluateRequestSerializer,
+    EvaluateBatchRequestSerializer,
     JudgeRequestSerializer,
+    JudgeBatchRequestSerializer,
+    RejudgeRequestSerializer,
     CombinedEvalSerializer,
 )
-from .metrics import bleu as _bleu, rouge as _rouge, cosine as _cosine
-from .judge import judge_with_mistral
+from .metrics import bleu as _bleu, rouge as _rouge, cosine as _cosine, metrics_batch
+from .judge import PROMPT_VERSION, judge_concurrency, judge_row, judge_with_mistral
 
 logger = logging.getLogger(__name__)
 
 
-def _judge_model_has_scores_field() -> bool:
-    """Detect if JudgeEvaluation has a JSONField named 'scores'."""
-    try:
-        for f in JudgeEvaluation._meta.get_fields():
-            if getattr(f, "name", None) == "scores":
-                return True
-    except Exception:
-        pass
-    return False
-
-
-def _persist_judge(
-    *,
-    generation_id: int,
-    reference: str,
-    judge_model: str,
-    scores: Dict[str, Any],
-    prompt_version: str | None = None,
-    raw_text: str | None = None,
-    row_status: str | None = None,
-) -> JudgeEvaluation:
-    """
-    Save a JudgeEvaluation row in a way that works for either schema:
-    - JSONField: scores
-    - or explicit numeric columns: correctness/relevance/fluency/overall
-    """
-    has_scores_json = _judge_model_has_scores_field()
-
-    base_kwargs = dict(
-        generation_id=generation_id,
-        reference=reference,
-        judge_model=judge_model,
-    )
-    if prompt_version is not None:
-        base_kwargs["prompt_version"] = prompt_version
-    if row_status is not None:
-        base_kwargs["status"] = row_status
-    if raw_text is not None:
-        base_kwargs["raw_text"] = raw_text
-
-    if has_scores_json:
-        return JudgeEvaluation.objects.create(scores=scores, **base_kwargs)
-
-    # Fallback to explicit numeric columns
-    return JudgeEvaluation.objects.create(
-        correctness=float(scores.get("correctness", 0)),
-        relevance=float(scores.get("relevance", 0)),
-        fluency=float(scores.get("fluency", 0)),
-        overall=float(scores.get("overall", 0)),
-        **base_kwargs,
-    )
+def _persist_judge(**kwargs) -> JudgeEvaluation:
+    """Save one JudgeEvaluation row (see judge.judge_row for the arguments)."""
+    row = judge_row(**kwargs)
+    row.save()
+    return row
 
 
 @method_decorator(csrf_exempt, name="dispatch")  # dev-friendly
@@ -112,6 +71,70 @@ class EvaluateView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class EvaluateBatchView(APIView):
+    """
+    Many (generation_id, reference) pairs in one request.
+
+    POST body:
+      {
+        "items": [{"generation_id": 4, "reference": "..."}, {"generation_id": 5, "reference": "..."}],
+        "metrics": ["bleu","rouge","cosine"]
+      }
+
+    Response (results in input order; unknown generations get an error, the rest are saved):
+      {
+        "results": [
+          {"index": 0, "generation_id": 4, "evaluation_id": 10, "metrics": {...}},
+          {"index": 1, "generation_id": 5, "error": "not_found"}
+        ],
+        "stats": {"items": 2, "evaluated": 1, "errors": 1, "elapsed_ms": 35}
+      }
+    """
+    def post(self, request):
+        s = EvaluateBatchRequestSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        items = s.validated_data["items"]
+        want = set(s.validated_data["metrics"])
+        t0 = time.perf_counter()
+
+        # One query for every generation in the batch.
+        gens = Generation.objects.only("id", "output").in_bulk({it["generation_id"] for it in items})
+        found = [(i, it) for i, it in enumerate(items) if it["generation_id"] in gens]
+
+        try:
+            scores = metrics_batch(
+                [gens[it["generation_id"]].output or "" for _, it in found],
+                [it["reference"] for _, it in found],
+                want,
+            )
+            evs = Evaluation.objects.bulk_create([
+                Evaluation(generation_id=it["generation_id"], reference=it["reference"], metrics=out)
+                for (_, it), out in zip(found, scores)
+            ])
+        except Exception as e:
+            logger.exception("Batch evaluation failed")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [{"index": i, "generation_id": it["generation_id"], "error": "not_found"} for i, it in enumerate(items)]
+        for (i, it), ev, out in zip(found, evs, scores):
+            results[i] = {"index": i, "generation_id": it["generation_id"], "evaluation_id": ev.pk, "metrics": out}
+
+        return Response(
+            {
+                "results": results,
+                "stats": {
+                    "items": len(items),
+                    "evaluated": len(found),
+                    "errors": len(items) - len(found),
+                    "elapsed_ms": int((time.perf_counter() - t0) * 1000),
+                },
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class JudgeView(APIView):
     """
@@ -153,7 +176,9 @@ class JudgeView(APIView):
             )
 
         # Run LLM judge
-        scores = judge_with_mistral(candidate, reference, judge_model=judge_model)
+        scores = judge_with_mistral(
+            candidate, reference, judge_model=judge_model, use_cache=s.validated_data["use_cache"],
+        )
         if isinstance(scores, dict) and "error" in scores:
             return Response({"error": "judge_failed", "detail": scores}, status=400)
 
@@ -170,6 +195,92 @@ class JudgeView(APIView):
 
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class JudgeBatchView(APIView):
+    """
+    Many (candidate, reference) pairs judged in one request, each with its own reference.
+
+    POST body:
+      {
+        "items": [
+          {"generation_id": 4, "reference": "...", "candidate": "..."},   # candidate optional if the generation exists
+          {"reference": "...", "candidate": "..."}                        # no generation_id: judged, not saved
+        ],
+        "judge_model": "mistral:7b",
+        "concurrency": 8,            # optional, capped by JUDGE_MAX_CONCURRENCY
+        "use_cache": true
+      }
+
+    Generations are loaded with one query, up to JUDGE_CONCURRENCY judge calls run at once and
+    rows for stored generations are written with one INSERT. Results are in input order:
+      {
+        "results": [
+          {"index": 0, "generation_id": 4, "evaluation_id": 12, "scores": {"correctness": 4.0, ...}},
+          {"index": 1, "generation_id": null, "error": "parse_error"}
+        ],
+        "stats": {"items": 2, "judged": 1, "errors": 1, "concurrency": 4, "elapsed_ms": 5120}
+      }
+    """
+    def post(self, request):
+        s = JudgeBatchRequestSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        items = s.validated_data["items"]
+        judge_model = s.validated_data.get("judge_model") or "mistral:7b"
+        use_cache = s.validated_data["use_cache"]
+        concurrency = judge_concurrency(s.validated_data.get("concurrency"))
+        t0 = time.perf_counter()
+
+        gens = Generation.objects.only("id", "output").in_bulk(
+            {it["generation_id"] for it in items if it.get("generation_id") is not None}
+        )
+
+        def work(it):
+            gen = gens.get(it.get("generation_id"))
+            candidate = it.get("candidate") or (gen.output if gen is not None else "") or ""
+            if not candidate:
+                return {"error": "missing_candidate"}
+            try:
+                return judge_with_mistral(candidate, it["reference"], judge_model=judge_model, use_cache=use_cache)
+            except Exception as e:
+                logger.exception("Judging batch item failed")
+                return {"error": str(e)}
+
+        judged = list(bounded_map(work, items, concurrency=concurrency))
+
+        results, rows, saved_at = [], [], []
+        for i, (it, scores) in enumerate(zip(items, judged)):
+            gen_id = it.get("generation_id")
+            ok = isinstance(scores, dict) and "error" not in scores
+            result = {"index": i, "generation_id": gen_id}
+            result.update({"scores": scores} if ok else {"error": str(scores.get("error", "judge_failed"))})
+            results.append(result)
+            if gen_id in gens and scores.get("error") != "missing_candidate":
+                rows.append(judge_row(
+                    generation_id=gen_id,
+                    reference=it["reference"],
+                    judge_model=judge_model,
+                    scores=scores,
+                    raw_text=scores.get("raw"),
+                    row_status="ok" if ok else "error",
+                ))
+                saved_at.append(i)
+        for i, row in zip(saved_at, JudgeEvaluation.objects.bulk_create(rows)):
+            results[i]["evaluation_id"] = row.pk
+
+        errors = sum("error" in r for r in results)
+        return Response({
+            "results": results,
+            "stats": {
+                "items": len(items),
+                "judged": len(items) - errors,
+                "errors": errors,
+                "concurrency": concurrency,
+                "elapsed_ms": int((time.perf_counter() - t0) * 1000),
+            },
+        }, status=200)
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class CombinedEvalView(APIView):
     """
@@ -278,25 +389,46 @@ class RejudgeView(APIView):
         "generation_ids": [1,2,3],
         "reference": "...",
         "judge_model": "mistral:7b",
-        "prompt_version": "v2"
+        "prompt_version": "v2",
+        "concurrency": 8,            # optional, capped by JUDGE_MAX_CONCURRENCY
+        "use_cache": true            # optional, false = re-run the judge
       }
+
+    Generations are loaded with one query and judged concurrently; all rows are written with
+    one INSERT. Results keep the order of generation_ids:
+      {"results": [{"generation_id": 1, "status": "ok", "evaluation_id": 7}, {"generation_id": 2, "status": "not_found"}],
+       "stats": {"items": 2, "judged": 1, "errors": 0, "concurrency": 8, "elapsed_ms": 5120}}
     """
     def post(self, request):
-        ids = request.data.get("generation_ids") or []
-        reference = request.data.get("reference")
-        if not reference:
-            return Response({"error": "missing_reference"}, status=400)
+        s = RejudgeRequestSerializer(data=request.data)
+        if not s.is_valid():
+            error = "missing_reference" if "reference" in s.errors else "serializer_invalid"
+            return Response({"error": error, "detail": s.errors}, status=400)
 
-        judge_model = request.data.get("judge_model") or "mistral:7b"
-        prompt_version = request.data.get("prompt_version") or "v2"
+        ids = list(dict.fromkeys(s.validated_data["generation_ids"]))  # coerced ints, deduped in order
+        reference = s.validated_data["reference"]
+        judge_model = s.validated_data.get("judge_model") or "mistral:7b"
+        prompt_version = s.validated_data.get("prompt_version") or PROMPT_VERSION
+        use_cache = s.validated_data["use_cache"]
+        concurrency = judge_concurrency(s.validated_data.get("concurrency"))
 
-        results = []
-        for gid in ids:
-            gen = get_object_or_404(Generation, id=gid)
-            scores = judge_with_mistral(gen.output or "", reference, judge_model=judge_model)
-            row_status = "ok" if (isinstance(scores, dict) and "error" not in scores) else "error"
+        t0 = time.perf_counter()
+        gens = Generation.objects.only("id", "output").in_bulk(ids)
+        found = [gid for gid in ids if gid in gens]
 
-            _persist_judge(
+        def work(gid):
+            try:
+                return judge_with_mistral(gens[gid].output or "", reference, judge_model=judge_model, use_cache=use_cache)
+            except Exception as e:
+                logger.exception("Rejudging generation %s failed", gid)
+                return {"error": str(e)}
+
+        judged = dict(zip(found, bounded_map(work, found, concurrency=concurrency)))
+
+        rows = []
+        for gid, scores in judged.items():
+            row_status = "ok" if (isinstance(scores, dict) and "error" not in scores) else "error"
+            rows.append(judge_row(
                 generation_id=gid,
                 reference=reference,
                 judge_model=judge_model,
@@ -304,7 +436,25 @@ class RejudgeView(APIView):
                 prompt_version=prompt_version,
                 raw_text=(scores.get("raw") if isinstance(scores, dict) else None),
                 row_status=row_status,
-            )
-            results.append({"generation_id": gid, "status": row_status})
+            ))
+        saved = dict(zip(judged, JudgeEvaluation.objects.bulk_create(rows)))
 
-        return Response({"results": results}, status=200)
+        results = []
+        for gid in ids:
+            if gid not in judged:
+                results.append({"generation_id": gid, "status": "not_found"})
+                continue
+            scores = judged[gid]
+            row_status = "ok" if (isinstance(scores, dict) and "error" not in scores) else "error"
+            results.append({"generation_id": gid, "status": row_status, "evaluation_id": saved[gid].pk})
+
+        return Response({
+            "results": results,
+            "stats": {
+                "items": len(ids),
+                "judged": sum(r["status"] == "ok" for r in results),
+                "errors": sum(r["status"] == "error" for r in results),
+                "concurrency": concurrency,
+                "elapsed_ms": int((time.perf_counter() - t0) * 1000),
+            },
+        }, status=200)
@@ -9,4 +9,10 @@ class Generation(models.Model):
     params = models.JSONField(default=dict)
     output = models.TextField(blank=True)
     latency_ms = models.IntegerField(null=True, blank=True)
+    # reported by the backend when available (see apps.inference.backends.GenResult)
+    prompt_tokens = models.IntegerField(null=True, blank=True)
+    completion_tokens = models.IntegerField(null=True, blank=True)
+    ttft_ms = models.IntegerField(null=True, blank=True)
+    load_ms = models.IntegerField(null=True, blank=True)
+    tokens_per_s = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import LabelRun
 
-# Register your models here.
+
+@admin.register(LabelRun)
+class LabelRunAdmin(admin.ModelAdmin):
+    list_display = ("id", "dataset", "model_slug", "status", "chunks_done", "chunks_total", "rows_done", "errors", "created_at")
+    list_filter = ("status", "model_slug", "created_at")
+    readonly_fields = ("created_at", "started_at", "finished_at")
+    ordering = ("-created_at",)
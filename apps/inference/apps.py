@@ -1,6 +1,25 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
 class InferenceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.inference'
+
+    def ready(self):
+        from django.conf import settings
+        if not getattr(settings, "WARM_POOL_ON_STARTUP", False) or not _serving():
+            return
+        from .warm_pool import warm_pool
+        warm_pool.preload_in_background()
+
+
+def _serving() -> bool:
+    """False for one-off manage.py commands (migrate, shell, test) and runserver's reloader parent."""
+    if not sys.argv[0].endswith("manage.py") or len(sys.argv) < 2:
+        return True  # gunicorn, celery, ...
+    if sys.argv[1] != "runserver":
+        return False
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
@@ -1,14 +1,73 @@
-import os, time, json, requests
+import os, time, json, asyncio, threading
+import httpx
 from dataclasses import dataclass
 from django.conf import settings
-from typing import Optional, Generator
-import time, json, requests
+from typing import Optional, Generator, AsyncIterator
+from .transport import get_async_client, run_sync, iter_sync
+from .batching import MicroBatcher
+from .local_models import local_models
+from .ollama_pool import OllamaPool
+from .prompts import prefix_of
+from .providers import torch as TORCH, transformers as TRANSFORMERS
+
+
+def keep_alive_for(model: str) -> str:
+    """Ollama keep_alive for `model`: OLLAMA_KEEP_ALIVE_BY_MODEL[model], else OLLAMA_KEEP_ALIVE."""
+    per_model = getattr(settings, "OLLAMA_KEEP_ALIVE_BY_MODEL", {}) or {}
+    return str(per_model.get(model, getattr(settings, "OLLAMA_KEEP_ALIVE", "")))
 
 
 @dataclass
 class GenResult:
     text: str
     latency_ms: int
+    cached: bool = False     # served from apps.inference.cache instead of the backend
+    # token usage and phase timings, when the backend reports them
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    load_ms: Optional[int] = None          # model load / cold start
+    ttft_ms: Optional[int] = None          # time to first token (load + prompt processing)
+    tokens_per_s: Optional[float] = None   # decode throughput
+
+    @property
+    def usage(self) -> Optional[dict]:
+        if self.prompt_tokens is None and self.completion_tokens is None:
+            return None
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": (self.prompt_tokens or 0) + (self.completion_tokens or 0),
+        }
+
+    @property
+    def timings(self) -> dict:
+        return {"ttft_ms": self.ttft_ms, "load_ms": self.load_ms, "tokens_per_s": self.tokens_per_s}
+
+TIMING_FIELDS = ("load_ms", "ttft_ms", "tokens_per_s")
+
+def _ms(ns) -> Optional[int]:
+    return int(ns / 1_000_000) if isinstance(ns, (int, float)) else None
+
+def _rate(tokens, ms) -> Optional[float]:
+    return round(tokens / (ms / 1000), 2) if tokens and ms else None
+
+def _int_header(headers, name: str) -> Optional[int]:
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _tgi_stats(headers) -> dict:
+    """TGI (and HF Endpoints running it) report usage in x-* response headers."""
+    try:
+        per_token_ms = float(headers["x-time-per-token"])
+    except (KeyError, TypeError, ValueError):
+        per_token_ms = None
+    return {
+        "prompt_tokens": _int_header(headers, "x-prompt-tokens"),
+        "completion_tokens": _int_header(headers, "x-generated-tokens"),
+        "tokens_per_s": round(1000 / per_token_ms, 2) if per_token_ms else None,
+    }
 
 def _norm_params(params: dict) -> dict:
     return {
@@ -19,14 +78,46 @@ def _norm_params(params: dict) -> dict:
             int(params.get("max_new_tokens", getattr(settings, "DEFAULT_MAX_NEW_TOKENS", 256))),
             getattr(settings, "ABSOLUTE_MAX_NEW_TOKENS", 1024),
         ),
+        # fixed sampling seed (optional); makes temperature > 0 calls reproducible
+        "seed": int(params["seed"]) if params.get("seed") is not None else None,
     }
 
+
+class AsyncBackend:
+    """
+    HTTP backends implement `agenerate` / `astream_generate` on the pooled keep-alive clients
+    from .transport. `generate` / `stream_generate` are the sync shims used by views,
+    worker threads and Celery tasks.
+    """
+    async def agenerate(self, target: str, prompt: str, params: dict) -> GenResult:
+        raise NotImplementedError
+
+    async def astream_generate(self, target: str, prompt: str, params: dict) -> AsyncIterator[str]:
+        # no native streaming endpoint: emit the whole completion as one chunk
+        result = await self.agenerate(target, prompt, params)
+        if result.text:
+            yield result.text
+
+    def generate(self, target: str, prompt: str, params: dict) -> GenResult:
+        return run_sync(self.agenerate(target, prompt, params))
+
+    def stream_generate(self, target: str, prompt: str, params: dict) -> Generator[str, None, None]:
+        return iter_sync(self.astream_generate(target, prompt, params))
+
+async def _aiter_sse_data(resp) -> AsyncIterator[str]:
+    """`data:` payloads of a server-sent-events response, one per event line."""
+    async for line in resp.aiter_lines():
+        if line.startswith("data:"):
+            data = line[5:].strip()
+            if data:
+                yield data
+
 # 1) Hugging Face Inference Endpoints (hosted)
-class HFEndpointBackend:
+class HFEndpointBackend(AsyncBackend):
     def __init__(self, token: str | None = None):
         self.token = token or settings.HUGGINGFACE_TOKEN
 
-    def generate(self, endpoint_url: str, prompt: str, params: dict) -> GenResult:
+    async def agenerate(self, endpoint_url: str, prompt: str, params: dict) -> GenResult:
         p = _norm_params(params)
         headers = {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
         payload = {
@@ -39,19 +130,20 @@ class HFEndpointBackend:
                 "return_full_text": False,
             }
         }
+        if p["seed"] is not None:
+            payload["parameters"]["seed"] = p["seed"]
         t0 = time.time()
-        r = requests.post(endpoint_url, headers=headers, data=json.dumps(payload), timeout=120)
+        r = await get_async_client(endpoint_url).post(endpoint_url, headers=headers, json=payload, timeout=120)
         r.raise_for_status()
         out = r.json()
         # HF Endpoint returns [{"generated_text": "..."}] typically
         text = out[0].get("generated_text", "") if isinstance(out, list) else out.get("generated_text","")
-        return GenResult(text=text, latency_ms=int((time.time()-t0)*1000))
+        return GenResult(text=text, latency_ms=int((time.time()-t0)*1000), **_tgi_stats(r.headers))
 
 # 2) TGI (self-hosted) — https://github.com/huggingface/text-generation-inference
-class TGIBackend:
-    def generate(self, base_url: str, prompt: str, params: dict) -> GenResult:
+class TGIBackend(AsyncBackend):
+    def _payload(self, prompt: str, params: dict) -> dict:
         p = _norm_params(params)
-        url = f"{base_url.rstrip('/')}/generate"
         payload = {
             "inputs": prompt,
             "parameters": {
@@ -62,42 +154,222 @@ class TGIBackend:
                 "max_new_tokens": p["max_new_tokens"]
             }
         }
+        if p["seed"] is not None:
+            payload["parameters"]["seed"] = p["seed"]
+        return payload
+
+    async def agenerate(self, base_url: str, prompt: str, params: dict) -> GenResult:
+        url = f"{base_url.rstrip('/')}/generate"
         t0 = time.time()
-        r = requests.post(url, json=payload, timeout=120)
+        r = await get_async_client(url).post(url, json=self._payload(prompt, params), timeout=120)
         r.raise_for_status()
         data = r.json()
         text = data.get("generated_text","") or (data.get("outputs",[{}])[0].get("text",""))
-        return GenResult(text=text, latency_ms=int((time.time()-t0)*1000))
+        return GenResult(text=text, latency_ms=int((time.time()-t0)*1000), **_tgi_stats(r.headers))
+
+    async def astream_generate(self, base_url: str, prompt: str, params: dict) -> AsyncIterator[str]:
+        # /generate_stream emits one SSE event per token: data:{"token": {"text": ..., "special": ...}, ...}
+        url = f"{base_url.rstrip('/')}/generate_stream"
+        client = get_async_client(url)
+        async with client.stream("POST", url, json=self._payload(prompt, params),
+                                 timeout=settings.STREAM_TIMEOUT_SECS) as resp:
+            resp.raise_for_status()
+            async for data in _aiter_sse_data(resp):
+                try:
+                    j = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                if j.get("error"):
+                    raise RuntimeError(f"TGI stream error: {j['error']}")
+                token = j.get("token") or {}
+                if token.get("text") and not token.get("special"):
+                    yield token["text"]
 
 # 3) Local Transformers (optional)
-class LocalBackend:
-    _cache = {}
-    def _load(self, repo_id: str):
-        if repo_id in self._cache: return self._cache[repo_id]
-        from transformers import AutoTokenizer, AutoModelForCausalLM
-        import torch
-        tok = AutoTokenizer.from_pretrained(repo_id)
-        model = AutoModelForCausalLM.from_pretrained(repo_id, torch_dtype="auto", device_map="auto")
-        self._cache[repo_id] = (tok, model)
-        return self._cache[repo_id]
+class LocalBackend(AsyncBackend):
+    """
+    In-process Transformers model: `generate` is the real (blocking) implementation,
+    `agenerate` runs it off the loop.
+
+    With LOCAL_BATCH_MAX_SIZE > 1, concurrent calls for the same repo_id are micro-batched:
+    prompts arriving within LOCAL_BATCH_WINDOW_MS share one left-padded `model.generate`.
+    Seeded calls always run alone so their output does not depend on what they were batched with.
+    Weights live in `local_models`, an LRU cache bounded by LOCAL_MODEL_MEMORY_BUDGET_MB.
+
+    For a PrefixedPrompt the KV state of its fixed prefix is computed once per model and kept
+    (LOCAL_PREFIX_CACHE_SIZE prefixes, LRU); later calls only run their suffix. Batches are
+    formed per prefix, and rows are padded between the prefix and the suffix so they can all
+    share the one cached prefix.
+    """
+    _batchers = {}
+    _batchers_lock = threading.Lock()
+    _prefix_lock = threading.Lock()
+
+    @staticmethod
+    def _generate_kwargs(tok, p: dict) -> dict:
+        sampling = {"do_sample": True, "temperature": p["temperature"], "top_p": p["top_p"], "top_k": p["top_k"]} \
+            if p["temperature"] > 0 else {"do_sample": False}
+        return {**sampling, "max_new_tokens": p["max_new_tokens"], "pad_token_id": tok.pad_token_id}
+
+    def _prefix_state(self, entry, prefix: str):
+        """(prefix input_ids, past_key_values) for `prefix` on this model, computed on first use."""
+        torch, transformers = TORCH(), TRANSFORMERS()
+
+        with self._prefix_lock:
+            state = entry.prefixes.get(prefix)
+            if state is not None:
+                entry.prefixes.move_to_end(prefix)
+                return state
+        ids = entry.tokenizer(prefix, return_tensors="pt")["input_ids"].to(entry.model.device)
+        with torch.no_grad():
+            past = entry.model(input_ids=ids, past_key_values=transformers.DynamicCache(), use_cache=True).past_key_values
+        with self._prefix_lock:
+            entry.prefixes[prefix] = (ids, past)
+            while len(entry.prefixes) > getattr(settings, "LOCAL_PREFIX_CACHE_SIZE", 8):
+                entry.prefixes.popitem(last=False)
+        return ids, past
+
+    def _prefixed_inputs(self, entry, prompts: list[str], prefix: str) -> Optional[tuple[dict, object]]:
+        """Inputs over prefix + suffix with the prefix already in a (copied) KV cache, or None."""
+        import copy
+        torch = TORCH()
+
+        tok = entry.tokenizer
+        suffix = tok([p.suffix for p in prompts], return_tensors="pt", padding=True,
+                     add_special_tokens=False).to(entry.model.device)
+        if suffix["input_ids"].shape[1] == 0:
+            return None
+        prefix_ids, prefix_past = self._prefix_state(entry, prefix)
+        n = len(prompts)
+        inputs = {
+            "input_ids": torch.cat([prefix_ids.expand(n, -1), suffix["input_ids"]], dim=1),
+            "attention_mask": torch.cat([torch.ones_like(prefix_ids).expand(n, -1), suffix["attention_mask"]], dim=1),
+        }
+        past = copy.deepcopy(prefix_past)  # generate() appends to it
+        if n > 1:
+            past.batch_repeat_interleave(n)
+        return inputs, past
+
+    def generate_batch(self, repo_id: str, prompts: list[str], params: dict) -> list[GenResult]:
+        """
+        One `model.generate` over all prompts (same params); returns only the new text per prompt,
+        with per-row token counts. latency_ms covers the whole batch (and the load, if any).
+        """
+        p = _norm_params(params)
+        t0 = time.time()
+        with local_models.use(repo_id) as entry:
+            tok, model = entry.tokenizer, entry.model
+            load_ms = entry.load_ms if entry.uses == 1 else 0  # first use = loaded for this call
+            if p["seed"] is not None:
+                TRANSFORMERS().set_seed(p["seed"])
+            prefix = prefix_of(prompts[0])
+            prefixed = None
+            if prefix and all(prefix_of(x) == prefix for x in prompts):
+                prefixed = self._prefixed_inputs(entry, prompts, prefix)
+            if prefixed is not None:
+                inputs, past = prefixed
+                extra = {"past_key_values": past}
+            else:
+                inputs, extra = tok(prompts, return_tensors="pt", padding=True).to(model.device), {}
+            t_gen = time.time()
+            gen = model.generate(**inputs, **extra, **self._generate_kwargs(tok, p))
+            gen_ms = int((time.time() - t_gen) * 1000)
+            new_tokens = gen[:, inputs["input_ids"].shape[1]:]
+            texts = tok.batch_decode(new_tokens, skip_special_tokens=True)
+            prompt_counts = inputs["attention_mask"].sum(dim=1).tolist()
+            completion_counts = (new_tokens != tok.pad_token_id).sum(dim=1).tolist()
+        latency_ms = int((time.time() - t0) * 1000)
+        return [
+            GenResult(
+                text=text.strip(), latency_ms=latency_ms,
+                prompt_tokens=int(n_in), completion_tokens=int(n_out), load_ms=load_ms,
+                tokens_per_s=_rate(int(n_out), gen_ms),
+            )
+            for text, n_in, n_out in zip(texts, prompt_counts, completion_counts)
+        ]
+
+    def _batcher(self, repo_id: str) -> MicroBatcher:
+        with self._batchers_lock:
+            if repo_id not in self._batchers:
+                self._batchers[repo_id] = MicroBatcher(
+                    lambda prompts, params: self.generate_batch(repo_id, prompts, params),
+                    max_batch=getattr(settings, "LOCAL_BATCH_MAX_SIZE", 8),
+                    window_ms=getattr(settings, "LOCAL_BATCH_WINDOW_MS", 10),
+                    name=repo_id,
+                )
+            return self._batchers[repo_id]
 
     def generate(self, repo_id: str, prompt: str, params: dict) -> GenResult:
         p = _norm_params(params)
-        from transformers import StoppingCriteriaList
-        tok, model = self._load(repo_id)
-        inputs = tok(prompt, return_tensors="pt").to(model.device)
         t0 = time.time()
-        gen = model.generate(
-            **inputs,
-            do_sample=True,
-            temperature=p["temperature"],
-            top_p=p["top_p"],
-            top_k=p["top_k"],
-            max_new_tokens=p["max_new_tokens"]
-        )
-        text = tok.decode(gen[0], skip_special_tokens=True)
-        return GenResult(text=text, latency_ms=int((time.time()-t0)*1000))
-class HFRouterOpenAIBackend:
+        if getattr(settings, "LOCAL_BATCH_MAX_SIZE", 8) > 1:
+            group = None if p["seed"] is not None else (tuple(sorted(p.items())), prefix_of(prompt))
+            result = self._batcher(repo_id)(prompt, params, group)
+        else:
+            result = self.generate_batch(repo_id, [prompt], params)[0]
+        result.latency_ms = int((time.time()-t0)*1000)  # includes time queued for a batch
+        return result
+
+    async def agenerate(self, repo_id: str, prompt: str, params: dict) -> GenResult:
+        return await asyncio.to_thread(self.generate, repo_id, prompt, params)
+
+    def stream_generate(self, repo_id: str, prompt: str, params: dict) -> Generator[str, None, None]:
+        """
+        `model.generate` runs on its own thread and pushes decoded text into a TextIteratorStreamer
+        that this generator drains. Streams are not micro-batched. If the consumer goes away, a
+        stopping criterion ends generation at the next token.
+        """
+        torch, transformers = TORCH(), TRANSFORMERS()
+
+        class _StopWhen(transformers.StoppingCriteria):
+            def __init__(self, event): self.event = event
+            def __call__(self, input_ids, scores, **kwargs):
+                return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+        p = _norm_params(params)
+        with local_models.use(repo_id) as entry:
+            tok, model = entry.tokenizer, entry.model
+            if p["seed"] is not None:
+                TRANSFORMERS().set_seed(p["seed"])
+            stop = threading.Event()
+            streamer = transformers.TextIteratorStreamer(tok, skip_prompt=True, skip_special_tokens=True,
+                                            timeout=settings.STREAM_TIMEOUT_SECS)
+            inputs = tok(prompt, return_tensors="pt").to(model.device)
+            errors = []
+
+            def run(**kwargs):
+                try:
+                    model.generate(**kwargs)
+                except BaseException as e:  # surfaced to the consumer below
+                    errors.append(e)
+                    streamer.end()  # otherwise the consumer waits STREAM_TIMEOUT_SECS for a token
+
+            worker = threading.Thread(
+                target=run, name=f"local-stream-{repo_id}", daemon=True,
+                kwargs={**inputs, **self._generate_kwargs(tok, p), "streamer": streamer,
+                        "stopping_criteria": transformers.StoppingCriteriaList([_StopWhen(stop)])},
+            )
+            worker.start()
+            try:
+                for text in streamer:
+                    if text:
+                        yield text
+                if errors:
+                    raise errors[0]
+            finally:
+                stop.set()
+                worker.join()
+
+    async def astream_generate(self, repo_id: str, prompt: str, params: dict) -> AsyncIterator[str]:
+        chunks = self.stream_generate(repo_id, prompt, params)
+        done = object()
+        try:
+            while (chunk := await asyncio.to_thread(next, chunks, done)) is not done:
+                yield chunk
+        finally:
+            chunks.close()
+
+class HFRouterOpenAIBackend(AsyncBackend):
     """OpenAI-compatible Hugging Face Router (/v1/chat/completions)."""
     def __init__(self, base_url=None, token=None):
         self.base_url = (base_url or getattr(settings, "HF_ROUTER_BASE_URL", "https://router.huggingface.co/v1")).rstrip("/")
@@ -105,7 +377,7 @@ class HFRouterOpenAIBackend:
         self.url = f"{self.base_url}/chat/completions"
         self.headers = {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
 
-    def generate(self, model_id: str, prompt: str, params: dict) -> GenResult:
+    def _payload(self, model_id: str, prompt: str, params: dict, stream: bool) -> dict:
         p = _norm_params(params)
         payload = {
             "model": model_id,
@@ -114,54 +386,143 @@ class HFRouterOpenAIBackend:
             "top_p": p["top_p"],
             "max_tokens": p["max_new_tokens"],      # OpenAI-style field
             "extra_body": {"top_k": p["top_k"]},    # non-standard; router understands
-            "stream": False
+            "stream": stream
         }
+        if p["seed"] is not None:
+            payload["seed"] = p["seed"]
+        return payload
+
+    async def agenerate(self, model_id: str, prompt: str, params: dict) -> GenResult:
+        payload = self._payload(model_id, prompt, params, False)
         t0 = time.time()
-        r = requests.post(self.url, headers=self.headers, json=payload, timeout=120)
+        r = await get_async_client(self.url).post(self.url, headers=self.headers, json=payload, timeout=120)
         r.raise_for_status()
         data = r.json()
         text = (data["choices"][0]["message"]["content"] or "").strip()
-        return GenResult(text=text, latency_ms=int((time.time() - t0) * 1000))
+        latency_ms = int((time.time() - t0) * 1000)
+        usage = data.get("usage") or {}
+        return GenResult(
+            text=text, latency_ms=latency_ms,
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            tokens_per_s=_rate(usage.get("completion_tokens"), latency_ms),  # end-to-end, includes prefill
+        )
 
-class OllamaBackend:
+    async def astream_generate(self, model_id: str, prompt: str, params: dict) -> AsyncIterator[str]:
+        # OpenAI chat.completion.chunk events: data: {"choices": [{"delta": {"content": ...}}]} ... data: [DONE]
+        client = get_async_client(self.url)
+        async with client.stream("POST", self.url, headers=self.headers,
+                                 json=self._payload(model_id, prompt, params, True),
+                                 timeout=settings.STREAM_TIMEOUT_SECS) as resp:
+            resp.raise_for_status()
+            async for data in _aiter_sse_data(resp):
+                if data == "[DONE]":
+                    break
+                try:
+                    j = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                for choice in j.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield content
+
+class OllamaBackend(AsyncBackend):
+    """
+    `base_url` (default OLLAMA_BASE_URL) may list several replicas, comma-separated; each call
+    is routed by the OllamaPool (least outstanding, model affinity, ejection of failing hosts).
+    A request that cannot connect is retried once per remaining replica.
+    """
     def __init__(self, base_url: Optional[str] = None):
-        self.base_url = (base_url or getattr(settings, "OLLAMA_BASE_URL", "http://localhost:11434")).rstrip("/")
+        self.pool = OllamaPool.from_setting(base_url or getattr(settings, "OLLAMA_BASE_URL", "http://localhost:11434"))
+        self.base_url = self.pool.replicas[0].url
         self.url = f"{self.base_url}/api/generate"
         self.headers = {"Content-Type": "application/json"}
 
     def _payload(self, model: str, prompt: str, p: dict, stream: bool):
-        return {
+        options = {
+            "temperature": p["temperature"],
+            "top_p": p["top_p"],
+            "top_k": p["top_k"],
+            "num_predict": p["max_new_tokens"],
+        }
+        if p["seed"] is not None:
+            options["seed"] = p["seed"]
+        payload = {
             "model": model,
             "prompt": prompt,
             "stream": stream,
-            "options": {
-                "temperature": p["temperature"],
-                "top_p": p["top_p"],
-                "top_k": p["top_k"],
-                "num_predict": p["max_new_tokens"],
-            },
+            "options": options,
         }
+        # Keeps the model, and with it the KV cache of the last prompt's prefix, resident
+        # between calls; templated prompts then only pay prompt_eval for their suffix.
+        keep_alive = keep_alive_for(model)
+        if keep_alive:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    async def apreload(self, model: str, keep_alive: Optional[str] = None) -> GenResult:
+        """
+        Load `model` on the replica the pool would route it to, without generating
+        (Ollama loads a model for a request with no prompt). load_ms is 0 if it was already resident.
+        """
+        with self.pool.lease(model) as replica:
+            url = f"{replica.url}/api/generate"
+            t0 = time.time()
+            r = await get_async_client(url).post(url, headers=self.headers, json={
+                "model": model, "keep_alive": keep_alive or keep_alive_for(model) or "5m",
+            }, timeout=settings.REQUEST_TIMEOUT_SECS)
+            r.raise_for_status()
+            return GenResult(text="", latency_ms=int((time.time()-t0)*1000), **self._stats(r.json()))
 
-    def generate(self, model: str, prompt: str, params: dict) -> GenResult:
+    def preload(self, model: str, keep_alive: Optional[str] = None) -> GenResult:
+        return run_sync(self.apreload(model, keep_alive))
+
+    async def agenerate(self, model: str, prompt: str, params: dict) -> GenResult:
         p = _norm_params(params)
-        t0 = time.time()
-        r = requests.post(self.url, headers=self.headers, json=self._payload(model, prompt, p, False),
-                          timeout=settings.REQUEST_TIMEOUT_SECS)
-        r.raise_for_status()
-        data = r.json()
-        return GenResult(text=(data.get("response") or "").strip(),
-                         latency_ms=int((time.time()-t0)*1000))
+        tried: list[str] = []
+        while True:
+            try:
+                with self.pool.lease(model, exclude=tried) as replica:
+                    tried.append(replica.url)
+                    url = f"{replica.url}/api/generate"
+                    t0 = time.time()
+                    r = await get_async_client(url).post(url, headers=self.headers,
+                                                         json=self._payload(model, prompt, p, False),
+                                                         timeout=settings.REQUEST_TIMEOUT_SECS)
+                    r.raise_for_status()
+                    data = r.json()
+                    return GenResult(text=(data.get("response") or "").strip(),
+                                     latency_ms=int((time.time()-t0)*1000), **self._stats(data))
+            except httpx.ConnectError:
+                if len(tried) >= len(self.pool.replicas):
+                    raise
+
+    @staticmethod
+    def _stats(data: dict) -> dict:
+        """Token counts and phase timings from the final /api/generate object (durations are in ns)."""
+        load_ms, prompt_ms, eval_ms = (_ms(data.get(k)) for k in ("load_duration", "prompt_eval_duration", "eval_duration"))
+        return {
+            "prompt_tokens": data.get("prompt_eval_count"),
+            "completion_tokens": data.get("eval_count"),
+            "load_ms": load_ms,
+            "ttft_ms": (load_ms or 0) + prompt_ms if prompt_ms is not None else None,
+            "tokens_per_s": _rate(data.get("eval_count"), eval_ms),
+        }
 
-    def stream_generate(self, model: str, prompt: str, params: dict) -> Generator[str, None, None]:
+    async def astream_generate(self, model: str, prompt: str, params: dict) -> AsyncIterator[str]:
         p = _norm_params(params)
-        with requests.post(self.url, headers=self.headers, json=self._payload(model, prompt, p, True),
-                           stream=True, timeout=settings.STREAM_TIMEOUT_SECS) as resp:
-            resp.raise_for_status()
-            for line in resp.iter_lines(decode_unicode=True):
-                if not line: continue
-                try:
-                    j = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                if j.get("response"): yield j["response"]
-                if j.get("done"): break
\ No newline at end of file
+        with self.pool.lease(model) as replica:
+            url = f"{replica.url}/api/generate"
+            async with get_async_client(url).stream("POST", url, headers=self.headers,
+                                                    json=self._payload(model, prompt, p, True),
+                                                    timeout=settings.STREAM_TIMEOUT_SECS) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line: continue
+                    try:
+                        j = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if j.get("response"): yield j["response"]
+                    if j.get("done"): break
@@ -0,0 +1,93 @@
+# apps/inference/batching.py
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Pending:
+    prompt: str
+    params: dict
+    group: Optional[Hashable]  # requests with equal groups may share a batch; None = run alone
+    future: Future = field(default_factory=Future)
+
+
+class MicroBatcher:
+    """
+    Gathers prompts that arrive within `window_ms` of the first one (or until `max_batch`
+    are waiting) and runs them through `run_batch(prompts, params) -> results` as one call.
+
+    A single worker thread owns the model, so calls for the same model never overlap.
+    Within a gathered batch, prompts are split by `group` (normally the sampling params)
+    because one `generate` call can only use one set of params.
+    """
+
+    def __init__(self, run_batch: Callable[[list[str], dict], list[Any]], *,
+                 max_batch: int = 8, window_ms: float = 10.0, name: str = "local"):
+        self.run_batch = run_batch
+        self.max_batch = max(1, int(max_batch))
+        self.window_s = max(0.0, float(window_ms)) / 1000.0
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"microbatch-{name}", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, prompt: str, params: dict, group: Optional[Hashable]) -> Future:
+        item = _Pending(prompt=prompt, params=params, group=group)
+        self._queue.put(item)
+        return item.future
+
+    def __call__(self, prompt: str, params: dict, group: Optional[Hashable]) -> Any:
+        return self.submit(prompt, params, group).result()
+
+    @property
+    def mean_batch_size(self) -> Optional[float]:
+        return round(self.items / self.batches, 2) if self.batches else None
+
+    # ---------- worker ----------
+    def _gather(self) -> list[_Pending]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            gathered = self._gather()
+            groups: dict = {}
+            for item in gathered:
+                key = ("solo", id(item)) if item.group is None else ("group", item.group)
+                groups.setdefault(key, []).append(item)
+            for items in groups.values():
+                self._run(items)
+
+    def _run(self, items: list[_Pending]) -> None:
+        try:
+            results = self.run_batch([i.prompt for i in items], items[0].params)
+            if len(results) != len(items):
+                raise RuntimeError(f"batch returned {len(results)} outputs for {len(items)} prompts")
+        except Exception as e:
+            logger.exception("Micro-batch of %s prompts failed", len(items))
+            for item in items:
+                item.future.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(items)
+        for item, result in zip(items, results):
+            item.future.set_result(result)
@@ -0,0 +1,156 @@
+# apps/inference/cache.py
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .backends import GenResult, TIMING_FIELDS, _norm_params
+from .models import GenerationCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCache:
+    """
+    Persistent, content-addressed cache of backend responses.
+
+    Only deterministic calls are cached (temperature 0, or an explicit seed), so a hit
+    returns exactly what the backend would have produced. Entries expire after
+    GENERATION_CACHE_TTL_SECS and the least recently used ones are evicted once the
+    table grows past GENERATION_CACHE_MAX_ENTRIES. Cache failures never fail a
+    generation: they are logged and the backend is called as usual.
+    """
+    EVICT_EVERY = 50  # stores between eviction passes
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+    # ---------- config ----------
+    @property
+    def enabled(self) -> bool:
+        return bool(getattr(settings, "GENERATION_CACHE_ENABLED", True))
+
+    @property
+    def max_entries(self) -> int:
+        return int(getattr(settings, "GENERATION_CACHE_MAX_ENTRIES", 50_000))
+
+    @property
+    def ttl_secs(self) -> int:
+        return int(getattr(settings, "GENERATION_CACHE_TTL_SECS", 7 * 24 * 3600))
+
+    # ---------- helpers ----------
+    @staticmethod
+    def is_deterministic(params: dict) -> bool:
+        p = _norm_params(params)
+        return p["temperature"] == 0.0 or p["seed"] is not None
+
+    @staticmethod
+    def make_key(namespace: str, model_id: str, prompt: str, params: dict) -> str:
+        blob = json.dumps(
+            {"ns": namespace, "model": model_id, "prompt": str(prompt), "params": _norm_params(params)},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    # ---------- storage ----------
+    def get(self, key: str) -> GenResult | None:
+        t0 = time.time()
+        entry = GenerationCacheEntry.objects.filter(key=key).first()
+        if entry is None:
+            return None
+        if entry.created_at < timezone.now() - timedelta(seconds=self.ttl_secs):
+            entry.delete()
+            return None
+        GenerationCacheEntry.objects.filter(pk=entry.pk).update(hits=F("hits") + 1, last_used_at=timezone.now())
+        fields = {f.name for f in dataclasses.fields(GenResult)} - set(TIMING_FIELDS)
+        data = {k: v for k, v in entry.result.items() if k in fields}
+        # latency_ms reports what this call cost, i.e. the lookup; token usage is kept,
+        # the original call's phase timings are not
+        data.update(latency_ms=int((time.time() - t0) * 1000), cached=True)
+        return GenResult(**data)
+
+    def put(self, key: str, model_id: str, result: GenResult) -> None:
+        data = dataclasses.asdict(result)
+        data.pop("cached", None)
+        GenerationCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={"model_id": model_id, "result": data, "created_at": timezone.now(), "last_used_at": timezone.now()},
+        )
+        self._count("stores")
+        if self._counters["stores"] % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones beyond max_entries."""
+        cutoff = timezone.now() - timedelta(seconds=self.ttl_secs)
+        removed, _ = GenerationCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+        overflow = GenerationCacheEntry.objects.count() - self.max_entries
+        if overflow > 0:
+            stale = list(GenerationCacheEntry.objects.order_by("last_used_at").values_list("id", flat=True)[:overflow])
+            n, _ = GenerationCacheEntry.objects.filter(id__in=stale).delete()
+            removed += n
+        self._count("evictions", removed)
+        return removed
+
+    def clear(self) -> int:
+        n, _ = GenerationCacheEntry.objects.all().delete()
+        return n
+
+    # ---------- main entry point ----------
+    def get_or_generate(self, *, namespace: str, model_id: str, prompt: str, params: dict,
+                        call: Callable[[], GenResult], bypass: bool = False) -> GenResult:
+        if not self.enabled or not self.is_deterministic(params):
+            return call()
+        if bypass:
+            self._count("bypassed")
+            return call()
+
+        key = self.make_key(namespace, model_id, prompt, params)
+        try:
+            hit = self.get(key)
+        except Exception:
+            logger.exception("Generation cache lookup failed (non-fatal).")
+            hit = None
+        if hit is not None:
+            self._count("hits")
+            return hit
+
+        self._count("misses")
+        result = call()
+        if isinstance(result, GenResult):
+            try:
+                self.put(key, model_id, result)
+            except Exception:
+                logger.exception("Generation cache store failed (non-fatal).")
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "entries": GenerationCacheEntry.objects.count(),
+            "max_entries": self.max_entries,
+            "ttl_secs": self.ttl_secs,
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+generation_cache = GenerationCache()
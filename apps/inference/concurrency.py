@@ -0,0 +1,52 @@
+# apps/inference/concurrency.py
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from django.db import close_old_connections
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def _run_task(fn: Callable[[T], R], item: T) -> R:
+    try:
+        return fn(item)
+    finally:
+        # Worker threads live outside the request cycle: release any DB connection
+        # the task opened, the same way Django does at the end of a request.
+        close_old_connections()
+
+
+def bounded_map(fn: Callable[[T], R], items: Iterable[T], *, concurrency: int,
+                window: int | None = None) -> Iterator[R]:
+    """
+    Apply `fn` to `items` on a thread pool with at most `concurrency` calls in flight,
+    yielding results in input order.
+
+    Items are pulled lazily and at most `window` results (default 2 x concurrency) are
+    buffered, so memory stays flat however long the input is. Exceptions raised by
+    `fn` propagate to the consumer; callers that want per-item errors catch them inside `fn`.
+    """
+    concurrency = max(1, int(concurrency))
+    if concurrency == 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    window = max(concurrency, window or concurrency * 2)
+    pending: deque = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bounded-map") as pool:
+        try:
+            for item in items:
+                pending.append(pool.submit(_run_task, fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Consumer stopped early (client disconnect, error): drop queued work.
+            for fut in pending:
+                fut.cancel()
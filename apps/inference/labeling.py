@@ -0,0 +1,222 @@
+# apps/inference/labeling.py
+from __future__ import annotations
+
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+
+from apps.models_registry.models import HFModel
+from .concurrency import bounded_map
+from .prompts import PrefixedPrompt
+from .router import generate_for_model
+
+logger = logging.getLogger(__name__)
+
+# Fixed instructions first, the claim last: every row shares the prefix, so backends can
+# reuse its KV cache instead of re-reading it per claim (see .prompts.PrefixedPrompt).
+LABEL_PROMPT_PREFIX = (
+    "You are a binary fact checker. Given a CLAIM, decide if it is Accepted or Refuted, "
+    "and provide a BRIEF justification grounded in general knowledge.\n"
+    "Respond in JSON ONLY with keys: label (Accepted|Refuted), justification (<= 2 sentences).\n\n"
+)
+LABEL_PROMPT_SUFFIX = "CLAIM: {claim}\n"
+LABEL_PROMPT_TEMPLATE = LABEL_PROMPT_PREFIX + LABEL_PROMPT_SUFFIX
+
+
+def label_prompt(claim: str) -> PrefixedPrompt:
+    return PrefixedPrompt(LABEL_PROMPT_PREFIX, LABEL_PROMPT_SUFFIX.format(claim=claim))
+
+
+LABEL_FIELDS = [
+    "row_id", "claim", "reference", "gold_label",
+    "pred_label", "justification", "model_slug", "latency_ms",
+]
+
+
+def _normalize_label(s: str) -> Optional[str]:
+    if not s:
+        return None
+    t = s.strip().lower()
+    pos = {"accepted", "support", "supported", "true", "yes", "correct"}
+    neg = {"refuted", "reject", "rejected", "false", "no", "incorrect", "not supported"}
+    if t in pos: return "Accepted"
+    if t in neg: return "Refuted"
+    if any(k in t for k in ["refut", "false", "not supported", "incorrect"]): return "Refuted"
+    if any(k in t for k in ["accept", "support", "true", "correct", "supported"]): return "Accepted"
+    return None
+
+def _extract_label_and_justification(text: str) -> tuple[Optional[str], str]:
+    if not text:
+        return None, ""
+    # try JSON
+    try:
+        j = json.loads(text)
+        if isinstance(j, dict):
+            lab = _normalize_label(j.get("label", ""))
+            just = (j.get("justification", "") or "").strip()
+            if lab:
+                return lab, just
+    except Exception:
+        pass
+    # try "Label: ...", "Justification: ..."
+    m_lab = re.search(r"label\s*[:\-]\s*(.+)", text, re.I)
+    m_jus = re.search(r"(justification|reason|because)\s*[:\-]\s*(.+)", text, re.I)
+    lab2 = _normalize_label(m_lab.group(1)) if m_lab else None
+    jus2 = (m_jus.group(2).strip() if m_jus else "").strip()
+    if lab2:
+        return lab2, jus2
+    # heuristic: first sentence verdict + rest as reason
+    parts = re.split(r"(?<=[\.\!\?])\s+", text.strip(), maxsplit=1)
+    lab3 = _normalize_label(parts[0])
+    jus3 = (parts[1] if len(parts) > 1 else text).strip()
+    return lab3, jus3[:500]
+
+def _clean_model_text(s: str) -> str:
+    s = (s or "").strip()
+    if s.startswith("```"):
+        s = re.sub(r"^```(?:json)?", "", s, flags=re.I).strip()
+        s = re.sub(r"```$", "", s).strip()
+    return s
+
+
+def label_concurrency(model: HFModel, requested: Optional[int] = None) -> int:
+    """
+    Worker-pool size for labeling against `model`: the requested value (or LABEL_CONCURRENCY),
+    capped by the per-model limit in LABEL_MODEL_CONCURRENCY (or LABEL_MAX_CONCURRENCY).
+    """
+    per_model = getattr(settings, "LABEL_MODEL_CONCURRENCY", {}) or {}
+    cap = int(per_model.get(model.slug, getattr(settings, "LABEL_MAX_CONCURRENCY", 16)))
+    n = requested or getattr(settings, "LABEL_CONCURRENCY", 4)
+    return max(1, min(int(n), cap))
+
+
+def _percentile(values: list[int], q: float) -> Optional[int]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+@dataclass
+class LabelStats:
+    """Aggregate throughput for one labeling run."""
+    concurrency: int
+    rows: int = 0
+    errors: int = 0
+    latencies: list[int] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    elapsed_s: float = 0.0
+
+    def record(self, result: dict) -> None:
+        self.rows += 1
+        if str(result.get("justification", "")).startswith("ERROR:"):
+            self.errors += 1
+        if isinstance(result.get("latency_ms"), int):
+            self.latencies.append(result["latency_ms"])
+        self.elapsed_s = time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "errors": self.errors,
+            "concurrency": self.concurrency,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "rows_per_s": round(self.rows / self.elapsed_s, 3) if self.elapsed_s > 0 else None,
+            "latency_p50_ms": _percentile(self.latencies, 0.50),
+            "latency_p95_ms": _percentile(self.latencies, 0.95),
+        }
+
+
+def label_row(model: HFModel, row, params: Optional[dict] = None, use_cache: bool = True) -> dict:
+    """Label one DatasetRow. Backend failures are reported in the row, never raised."""
+    claim = (row.claim or "").strip()
+    pred_label = ""
+    justification = ""
+    latency_ms = ""
+
+    if claim:
+        try:
+            result = generate_for_model(
+                model, label_prompt(claim), params or {}, use_cache=use_cache,
+            )
+            cleaned = _clean_model_text(getattr(result, "text", "") or "")
+            lab, jus = _extract_label_and_justification(cleaned)
+            pred_label = lab or ""
+            justification = (jus or "").strip().replace("\n", " ").strip('"')
+            latency_ms = getattr(result, "latency_ms", "")
+        except Exception as e:
+            logger.exception("Labeling failed for row=%s", row.id)
+            justification = f"ERROR: {e}"
+
+    return {
+        "row_id": row.id,
+        "claim": claim,
+        "reference": (row.reference or ""),
+        "gold_label": (row.label or ""),
+        "pred_label": pred_label,
+        "justification": justification,
+        "model_slug": model.slug,
+        "latency_ms": latency_ms,
+    }
+
+
+def iter_label_rows(model: HFModel, rows: Iterable, *, concurrency: int,
+                    params: Optional[dict] = None, use_cache: bool = True,
+                    stats: Optional[LabelStats] = None) -> Iterator[dict]:
+    """
+    Label `rows` with up to `concurrency` backend calls in flight.
+    Results come back in the order of `rows` (i.e. by row_id for an id-ordered queryset).
+    """
+    work = lambda row: label_row(model, row, params, use_cache)
+    for result in bounded_map(work, rows, concurrency=concurrency):
+        if stats is not None:
+            stats.record(result)
+        yield result
+
+
+def label_rows(model: HFModel, rows: Iterable, *, concurrency: int,
+               params: Optional[dict] = None, use_cache: bool = True) -> tuple[list[dict], LabelStats]:
+    stats = LabelStats(concurrency=concurrency)
+    results = list(iter_label_rows(
+        model, rows, concurrency=concurrency, params=params, use_cache=use_cache, stats=stats,
+    ))
+    logger.info("Labeled %s rows with model=%s: %s", stats.rows, model.slug, stats.as_dict())
+    return results, stats
+
+
+JUDGE_FIELDS = ["correctness", "relevance", "fluency", "overall", "judge_error"]
+
+
+def judge_label_row(judge_model: str, result: dict) -> dict:
+    """A labeled row with the judge's scores of its justification against the reference merged in."""
+    from apps.eval.judge import judge_with_mistral
+
+    scores: dict = {}
+    justification, reference = result.get("justification", ""), result.get("reference", "")
+    if not reference or not justification or justification.startswith("ERROR:"):
+        scores = {"judge_error": "nothing to judge"}
+    else:
+        try:
+            scores = judge_with_mistral(justification, reference, judge_model=judge_model)
+        except Exception as e:
+            logger.exception("Judging failed for row=%s", result.get("row_id"))
+            scores = {"error": str(e)}
+        if "error" in scores:
+            scores = {"judge_error": str(scores.get("error"))}
+    return {**result, **{k: scores.get(k, "") for k in JUDGE_FIELDS}}
+
+
+def iter_judge_label_rows(judge_model: str, results: Iterable[dict], *, concurrency: int) -> Iterator[dict]:
+    """Judge `results` with up to `concurrency` judge calls in flight, yielding rows in input order."""
+    work = lambda result: judge_label_row(judge_model, result)
+    yield from bounded_map(work, results, concurrency=concurrency)
+
+
+def judge_label_rows(judge_model: str, results: list[dict], *, concurrency: int) -> list[dict]:
+    return list(iter_judge_label_rows(judge_model, results, concurrency=concurrency))
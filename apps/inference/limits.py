@@ -0,0 +1,293 @@
+# apps/inference/limits.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name: str, default):
+    return type(default)(getattr(settings, name, default))
+
+
+class CircuitOpenError(httpx.ConnectError):
+    """Raised instead of sending a request to a host whose breaker is open.
+    A ConnectError, so callers with failover (OllamaPool) move on to another host."""
+
+
+class _Waiter:
+    __slots__ = ("loop", "fut", "granted")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.fut = loop.create_future()
+        self.granted = False
+
+    def wake(self) -> None:
+        if not self.fut.done():
+            self.fut.set_result(None)
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit for one host (additive increase, multiplicative decrease).
+
+    Each success under HOST_LATENCY_TOLERANCE x the baseline latency grows the limit by
+    1/limit (about +1 per round trip at full load). A failure (transport error, timeout,
+    429, 5xx) halves it, and a slow success shrinks it by 10%; decreases happen at most
+    once per cooldown so one burst of errors does not collapse it. The baseline is the
+    lowest recent latency and decays upward slowly, so it follows the host. Callers over
+    the limit wait in FIFO order, on whichever event loop they run.
+    """
+    DECREASE_COOLDOWN_SECS = 1.0
+
+    def __init__(self):
+        self.min_limit = _setting("HOST_CONCURRENCY_MIN", 1)
+        self.max_limit = _setting("HOST_CONCURRENCY_MAX", 64)
+        self.limit = float(min(self.max_limit, max(self.min_limit, _setting("HOST_CONCURRENCY_INITIAL", 8))))
+        self.tolerance = _setting("HOST_LATENCY_TOLERANCE", 3.0)
+        self.in_flight = 0
+        self.baseline_ms: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters: deque[_Waiter] = deque()
+
+    async def acquire(self) -> None:
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                return
+            waiter = _Waiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+        try:
+            await waiter.fut  # the slot is counted for us by _wake()
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release_slot()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+    def _release_slot(self) -> None:
+        """Caller holds self._lock."""
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        """Caller holds self._lock. Grant free slots to waiters in arrival order."""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.loop.call_soon_threadsafe(waiter.wake)
+
+    def release(self, latency_ms: Optional[float], ok: bool) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if ok and latency_ms is not None:
+                self.baseline_ms = latency_ms if self.baseline_ms is None else min(self.baseline_ms * 1.01, latency_ms)
+                if latency_ms <= self.tolerance * max(self.baseline_ms, 1.0):
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                elif now - self._last_decrease > self.DECREASE_COOLDOWN_SECS:
+                    self.limit = max(self.min_limit, self.limit * 0.9)
+                    self._last_decrease = now
+            elif not ok and now - self._last_decrease > self.DECREASE_COOLDOWN_SECS:
+                self.limit = max(self.min_limit, self.limit * 0.5)
+                self._last_decrease = now
+            self._release_slot()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "baseline_ms": round(self.baseline_ms, 1) if self.baseline_ms is not None else None,
+            }
+
+
+class CircuitBreaker:
+    """
+    closed -> open when, over the last BREAKER_WINDOW calls (at least BREAKER_MIN_REQUESTS),
+    the failure rate reaches BREAKER_FAILURE_RATE. While open, calls fail fast with
+    CircuitOpenError. After BREAKER_COOLDOWN_SECS one trial call is let through (half-open):
+    success closes the breaker, failure re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self.window = _setting("BREAKER_WINDOW", 20)
+        self.min_requests = _setting("BREAKER_MIN_REQUESTS", 5)
+        self.failure_rate = _setting("BREAKER_FAILURE_RATE", 0.5)
+        self.cooldown = _setting("BREAKER_COOLDOWN_SECS", 30.0)
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._outcomes: deque = deque(maxlen=self.window)
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"circuit open for {self.origin}")
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if ok:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                    logger.info("Circuit closed for %s", self.origin)
+                else:
+                    self._open()
+                return
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_requests
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open()
+
+    def abandon(self) -> None:
+        """The call never completed (cancelled); let another one be the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        logger.warning("Circuit opened for %s for %ss", self.origin, self.cooldown)
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = len(self._outcomes)
+            return {
+                "state": self.state,
+                "failure_rate": round(self._outcomes.count(False) / n, 3) if n else None,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+class HostGuard:
+    def __init__(self, origin: str):
+        self.origin = origin
+        self.limiter = AIMDLimiter()
+        self.breaker = CircuitBreaker(origin)
+        self.requests = 0
+        self.failures = 0
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "failures": self.failures,
+                **self.limiter.stats(), "breaker": self.breaker.stats()}
+
+
+_guards: dict[str, HostGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def guard_for(origin: str) -> HostGuard:
+    with _guards_lock:
+        guard = _guards.get(origin)
+        if guard is None:
+            guard = _guards[origin] = HostGuard(origin)
+        return guard
+
+
+def guard_stats() -> dict:
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {g.origin: g.stats() for g in guards}
+
+
+def _is_failure(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Keeps the host slot until the body is consumed or closed (streams hold it for their whole length)."""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+
+class GuardedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that puts every request to one origin behind its HostGuard:
+    circuit breaker check -> adaptive concurrency slot -> request -> outcome recorded.
+    Latency is time to response headers, which for streams is roughly time to first token.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, origin: str):
+        self.inner = inner
+        self.guard = guard_for(origin)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        guard = self.guard
+        guard.breaker.before_call()
+        try:
+            await guard.limiter.acquire()
+        except BaseException:
+            guard.breaker.abandon()
+            raise
+        guard.requests += 1
+        t0 = time.monotonic()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except Exception:
+            guard.failures += 1
+            guard.breaker.record(ok=False)
+            guard.limiter.release(None, ok=False)
+            raise
+        except BaseException:
+            # cancelled by the caller: not the host's fault
+            guard.breaker.abandon()
+            guard.limiter.release(None, ok=True)
+            raise
+        latency_ms = (time.monotonic() - t0) * 1000
+        ok = not _is_failure(response.status_code)
+        guard.failures += not ok
+        guard.breaker.record(ok)
+        release = lambda: guard.limiter.release(latency_ms, ok)
+        if isinstance(response.stream, httpx.ByteStream):
+            release()  # body already in memory
+        else:
+            response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
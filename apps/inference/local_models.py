@@ -0,0 +1,215 @@
+# apps/inference/local_models.py
+from __future__ import annotations
+
+import gc
+import importlib.util
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+
+from .providers import torch as TORCH, transformers as TRANSFORMERS
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+@dataclass
+class LoadedModel:
+    repo_id: str
+    tokenizer: Any
+    model: Any
+    size_bytes: int
+    load_ms: int
+    loaded_at: float = field(default_factory=time.time)
+    last_used_at: float = field(default_factory=time.time)
+    uses: int = 0
+    in_use: int = 0
+    # PrefixedPrompt.prefix -> (input_ids, past_key_values), see LocalBackend._prefix_state
+    prefixes: "OrderedDict[str, tuple]" = field(default_factory=OrderedDict)
+
+    def as_dict(self) -> dict:
+        return {
+            "repo_id": self.repo_id,
+            "size_mb": round(self.size_bytes / MB, 1),
+            "load_ms": self.load_ms,
+            "loaded_at": self.loaded_at,
+            "last_used_at": self.last_used_at,
+            "uses": self.uses,
+            "in_use": self.in_use,
+            "cached_prefixes": len(self.prefixes),
+        }
+
+
+def _physical_memory_bytes() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _footprint(model) -> int:
+    try:
+        return int(model.get_memory_footprint())
+    except Exception:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class LocalModelCache:
+    """
+    LRU cache of Transformers (tokenizer, model) pairs under a memory budget.
+
+    Before a load, least recently used models are evicted until the new one is expected to
+    fit (its size from a previous load, else the largest resident model); after the load the
+    budget is enforced again with the real footprint. Models currently generating are never
+    evicted. LOCAL_MODEL_MEMORY_BUDGET_MB = 0 means 60% of physical memory.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._known_sizes: dict[str, int] = {}
+        self._lock = threading.Lock()       # bookkeeping
+        self._load_lock = threading.Lock()  # one load at a time, so estimates stay honest
+        self.evictions = 0
+
+    # ---------- config ----------
+    @property
+    def budget_bytes(self) -> int:
+        mb = int(getattr(settings, "LOCAL_MODEL_MEMORY_BUDGET_MB", 0))
+        if mb > 0:
+            return mb * MB
+        total = _physical_memory_bytes()
+        return int(total * 0.6) if total else 8 * 1024 * MB
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(e.size_bytes for e in self._entries.values())
+
+    # ---------- loading ----------
+    def _load(self, repo_id: str) -> LoadedModel:
+        transformers = TRANSFORMERS()
+        t0 = time.time()
+        tok = transformers.AutoTokenizer.from_pretrained(repo_id)
+        tok.padding_side = "left"  # decoder-only: pad on the left so every row continues its own prompt
+        if tok.pad_token is None:
+            tok.pad_token = tok.eos_token
+        # device_map needs accelerate; without it the model loads on CPU
+        placement = {"device_map": "auto"} if importlib.util.find_spec("accelerate") else {}
+        model = transformers.AutoModelForCausalLM.from_pretrained(repo_id, torch_dtype="auto", **placement)
+        model.eval()
+        size = _footprint(model)
+        self._known_sizes[repo_id] = size
+        load_ms = int((time.time() - t0) * 1000)
+        logger.info("Loaded local model %s (%.0f MB) in %s ms", repo_id, size / MB, load_ms)
+        return LoadedModel(repo_id=repo_id, tokenizer=tok, model=model, size_bytes=size, load_ms=load_ms)
+
+    @staticmethod
+    def _pin(entry: LoadedModel) -> LoadedModel:
+        """Caller holds self._lock."""
+        entry.in_use += 1
+        entry.uses += 1
+        entry.last_used_at = time.time()
+        return entry
+
+    def _get_or_load_pinned(self, repo_id: str) -> LoadedModel:
+        """
+        Find or load `repo_id` and pin it in the same locked section, so a concurrent
+        unload() or eviction cannot release it before the caller starts using it.
+        """
+        with self._lock:
+            entry = self._entries.get(repo_id)
+            if entry is not None:
+                self._entries.move_to_end(repo_id)
+                return self._pin(entry)
+
+        with self._load_lock:
+            with self._lock:
+                entry = self._entries.get(repo_id)  # loaded while we waited
+                if entry is not None:
+                    self._entries.move_to_end(repo_id)
+                    return self._pin(entry)
+                largest = max((e.size_bytes for e in self._entries.values()), default=0)
+                self._evict_to_fit(self._known_sizes.get(repo_id, largest))
+
+            entry = self._load(repo_id)
+
+            with self._lock:
+                self._entries[repo_id] = entry
+                self._pin(entry)
+                self._evict_to_fit(0, keep=repo_id)
+            return entry
+
+    @contextmanager
+    def use(self, repo_id: str) -> Iterator[LoadedModel]:
+        """Pin a model for the duration of a generate call."""
+        entry = self._get_or_load_pinned(repo_id)
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+
+    # ---------- eviction ----------
+    def _evict_to_fit(self, incoming: int, keep: Optional[str] = None) -> None:
+        """Caller holds self._lock."""
+        budget = self.budget_bytes
+        for repo_id in list(self._entries):  # oldest first
+            if self.resident_bytes + incoming <= budget:
+                break
+            entry = self._entries[repo_id]
+            if repo_id == keep or entry.in_use:
+                continue
+            self._release(repo_id)
+        if self.resident_bytes + incoming > budget:
+            logger.warning(
+                "Local models use %.0f MB (+%.0f MB incoming) over a %.0f MB budget; nothing left to evict.",
+                self.resident_bytes / MB, incoming / MB, budget / MB,
+            )
+
+    def _release(self, repo_id: str) -> None:
+        entry = self._entries.pop(repo_id)
+        logger.info("Evicting local model %s (%.0f MB)", repo_id, entry.size_bytes / MB)
+        entry.model = entry.tokenizer = None
+        entry.prefixes.clear()
+        del entry
+        self.evictions += 1
+        gc.collect()
+        try:
+            torch = TORCH()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def unload(self, repo_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(repo_id)
+            if entry is None or entry.in_use:
+                return False
+            self._release(repo_id)
+            return True
+
+    def __contains__(self, repo_id: str) -> bool:
+        return repo_id in self._entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = [e.as_dict() for e in reversed(self._entries.values())]  # most recent first
+            resident = self.resident_bytes
+        return {
+            "budget_mb": round(self.budget_bytes / MB, 1),
+            "resident_mb": round(resident / MB, 1),
+            "evictions": self.evictions,
+            "models": entries,
+        }
+
+
+local_models = LocalModelCache()
@@ -0,0 +1,18 @@
+# apps/inference/management/commands/warm_models.py
+from django.core.management.base import BaseCommand
+from apps.inference.warm_pool import warm_pool
+
+class Command(BaseCommand):
+    help = "Preload active Ollama/local models and the judge model (see apps.inference.warm_pool)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", dest="slugs", help="HFModel slug (repeatable; default: all active)")
+        parser.add_argument("--no-judge", action="store_true", help="skip JUDGE_MODEL_OLLAMA")
+
+    def handle(self, *args, **opts):
+        results = warm_pool.preload(opts.get("slugs"), judge=not opts["no_judge"])
+        for r in results:
+            status = f"loaded in {r['load_ms']} ms" if r["ok"] else f"FAILED: {r['error']}"
+            self.stdout.write(f"{r['backend']:>8} {r['model']}: {status}")
+        if not all(r["ok"] for r in results):
+            self.stderr.write(f"{sum(not r['ok'] for r in results)} of {len(results)} models failed to load")
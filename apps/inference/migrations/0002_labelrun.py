@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0002_rename_num_rows_dataset_row_count_and_more'),
+        ('inference', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabelRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_slug', models.CharField(max_length=100)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('offset', models.PositiveIntegerField(default=0)),
+                ('limit', models.PositiveIntegerField(blank=True, null=True)),
+                ('chunk_size', models.PositiveIntegerField(default=200)),
+                ('concurrency', models.PositiveIntegerField(default=4)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('total_rows', models.PositiveIntegerField(default=0)),
+                ('chunks_total', models.PositiveIntegerField(default=0)),
+                ('chunks_done', models.PositiveIntegerField(default=0)),
+                ('rows_done', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_runs', to='datasets.dataset')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LabelChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('first_row_id', models.BigIntegerField()),
+                ('last_row_id', models.BigIntegerField()),
+                ('row_count', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done')], default='pending', max_length=20)),
+                ('results', models.JSONField(blank=True, default=list)),
+                ('stats', models.JSONField(blank=True, default=dict)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='inference.labelrun')),
+            ],
+            options={
+                'ordering': ['run', 'index'],
+                'constraints': [models.UniqueConstraint(fields=('run', 'index'), name='uniq_label_chunk_run_index')],
+            },
+        ),
+    ]
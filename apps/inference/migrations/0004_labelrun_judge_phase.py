@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inference', '0003_generationcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labelchunk',
+            name='judged_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='labelrun',
+            name='chunks_judged',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='labelrun',
+            name='judge_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='labelrun',
+            name='phase',
+            field=models.CharField(choices=[('label', 'Label'), ('judge', 'Judge')], default='label', max_length=10),
+        ),
+    ]
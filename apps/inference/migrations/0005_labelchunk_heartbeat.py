@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inference', '0004_labelrun_judge_phase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labelchunk',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
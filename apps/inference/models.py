@@ -16,3 +16,91 @@ class Generation(models.Model):
     def __str__(self):
         return f"{self.model} #{self.id} ({len(self.output or '')} chars)"
 
+
+
+class LabelRun(models.Model):
+    """
+    A dataset labeling job processed by Celery in row-range chunks.
+    Progress is checkpointed per LabelChunk, so a restarted run only redoes unfinished chunks.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+        CANCELLED = "cancelled", "Cancelled"
+
+    class Phase(models.TextChoices):
+        LABEL = "label", "Label"
+        JUDGE = "judge", "Judge"
+
+    dataset = models.ForeignKey("datasets.Dataset", on_delete=models.CASCADE, related_name="label_runs")
+    model_slug = models.CharField(max_length=100)
+    # Ollama judge model; when set, every row is judged after ALL rows are labeled, so the
+    # candidate and the judge model are each loaded once instead of alternating per row.
+    judge_model = models.CharField(max_length=100, blank=True, default="")
+    params = models.JSONField(default=dict, blank=True)
+    offset = models.PositiveIntegerField(default=0)
+    limit = models.PositiveIntegerField(null=True, blank=True)
+    chunk_size = models.PositiveIntegerField(default=200)
+    concurrency = models.PositiveIntegerField(default=4)   # backend calls in flight per chunk task
+
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    phase = models.CharField(max_length=10, choices=Phase.choices, default=Phase.LABEL)
+    total_rows = models.PositiveIntegerField(default=0)
+    chunks_total = models.PositiveIntegerField(default=0)
+    chunks_done = models.PositiveIntegerField(default=0)
+    chunks_judged = models.PositiveIntegerField(default=0)
+    rows_done = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)        # rows whose backend call failed
+    error = models.TextField(blank=True, default="")       # run-level failure, if any
+
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"LabelRun #{self.id} ({self.model_slug}, {self.status})"
+
+
+class LabelChunk(models.Model):
+    """One contiguous row_id range of a LabelRun and, once done, its labeled rows."""
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        DONE = "done", "Done"
+
+    run = models.ForeignKey(LabelRun, on_delete=models.CASCADE, related_name="chunks")
+    index = models.PositiveIntegerField()
+    first_row_id = models.BigIntegerField()
+    last_row_id = models.BigIntegerField()
+    row_count = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    results = models.JSONField(default=list, blank=True)
+    stats = models.JSONField(default=dict, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    judged_at = models.DateTimeField(null=True, blank=True)  # judge scores merged into results
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # set while a worker holds the chunk, see tasks._claim_chunk
+
+    class Meta:
+        ordering = ["run", "index"]
+        constraints = [models.UniqueConstraint(fields=["run", "index"], name="uniq_label_chunk_run_index")]
+
+
+class GenerationCacheEntry(models.Model):
+    """
+    Persisted GenResult for a deterministic (temperature 0 or seeded) backend call,
+    keyed by a hash of backend, model repo_id, prompt and normalized params.
+    See apps.inference.cache.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model_id = models.CharField(max_length=200)
+    result = models.JSONField()                            # dataclasses.asdict(GenResult)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model_id} {self.key[:12]} ({self.hits} hits)"
@@ -0,0 +1,210 @@
+# apps/inference/ollama_pool.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+import httpx
+from django.conf import settings
+
+from .transport import get_async_client, run_background
+
+logger = logging.getLogger(__name__)
+
+
+def _model_name(name: str) -> str:
+    # Ollama reports "llama3:latest" for a model requested as "llama3"
+    return name if ":" in name else f"{name}:latest"
+
+
+@dataclass
+class Replica:
+    url: str
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0                        # time.monotonic(); 0 = in rotation
+    available: Optional[set] = None                   # pulled models (/api/tags); None = not probed yet
+    loaded: set = field(default_factory=set)          # models resident in memory (/api/ps)
+    last_probe_ok: Optional[bool] = None
+
+    def up(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def as_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "up": self.up(time.monotonic()),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected_for_s": max(0.0, round(self.ejected_until - time.monotonic(), 1)),
+            "loaded": sorted(self.loaded),
+            "available": sorted(self.available) if self.available is not None else None,
+            "last_probe_ok": self.last_probe_ok,
+        }
+
+
+class OllamaPool:
+    """
+    A set of Ollama replicas (OLLAMA_BASE_URL may list several, comma-separated).
+
+    `acquire(model)` picks the replica with the lowest cost = outstanding requests + a cold
+    penalty (0 if the model is already loaded there, OLLAMA_COLD_PENALTY if it still has to
+    load, far more if the replica is known not to have it). Requests therefore stick to
+    warm replicas until they are noticeably busier than a cold one.
+
+    Replicas that fail OLLAMA_EJECT_AFTER_FAILURES times in a row (transport errors, 5xx)
+    are taken out of rotation for OLLAMA_EJECT_SECS. A background probe hits /api/tags and
+    /api/ps every OLLAMA_HEALTH_INTERVAL_SECS; a successful probe re-admits a replica and
+    refreshes what it has loaded. If every replica is ejected, all are tried anyway.
+    """
+    MISSING_PENALTY = 1000
+
+    def __init__(self, urls: Iterable[str]):
+        self.replicas = [Replica(url=u.strip().rstrip("/")) for u in urls if u.strip()]
+        if not self.replicas:
+            raise ValueError("OllamaPool needs at least one replica URL.")
+        self._lock = threading.Lock()
+        self._prober_pid: Optional[int] = None
+
+    @classmethod
+    def from_setting(cls, value: str) -> "OllamaPool":
+        return cls(value.split(","))
+
+    # ---------- config ----------
+    @property
+    def cold_penalty(self) -> int:
+        return int(getattr(settings, "OLLAMA_COLD_PENALTY", 4))
+
+    @property
+    def eject_after(self) -> int:
+        return int(getattr(settings, "OLLAMA_EJECT_AFTER_FAILURES", 3))
+
+    @property
+    def eject_secs(self) -> float:
+        return float(getattr(settings, "OLLAMA_EJECT_SECS", 30))
+
+    @property
+    def probe_interval(self) -> float:
+        return float(getattr(settings, "OLLAMA_HEALTH_INTERVAL_SECS", 10))
+
+    # ---------- routing ----------
+    def _cost(self, r: Replica, model: str) -> int:
+        if model in r.loaded:
+            penalty = 0
+        elif r.available is not None and model not in r.available:
+            penalty = self.MISSING_PENALTY
+        else:
+            penalty = self.cold_penalty
+        return r.outstanding + penalty
+
+    def acquire(self, model: str, exclude: Iterable[str] = ()) -> Replica:
+        self._ensure_prober()
+        model = _model_name(model)
+        now = time.monotonic()
+        with self._lock:
+            pool = [r for r in self.replicas if r.url not in exclude] or self.replicas
+            candidates = [r for r in pool if r.up(now)] or pool
+            replica = min(candidates, key=lambda r: (self._cost(r, model), r.requests))
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica
+
+    def release(self, replica: Replica, model: str, *, ok: bool, error: Optional[BaseException] = None) -> None:
+        """Record the outcome of a request; ok=False without an error means abandoned (cancelled)."""
+        model = _model_name(model)
+        with self._lock:
+            replica.outstanding -= 1
+            if not ok and error is None:
+                return
+            if ok:
+                replica.consecutive_failures = 0
+                replica.ejected_until = 0.0
+                replica.loaded.add(model)
+                if replica.available is not None:
+                    replica.available.add(model)
+                return
+            if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 404:
+                # model not pulled on this replica; not a health problem
+                replica.loaded.discard(model)
+                if replica.available is not None:
+                    replica.available.discard(model)
+                return
+            replica.failures += 1
+            replica.consecutive_failures += 1
+            if replica.consecutive_failures >= self.eject_after and len(self.replicas) > 1:
+                replica.ejected_until = time.monotonic() + self.eject_secs
+                logger.warning("Ejecting Ollama replica %s for %ss after %s failures (%s)",
+                               replica.url, self.eject_secs, replica.consecutive_failures, error)
+
+    @contextmanager
+    def lease(self, model: str, exclude: Iterable[str] = ()) -> Iterator[Replica]:
+        """acquire() + release() around one request."""
+        replica = self.acquire(model, exclude)
+        try:
+            yield replica
+        except Exception as e:
+            self.release(replica, model, ok=False, error=e)
+            raise
+        except BaseException:
+            self.release(replica, model, ok=False)
+            raise
+        else:
+            self.release(replica, model, ok=True)
+
+    # ---------- health probes ----------
+    async def probe(self, replica: Replica) -> bool:
+        try:
+            client = get_async_client(replica.url)
+            tags = await client.get(f"{replica.url}/api/tags", timeout=5)
+            tags.raise_for_status()
+            ps = await client.get(f"{replica.url}/api/ps", timeout=5)
+            loaded = {m.get("name") for m in ps.json().get("models", [])} if ps.status_code == 200 else None
+        except Exception as e:
+            with self._lock:
+                replica.last_probe_ok = False
+                if replica.up(time.monotonic()) and len(self.replicas) > 1:
+                    replica.ejected_until = time.monotonic() + self.eject_secs
+                    logger.warning("Ejecting Ollama replica %s: health probe failed (%s)", replica.url, e)
+            return False
+        with self._lock:
+            replica.last_probe_ok = True
+            replica.available = {m.get("name") for m in tags.json().get("models", [])}
+            if loaded is not None:
+                replica.loaded = loaded
+            if not replica.up(time.monotonic()):
+                logger.info("Ollama replica %s is healthy again", replica.url)
+            replica.ejected_until = 0.0
+            replica.consecutive_failures = 0
+        return True
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self.probe(r) for r in self.replicas))
+
+    async def _probe_forever(self) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.probe_interval)
+
+    def _ensure_prober(self) -> None:
+        # a single replica has nowhere to fail over to, so it is not probed
+        if len(self.replicas) < 2 or self.probe_interval <= 0 or self._prober_pid == os.getpid():
+            return
+        with self._lock:
+            if self._prober_pid == os.getpid():
+                return
+            self._prober_pid = os.getpid()
+        run_background(self._probe_forever())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"replicas": [r.as_dict() for r in self.replicas]}
@@ -0,0 +1,32 @@
+# apps/inference/prompts.py
+from __future__ import annotations
+
+from typing import Optional
+
+
+class PrefixedPrompt(str):
+    """
+    A prompt built as a fixed instruction block (`prefix`) followed by the per-call part
+    (`suffix`). It is an ordinary str everywhere (cache keys, payloads, history), so callers
+    need not care; backends that can reuse the prefix's KV state look at `.prefix`:
+
+      * Ollama / vLLM / TGI reuse the KV cache of a matching leading prompt on their own
+        (Ollama per loaded model, kept resident by `keep_alive`; vLLM with prefix caching),
+        so all that matters there is that the shared part comes first.
+      * LocalBackend keeps the prefix's `past_key_values` and only runs the suffix.
+    """
+    prefix: str
+    suffix: str
+
+    def __new__(cls, prefix: str, suffix: str):
+        obj = super().__new__(cls, prefix + suffix)
+        obj.prefix = prefix
+        obj.suffix = suffix
+        return obj
+
+    def __reduce__(self):
+        return PrefixedPrompt, (self.prefix, self.suffix)
+
+
+def prefix_of(prompt: str) -> Optional[str]:
+    return prompt.prefix if isinstance(prompt, PrefixedPrompt) else None
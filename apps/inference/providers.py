@@ -0,0 +1,65 @@
+# apps/inference/providers.py
+from __future__ import annotations
+
+import importlib
+import logging
+import threading
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Provider(Generic[T]):
+    """
+    A heavy dependency (an ML library, a scorer, a model) built on first use, once per process.
+
+    Modules that only *might* need torch, transformers, sentence-transformers, ROUGE or
+    sacrebleu hold a Provider instead of importing at module level. `manage.py` commands,
+    Celery workers and web workers that never compute a metric or run a local model then
+    start without loading them. Call the provider to get the object.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._lock = threading.Lock()
+        self.load_ms: Optional[int] = None
+        _registry[name] = self
+
+    @property
+    def loaded(self) -> bool:
+        return self.load_ms is not None
+
+    def __call__(self) -> T:
+        if self.load_ms is not None:
+            return self._value  # type: ignore[return-value]
+        with self._lock:
+            if self.load_ms is None:
+                t0 = time.perf_counter()
+                self._value = self._factory()
+                self.load_ms = int((time.perf_counter() - t0) * 1000)
+                logger.info("Loaded %s in %s ms", self.name, self.load_ms)
+        return self._value  # type: ignore[return-value]
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "loaded": self.loaded, "load_ms": self.load_ms}
+
+
+_registry: dict[str, Provider] = {}
+
+
+def module(name: str) -> Provider:
+    """Provider for an importable module, e.g. `torch = module("torch")` then `torch().no_grad()`."""
+    return _registry.get(name) or Provider(name, lambda: importlib.import_module(name))
+
+
+def provider_stats() -> list[dict]:
+    return [p.as_dict() for p in sorted(_registry.values(), key=lambda p: p.name)]
+
+
+torch = module("torch")
+transformers = module("transformers")
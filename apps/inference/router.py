@@ -1,18 +1,96 @@
 # apps/inference/router.py
+from dataclasses import dataclass
 from functools import lru_cache
+from typing import Callable, Optional
+
 from apps.models_registry.models import HFModel, ModelBackend
-from .backends import OllamaBackend, GenResult
+from .backends import (
+    AsyncBackend, GenResult,
+    HFEndpointBackend, HFRouterOpenAIBackend, LocalBackend, OllamaBackend, TGIBackend,
+)
+from .cache import generation_cache
+from .singleflight import single_flight
+
+
+@dataclass(frozen=True)
+class BackendSpec:
+    factory: Callable[[Optional[str]], AsyncBackend]  # endpoint_url -> backend instance
+    target: Callable[[HFModel], str]                  # first argument of generate()
+    needs_endpoint: bool = False
+
+
+# One entry per ModelBackend. Adding a backend = implement it in backends.py and register it here.
+BACKENDS: dict[str, BackendSpec] = {
+    ModelBackend.HF_ENDPOINT: BackendSpec(
+        factory=lambda url: HFEndpointBackend(), target=lambda m: m.endpoint_url, needs_endpoint=True,
+    ),
+    ModelBackend.TGI: BackendSpec(
+        factory=lambda url: TGIBackend(), target=lambda m: m.endpoint_url, needs_endpoint=True,
+    ),
+    ModelBackend.LOCAL: BackendSpec(
+        factory=lambda url: LocalBackend(), target=lambda m: m.repo_id,
+    ),
+    ModelBackend.HF_ROUTER: BackendSpec(
+        factory=lambda url: HFRouterOpenAIBackend(base_url=url), target=lambda m: m.repo_id,
+    ),
+    ModelBackend.OLLAMA: BackendSpec(
+        factory=lambda url: OllamaBackend(base_url=url), target=lambda m: m.repo_id,
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def get_backend(backend: str, endpoint_url: Optional[str] = None) -> AsyncBackend:
+    """One backend instance per (backend, endpoint_url); instances are stateless apart from config."""
+    try:
+        spec = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unsupported backend={backend}.")
+    return spec.factory(endpoint_url or None)
 
-@lru_cache(maxsize=1)
 def get_ollama() -> OllamaBackend:
-    return OllamaBackend()
+    return get_backend(ModelBackend.OLLAMA)
+
+def resolve(model: HFModel) -> tuple[AsyncBackend, str]:
+    """Backend instance and generate() target (repo id or endpoint URL) for a registry model."""
+    spec = BACKENDS.get(model.backend)
+    if spec is None:
+        raise ValueError(f"Unsupported backend={model.backend} for model={model.slug}.")
+    if spec.needs_endpoint and not model.endpoint_url:
+        raise ValueError(f"Model {model.slug} (backend={model.backend}) has no endpoint_url.")
+    return get_backend(model.backend, model.endpoint_url), spec.target(model)
+
+def effective_params(model: HFModel, params: Optional[dict]) -> dict:
+    """Per-request params layered over HFModel.default_params."""
+    return {**(model.default_params or {}), **(params or {})}
+
+def cache_namespace(backend: str, endpoint_url: Optional[str] = None) -> str:
+    """Cache/single-flight namespace: the same model id on different endpoints must not share outputs."""
+    return f"{backend}:{endpoint_url or ''}"
+
+def generate_shared(namespace: str, model_id: str, prompt: str, params: dict,
+                    call: Callable[[], GenResult], *, use_cache: bool = True) -> GenResult:
+    """
+    Identical concurrent calls (same namespace, model, prompt and params) share one backend
+    call via single-flight; deterministic calls (temperature 0 or seeded) also go through
+    the persistent generation cache. use_cache=False forces a fresh, unshared call.
+    """
+    cached = lambda: generation_cache.get_or_generate(
+        namespace=namespace, model_id=model_id, prompt=prompt, params=params, call=call, bypass=not use_cache,
+    )
+    if not use_cache:
+        return cached()
+    return single_flight.do(generation_cache.make_key(namespace, model_id, prompt, params), cached)
 
-def generate_for_model(model: HFModel, prompt: str, params: dict) -> GenResult:
-    if model.backend != ModelBackend.OLLAMA:
-        raise ValueError(f"Only OLLAMA is supported. Got backend={model.backend}.")
-    return get_ollama().generate(model.repo_id, prompt, params)
+def generate_for_model(model: HFModel, prompt: str, params: dict, *, use_cache: bool = True) -> GenResult:
+    """Generate with a registry model through single-flight and the generation cache, see generate_shared."""
+    backend, target = resolve(model)
+    params = effective_params(model, params)
+    return generate_shared(
+        cache_namespace(model.backend, model.endpoint_url), model.repo_id, prompt, params,
+        lambda: backend.generate(target, prompt, params), use_cache=use_cache,
+    )
 
 def stream_for_model(model: HFModel, prompt: str, params: dict):
-    if model.backend != ModelBackend.OLLAMA:
-        raise ValueError(f"Only OLLAMA streaming is supported.")
-    return get_ollama().stream_generate(model.repo_id, prompt, params)
+    backend, target = resolve(model)
+    return backend.stream_generate(target, prompt, effective_params(model, params))
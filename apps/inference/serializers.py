@@ -1,17 +1,47 @@
 # apps/inference/serializers.py
+from django.conf import settings
 from rest_framework import serializers
 from apps.history.models import Generation 
+from .models import LabelRun
 
 class GenerationParamsSerializer(serializers.Serializer):
-    temperature     = serializers.FloatField(required=False, min_value=0.0, max_value=2.0, default=0.7)
-    top_p           = serializers.FloatField(required=False, min_value=0.0, max_value=1.0, default=0.9)
-    top_k           = serializers.IntegerField(required=False, min_value=0, default=50)
-    max_new_tokens  = serializers.IntegerField(required=False, min_value=1, default=256)
+    # No defaults here: omitted keys fall back to HFModel.default_params, then to the backend's defaults.
+    temperature     = serializers.FloatField(required=False, min_value=0.0, max_value=2.0)
+    top_p           = serializers.FloatField(required=False, min_value=0.0, max_value=1.0)
+    top_k           = serializers.IntegerField(required=False, min_value=0)
+    max_new_tokens  = serializers.IntegerField(required=False, min_value=1)
+    seed            = serializers.IntegerField(required=False, min_value=0)  # reproducible sampling; cacheable
 
 class GenerateRequestSerializer(serializers.Serializer):
     model_slug = serializers.CharField(required=False)  # optional, can use default
     prompt     = serializers.CharField()
     params     = GenerationParamsSerializer(required=False)
+    use_cache  = serializers.BooleanField(required=False, default=True)  # false = bypass generation cache
+
+class GenerateBatchItemSerializer(serializers.Serializer):
+    prompt     = serializers.CharField()
+    model_slug = serializers.CharField(required=False)   # default: the batch's model_slug
+    params     = GenerationParamsSerializer(required=False)  # default: the batch's params
+
+class GenerateBatchRequestSerializer(serializers.Serializer):
+    model_slug  = serializers.CharField(required=False)
+    params      = GenerationParamsSerializer(required=False)
+    prompts     = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False)
+    items       = GenerateBatchItemSerializer(many=True, required=False, allow_empty=False)
+    concurrency = serializers.IntegerField(required=False, min_value=1)  # capped by GENERATE_BATCH_MAX_CONCURRENCY
+    use_cache   = serializers.BooleanField(required=False, default=True)
+
+    def validate(self, data):
+        if ("prompts" in data) == ("items" in data):
+            raise serializers.ValidationError("Send exactly one of 'prompts' or 'items'.")
+        items = data.pop("prompts", None)
+        data["items"] = [{"prompt": p} for p in items] if items is not None else data["items"]
+        limit = getattr(settings, "GENERATE_BATCH_MAX_ITEMS", 500)
+        if len(data["items"]) > limit:
+            raise serializers.ValidationError(f"At most {limit} items per batch.")
+        if not data.get("model_slug") and any(not i.get("model_slug") for i in data["items"]):
+            raise serializers.ValidationError("model_slug is required for items that do not set their own.")
+        return data
 
 # only if you also have a streaming endpoint:
 class GenerateStreamRequestSerializer(GenerateRequestSerializer):
@@ -22,7 +52,10 @@ class GenerationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Generation
-        fields = ["generation_id", "prompt", "output", "model_slug", "created_at"]
+        fields = [
+            "generation_id", "prompt", "output", "model_slug", "created_at", "latency_ms",
+            "prompt_tokens", "completion_tokens", "ttft_ms", "load_ms", "tokens_per_s",
+        ]
         read_only_fields = fields
 
 
@@ -35,6 +68,7 @@ class LabelRequestSerializer(serializers.Serializer):
     claim = serializers.CharField()
     model_slug = serializers.CharField(required=False)                 # optional; default model if omitted
     params = GenerationParamsSerializer(required=False)                # reuse your gen params
+    use_cache = serializers.BooleanField(required=False, default=True)  # false = bypass generation cache
 
 class LabelResultSerializer(serializers.Serializer):
     claim = serializers.CharField()
@@ -60,4 +94,39 @@ class LabelDatasetRequestSerializer(serializers.Serializer):
     limit = serializers.IntegerField(required=False, min_value=1)
     offset = serializers.IntegerField(required=False, min_value=0)
     max_rows = serializers.IntegerField(required=False, min_value=1)  # safety cap per request
-    format = serializers.ChoiceField(choices=["csv", "json"], required=False, default="csv")
\ No newline at end of file
+    format = serializers.ChoiceField(choices=["csv", "json"], required=False, default="csv")
+    concurrency = serializers.IntegerField(required=False, min_value=1)  # capped per model server-side
+    stream = serializers.BooleanField(required=False, default=False)    # CSV rows / NDJSON lines as they finish
+    params = GenerationParamsSerializer(required=False)
+    use_cache = serializers.BooleanField(required=False, default=True)  # false = bypass generation cache
+
+class LabelRunRequestSerializer(serializers.Serializer):
+    dataset_id = serializers.IntegerField()
+    model_slug = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(required=False, min_value=1)
+    offset = serializers.IntegerField(required=False, min_value=0)
+    params = GenerationParamsSerializer(required=False)
+    chunk_size = serializers.IntegerField(required=False, min_value=1, max_value=5000)
+    concurrency = serializers.IntegerField(required=False, min_value=1)  # per chunk task, capped per model
+    judge_model = serializers.CharField(required=False, allow_blank=True)  # Ollama judge; adds a judging phase
+
+class LabelRunSerializer(serializers.ModelSerializer):
+    run_id = serializers.IntegerField(source="id", read_only=True)
+    dataset_id = serializers.IntegerField(read_only=True)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LabelRun
+        fields = [
+            "run_id", "dataset_id", "model_slug", "judge_model", "status", "phase", "params", "offset", "limit",
+            "chunk_size", "concurrency", "total_rows", "chunks_total", "chunks_done", "chunks_judged",
+            "rows_done", "errors", "error", "progress", "created_at", "started_at", "finished_at",
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        if not obj.chunks_total:
+            return 0.0
+        if obj.judge_model:  # label and judge phases weigh the same
+            return round((obj.chunks_done + obj.chunks_judged) / (2 * obj.chunks_total), 4)
+        return round(obj.chunks_done / obj.chunks_total, 4)
@@ -0,0 +1,138 @@
+# apps/inference/singleflight.py
+from __future__ import annotations
+
+import dataclasses
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _share(result):
+    # each caller gets its own GenResult, so per-request tweaks don't leak between them
+    return dataclasses.replace(result) if dataclasses.is_dataclass(result) else result
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key runs `fn`, callers
+    arriving while it is in flight wait and receive the same result (or exception).
+
+    With SINGLE_FLIGHT_CROSS_PROCESS, the leader also takes a short lock in the Django cache
+    (use a shared backend such as Redis) and publishes its result there, so identical
+    calls in other workers wait for it instead of hitting the backend again. A follower
+    only accepts a result published after it started waiting, and runs `fn` itself if
+    the remote leader disappears or takes longer than SINGLE_FLIGHT_WAIT_SECS.
+    """
+    POLL_SECS = 0.05
+    RESULT_TTL_SECS = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self._counters = {"leaders": 0, "followers": 0, "remote_followers": 0}
+
+    # ---------- config ----------
+    @property
+    def enabled(self) -> bool:
+        return bool(getattr(settings, "SINGLE_FLIGHT_ENABLED", True))
+
+    @property
+    def cross_process(self) -> bool:
+        return bool(getattr(settings, "SINGLE_FLIGHT_CROSS_PROCESS", False))
+
+    @property
+    def wait_secs(self) -> float:
+        return float(getattr(settings, "SINGLE_FLIGHT_WAIT_SECS", getattr(settings, "REQUEST_TIMEOUT_SECS", 120)))
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    # ---------- main entry point ----------
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._count("followers")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return _share(call.result)
+
+        self._count("leaders")
+        try:
+            call.result = self._run_remote(key, fn) if self.cross_process else fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _run_remote(self, key: str, fn: Callable[[], Any]) -> Any:
+        cache = caches[getattr(settings, "SINGLE_FLIGHT_CACHE", "default")]
+        lock_key, result_key = f"singleflight:lock:{key}", f"singleflight:result:{key}"
+        started = time.time()
+        deadline = time.monotonic() + self.wait_secs
+
+        def published():
+            hit = cache.get(result_key)
+            return hit if hit is not None and hit[0] >= started else None
+
+        while True:
+            hit = published()
+            if hit is not None:
+                self._count("remote_followers")
+                return hit[1]
+            try:
+                acquired = cache.add(lock_key, started, timeout=int(self.wait_secs) + 1)
+            except Exception:
+                logger.exception("Single-flight lock unavailable (non-fatal).")
+                return fn()
+            if acquired:
+                try:
+                    hit = published()  # the previous holder finished between our checks
+                    if hit is not None:
+                        self._count("remote_followers")
+                        return hit[1]
+                    result = fn()
+                    try:
+                        cache.set(result_key, (time.time(), result), timeout=self.RESULT_TTL_SECS)
+                    except Exception:
+                        logger.exception("Single-flight result publish failed (non-fatal).")
+                    return result
+                finally:
+                    cache.delete(lock_key)
+            if time.monotonic() > deadline:
+                logger.warning("Single-flight wait timed out for %s; calling backend directly.", key[:12])
+                return fn()
+            time.sleep(self.POLL_SECS)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._calls), "cross_process": self.cross_process, **self._counters}
+
+
+single_flight = SingleFlight()
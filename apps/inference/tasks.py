@@ -0,0 +1,233 @@
+# apps/inference/tasks.py
+from __future__ import annotations
+
+import logging
+import time
+from datetime import timedelta
+from typing import Iterable, Iterator
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.datasets.models import DatasetRow
+from apps.models_registry.models import HFModel, ModelBackend
+from .labeling import LabelStats, iter_judge_label_rows, iter_label_rows
+from .models import LabelChunk, LabelRun
+from .warm_pool import warm_pool
+
+logger = logging.getLogger(__name__)
+
+
+def plan_label_run(run: LabelRun) -> int:
+    """
+    Split the run's row window into contiguous row_id ranges of `chunk_size` rows.
+    Idempotent: a run that already has chunks is left as is.
+    """
+    if run.chunks.exists():
+        return run.chunks_total
+
+    qs = DatasetRow.objects.filter(dataset_id=run.dataset_id).order_by("id")
+    if run.offset:
+        qs = qs[run.offset:]
+    if run.limit:
+        qs = qs[:run.limit]
+    ids = list(qs.values_list("id", flat=True))
+
+    size = max(1, run.chunk_size)
+    chunks = [
+        LabelChunk(run=run, index=i, first_row_id=part[0], last_row_id=part[-1], row_count=len(part))
+        for i, part in enumerate(ids[start:start + size] for start in range(0, len(ids), size))
+    ]
+    with transaction.atomic():
+        LabelChunk.objects.bulk_create(chunks)
+        LabelRun.objects.filter(pk=run.pk).update(total_rows=len(ids), chunks_total=len(chunks))
+    run.total_rows, run.chunks_total = len(ids), len(chunks)
+    return len(chunks)
+
+
+def _stale_secs() -> int:
+    return getattr(settings, "LABEL_CHUNK_STALE_SECS", 300)
+
+
+def _unheld() -> Q:
+    """Chunks no live worker holds: never claimed, released, or silent for LABEL_CHUNK_STALE_SECS."""
+    return Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=timezone.now() - timedelta(seconds=_stale_secs()))
+
+
+def _claim_chunk(chunk_pk: int, unfinished: Q) -> bool:
+    """
+    Take the lease on an unfinished chunk. False when another worker holds it, e.g. a
+    resume dispatched it again while the original task is still running.
+    """
+    return bool(LabelChunk.objects.filter(unfinished, _unheld(), pk=chunk_pk).update(heartbeat_at=timezone.now()))
+
+
+def _release_chunk(chunk_pk: int) -> None:
+    LabelChunk.objects.filter(pk=chunk_pk).update(heartbeat_at=None)
+
+
+def _heartbeat(chunk_pk: int, items: Iterable) -> Iterator:
+    """Pass `items` through, renewing the chunk's lease a few times per LABEL_CHUNK_STALE_SECS."""
+    every, last = _stale_secs() / 5, time.monotonic()
+    for item in items:
+        if time.monotonic() - last >= every:
+            LabelChunk.objects.filter(pk=chunk_pk).update(heartbeat_at=timezone.now())
+            last = time.monotonic()
+        yield item
+
+
+def _finish_if_complete(run_id: int) -> None:
+    """
+    Advance a run whose current phase has no chunks left: label -> judge when it has a
+    judge_model (judging starts only once every row is labeled), otherwise -> done.
+    """
+    to_judge = LabelRun.objects.filter(
+        pk=run_id, status=LabelRun.Status.RUNNING, phase=LabelRun.Phase.LABEL, chunks_done=F("chunks_total"),
+    ).exclude(judge_model="").update(phase=LabelRun.Phase.JUDGE)
+    if to_judge:
+        start_judge_phase.delay(run_id)
+        return
+    LabelRun.objects.filter(
+        Q(phase=LabelRun.Phase.LABEL, judge_model="", chunks_done=F("chunks_total"))
+        | Q(phase=LabelRun.Phase.JUDGE, chunks_judged=F("chunks_total")),
+        pk=run_id, status=LabelRun.Status.RUNNING,
+    ).update(status=LabelRun.Status.DONE, finished_at=timezone.now())
+
+
+@shared_task(acks_late=True)
+def start_label_run(run_id: int) -> int:
+    """
+    Plan (first time only) and fan out every unfinished chunk of a run.
+    Also used to resume: chunks already checkpointed as done are skipped, and so are
+    chunks a live worker still holds (heartbeat newer than LABEL_CHUNK_STALE_SECS).
+    Returns the number of chunk tasks dispatched.
+    """
+    run = LabelRun.objects.get(pk=run_id)
+    if run.status in (LabelRun.Status.DONE, LabelRun.Status.CANCELLED):
+        return 0
+
+    plan_label_run(run)
+    LabelRun.objects.filter(pk=run_id).update(
+        status=LabelRun.Status.RUNNING, error="", finished_at=None,
+        started_at=run.started_at or timezone.now(),
+    )
+    if run.phase == LabelRun.Phase.JUDGE:
+        return start_judge_phase(run_id)
+
+    model = HFModel.objects.filter(slug=run.model_slug).first()
+    if model is not None:
+        warm_pool.warm_model(model)  # one load up front instead of in the first chunk's requests
+
+    pending = list(
+        run.chunks.filter(_unheld(), status=LabelChunk.Status.PENDING)
+        .order_by("index").values_list("index", flat=True)
+    )
+    for index in pending:
+        label_chunk.delay(run_id, index)
+    _finish_if_complete(run_id)  # empty window, or everything was already checkpointed
+    return len(pending)
+
+
+@shared_task(acks_late=True)
+def label_chunk(run_id: int, index: int) -> int:
+    """
+    Label one chunk and checkpoint its rows. Safe to redeliver: a chunk that is
+    already done, held by another worker, or belongs to a cancelled run is a no-op.
+    Returns the number of rows labeled.
+    """
+    run = LabelRun.objects.get(pk=run_id)
+    if run.status != LabelRun.Status.RUNNING:
+        return 0
+    chunk = run.chunks.get(index=index)
+    if chunk.status == LabelChunk.Status.DONE:
+        return 0
+    if not _claim_chunk(chunk.pk, Q(status=LabelChunk.Status.PENDING)):
+        return 0
+
+    try:
+        model = HFModel.objects.get(slug=run.model_slug)
+        rows = DatasetRow.objects.filter(
+            dataset_id=run.dataset_id, id__gte=chunk.first_row_id, id__lte=chunk.last_row_id,
+        ).order_by("id")
+        stats = LabelStats(concurrency=run.concurrency)
+        results = list(_heartbeat(chunk.pk, iter_label_rows(
+            model, rows, concurrency=run.concurrency, params=run.params, stats=stats,
+        )))
+        logger.info("LabelRun #%s chunk %s: %s", run_id, index, stats.as_dict())
+    except Exception as e:
+        logger.exception("LabelRun #%s chunk %s failed", run_id, index)
+        _release_chunk(chunk.pk)
+        LabelRun.objects.filter(pk=run_id).update(
+            status=LabelRun.Status.FAILED, error=f"chunk {index}: {e}", finished_at=timezone.now(),
+        )
+        raise
+
+    with transaction.atomic():
+        updated = LabelChunk.objects.filter(pk=chunk.pk, status=LabelChunk.Status.PENDING).update(
+            status=LabelChunk.Status.DONE, results=results, stats=stats.as_dict(), completed_at=timezone.now(),
+            heartbeat_at=None,
+        )
+        if updated:
+            LabelRun.objects.filter(pk=run_id).update(
+                chunks_done=F("chunks_done") + 1,
+                rows_done=F("rows_done") + stats.rows,
+                errors=F("errors") + stats.errors,
+            )
+    _finish_if_complete(run_id)
+    return stats.rows
+
+
+@shared_task(acks_late=True)
+def start_judge_phase(run_id: int) -> int:
+    """
+    Load the judge model once, then fan out every chunk not judged yet and not held by a live worker.
+    Returns the number of chunk tasks dispatched.
+    """
+    run = LabelRun.objects.get(pk=run_id)
+    if run.status != LabelRun.Status.RUNNING or run.phase != LabelRun.Phase.JUDGE:
+        return 0
+    warm_pool.warm(ModelBackend.OLLAMA, run.judge_model)
+    pending = list(
+        run.chunks.filter(_unheld(), judged_at__isnull=True).order_by("index").values_list("index", flat=True)
+    )
+    for index in pending:
+        judge_chunk.delay(run_id, index)
+    _finish_if_complete(run_id)
+    return len(pending)
+
+
+@shared_task(acks_late=True)
+def judge_chunk(run_id: int, index: int) -> int:
+    """Judge one labeled chunk and merge the scores into its rows. Safe to redeliver."""
+    run = LabelRun.objects.get(pk=run_id)
+    if run.status != LabelRun.Status.RUNNING or run.phase != LabelRun.Phase.JUDGE:
+        return 0
+    chunk = run.chunks.get(index=index)
+    if chunk.judged_at is not None:
+        return 0
+    if not _claim_chunk(chunk.pk, Q(judged_at__isnull=True)):
+        return 0
+
+    try:
+        results = list(_heartbeat(chunk.pk, iter_judge_label_rows(
+            run.judge_model, chunk.results, concurrency=run.concurrency,
+        )))
+    except Exception as e:
+        logger.exception("LabelRun #%s judging chunk %s failed", run_id, index)
+        _release_chunk(chunk.pk)
+        LabelRun.objects.filter(pk=run_id).update(
+            status=LabelRun.Status.FAILED, error=f"judge chunk {index}: {e}", finished_at=timezone.now(),
+        )
+        raise
+
+    with transaction.atomic():
+        updated = LabelChunk.objects.filter(pk=chunk.pk, judged_at__isnull=True).update(
+            results=results, judged_at=timezone.now(), heartbeat_at=None,
+        )
+        if updated:
+            LabelRun.objects.filter(pk=run_id).update(chunks_judged=F("chunks_judged") + 1)
+    _finish_if_complete(run_id)
+    return len(results)
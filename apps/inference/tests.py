@@ -1,7 +1,41 @@
 # apps/inference/tests.py
+import asyncio
+import importlib.util
+import json
+import pickle
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+
+import httpx
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
+from apps.datasets.models import Dataset, DatasetRow
+from apps.inference import transport
+from apps.inference.batching import MicroBatcher
+from apps.inference.limits import CircuitOpenError, GuardedTransport, guard_for
+from apps.inference.singleflight import SingleFlight
+from apps.inference.ollama_pool import OllamaPool
+from apps.inference.local_models import LoadedModel, LocalModelCache
+from apps.inference.backends import GenResult, LocalBackend, OllamaBackend, TGIBackend, _norm_params
+from apps.inference.labeling import LABEL_PROMPT_TEMPLATE, label_prompt
+from apps.inference.prompts import PrefixedPrompt
+from apps.inference.providers import Provider, provider_stats
+from apps.inference.warm_pool import warm_pool
+from apps.inference.router import generate_for_model, get_backend
+from apps.inference.cache import generation_cache
+from apps.inference.models import GenerationCacheEntry, LabelChunk, LabelRun
+from apps.inference.tasks import label_chunk, start_label_run
 from apps.models_registry.models import HFModel, ModelBackend
+from thesis.celery import app as celery_app
 
 class LabelClaimTests(APITestCase):
     def setUp(self):
@@ -11,3 +45,782 @@ class LabelClaimTests(APITestCase):
         url = reverse("label_claim")
         resp = self.client.post(url, {"claim": "Water boils at 100°C at sea level", "model_slug": "test-model"}, format="json")
         self.assertIn(resp.status_code, (200, 400, 502))
+
+
+class LabelDatasetConcurrencyTests(APITestCase):
+    def setUp(self):
+        self.model = HFModel.objects.create(
+            slug="ollama-test", display_name="Ollama test", repo_id="mistral:7b",
+            backend=ModelBackend.OLLAMA, is_active=True,
+        )
+        self.ds = Dataset.objects.create(name="claims.csv", kind="csv")
+        self.rows = DatasetRow.objects.bulk_create(
+            [DatasetRow(dataset=self.ds, claim=f"claim {i}", label="Accepted") for i in range(12)]
+        )
+
+    def _fake_generate(self, model, prompt, params, use_cache=True):
+        # Later rows finish first, so ordering must come from the engine, not arrival time.
+        n = int(prompt.split("CLAIM: claim ")[1].split("\n")[0])
+        time.sleep(0.002 * (12 - n))
+        return GenResult(text='{"label": "Refuted", "justification": "row %d"}' % n, latency_ms=10 + n)
+
+    def test_results_keep_row_order_and_report_stats(self):
+        with patch("apps.inference.labeling.generate_for_model", side_effect=self._fake_generate):
+            resp = self.client.post(
+                reverse("label_dataset"),
+                {"dataset_id": self.ds.id, "model_slug": "ollama-test", "format": "json", "concurrency": 4},
+                format="json",
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([r["row_id"] for r in resp.data], [r.id for r in self.rows])
+        self.assertEqual(resp.data[3]["justification"], "row 3")
+        self.assertEqual(resp["X-Label-Rows"], "12")
+        self.assertEqual(resp["X-Label-Concurrency"], "4")
+        self.assertIn("X-Label-Latency-P95-Ms", resp)
+
+    def test_stream_emits_ndjson_rows_in_order(self):
+        with patch("apps.inference.labeling.generate_for_model", side_effect=self._fake_generate):
+            resp = self.client.post(
+                reverse("label_dataset"),
+                {"dataset_id": self.ds.id, "model_slug": "ollama-test", "format": "json", "stream": True},
+                format="json",
+            )
+            self.assertTrue(resp.streaming)
+            lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["row_id"] for line in lines], [r.id for r in self.rows])
+
+
+class LabelRunTests(APITestCase):
+    def setUp(self):
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", False)
+        HFModel.objects.create(
+            slug="ollama-test", display_name="Ollama test", repo_id="mistral:7b",
+            backend=ModelBackend.OLLAMA, is_active=True,
+        )
+        self.ds = Dataset.objects.create(name="claims.csv", kind="csv")
+        DatasetRow.objects.bulk_create([DatasetRow(dataset=self.ds, claim=f"claim {i}") for i in range(7)])
+        patcher = patch(
+            "apps.inference.labeling.generate_for_model",
+            return_value=GenResult(text='{"label": "Accepted", "justification": "ok"}', latency_ms=5),
+        )
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(warm_pool, "warm", return_value={"ok": True})
+        self.warm = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run_is_chunked_and_downloadable(self):
+        resp = self.client.post(
+            reverse("label_run_submit"),
+            {"dataset_id": self.ds.id, "chunk_size": 3, "concurrency": 2},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 202)
+        run = LabelRun.objects.get(pk=resp.data["run_id"])
+        self.assertEqual((run.status, run.chunks_total, run.rows_done), (LabelRun.Status.DONE, 3, 7))
+
+        resp = self.client.get(reverse("label_run_download", args=[run.id]), {"format": "csv"})
+        lines = b"".join(resp.streaming_content).decode().strip().splitlines()
+        self.assertEqual(len(lines), 8)  # header + 7 rows
+        self.assertTrue(lines[1].endswith("Accepted,ok,ollama-test,5"))
+
+    def test_resume_only_redoes_unfinished_chunks(self):
+        self.client.post(reverse("label_run_submit"), {"dataset_id": self.ds.id, "chunk_size": 3}, format="json")
+        run = LabelRun.objects.get()
+        # Simulate a worker dying before the last chunk was checkpointed.
+        last = run.chunks.get(index=2)
+        last.status, last.results = LabelChunk.Status.PENDING, []
+        last.save()
+        LabelRun.objects.filter(pk=run.pk).update(status=LabelRun.Status.RUNNING, chunks_done=2, rows_done=6)
+        self.generate.reset_mock()
+
+        resp = self.client.post(reverse("label_run_resume", args=[run.id]))
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(self.generate.call_count, 1)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.rows_done), (LabelRun.Status.DONE, 7))
+
+    def test_resume_skips_chunks_a_live_worker_still_holds(self):
+        self.client.post(reverse("label_run_submit"), {"dataset_id": self.ds.id, "chunk_size": 3}, format="json")
+        run = LabelRun.objects.get()
+        # Chunk 1 is mid-flight on a live worker; chunk 2's worker stopped checking in.
+        stale = timezone.now() - timedelta(seconds=settings.LABEL_CHUNK_STALE_SECS + 1)
+        run.chunks.filter(index=1).update(status=LabelChunk.Status.PENDING, results=[], heartbeat_at=timezone.now())
+        run.chunks.filter(index=2).update(status=LabelChunk.Status.PENDING, results=[], heartbeat_at=stale)
+        LabelRun.objects.filter(pk=run.pk).update(status=LabelRun.Status.RUNNING, chunks_done=1, rows_done=3)
+        self.generate.reset_mock()
+
+        self.assertEqual(start_label_run(run.id), 1)
+        self.assertEqual(self.generate.call_count, 1)  # only chunk 2's single row
+        self.assertEqual(label_chunk(run.id, 1), 0)  # a redelivery can't steal the lease either
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.chunks_done, run.rows_done), (LabelRun.Status.RUNNING, 2, 4))
+        self.assertIsNone(run.chunks.get(index=2).heartbeat_at)
+
+    def test_judge_phase_runs_after_every_row_is_labeled(self):
+        DatasetRow.objects.filter(dataset=self.ds).update(reference="ref")
+        calls = []
+        self.generate.side_effect = lambda *a, **k: calls.append("generate") or GenResult(
+            text='{"label": "Accepted", "justification": "ok"}', latency_ms=5)
+        self.warm.side_effect = lambda backend, model: calls.append(f"warm {model}") or {"ok": True}
+        judge = lambda cand, ref, judge_model: calls.append("judge") or {
+            "correctness": 4.0, "relevance": 5.0, "fluency": 5.0, "overall": 4.0}
+
+        with patch("apps.eval.judge.judge_with_mistral", side_effect=judge):
+            resp = self.client.post(
+                reverse("label_run_submit"),
+                {"dataset_id": self.ds.id, "chunk_size": 3, "judge_model": "judge:7b"}, format="json",
+            )
+        run = LabelRun.objects.get(pk=resp.data["run_id"])
+        self.assertEqual((run.status, run.phase, run.chunks_judged), (LabelRun.Status.DONE, "judge", 3))
+        self.assertEqual(calls, ["warm mistral:7b"] + ["generate"] * 7 + ["warm judge:7b"] + ["judge"] * 7)
+
+        resp = self.client.get(reverse("label_run_download", args=[run.id]), {"format": "csv"})
+        lines = b"".join(resp.streaming_content).decode().strip().splitlines()
+        self.assertTrue(lines[0].endswith("correctness,relevance,fluency,overall,judge_error"))
+        self.assertTrue(lines[1].endswith("4.0,5.0,5.0,4.0,"))
+
+
+class GenerationCacheTests(APITestCase):
+    def setUp(self):
+        HFModel.objects.create(
+            slug="ollama-test", display_name="Ollama test", repo_id="mistral:7b",
+            backend=ModelBackend.OLLAMA, is_active=True,
+        )
+        patcher = patch(
+            "apps.inference.backends.OllamaBackend.generate",
+            return_value=GenResult(text="Paris", latency_ms=900),
+        )
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, **body):
+        body = {"model_slug": "ollama-test", "prompt": "Capital of France?", **body}
+        return self.client.post(reverse("generate"), body, format="json")
+
+    def test_deterministic_generation_is_served_from_cache(self):
+        first = self._post(params={"temperature": 0})
+        second = self._post(params={"temperature": 0})
+        self.assertEqual((first.data["cached"], second.data["cached"]), (False, True))
+        self.assertEqual(second.data["output"], "Paris")
+        self.assertEqual(self.generate.call_count, 1)
+        self.assertEqual(GenerationCacheEntry.objects.get().hits, 1)
+
+    def test_usage_is_returned_and_persisted(self):
+        from apps.history.models import Generation
+        self.generate.return_value = GenResult(
+            text="Paris", latency_ms=900, prompt_tokens=12, completion_tokens=3, load_ms=0, ttft_ms=80, tokens_per_s=41.5,
+        )
+        resp = self._post(params={"temperature": 0.7})
+        self.assertEqual(resp.data["usage"]["total_tokens"], 15)
+        self.assertEqual(resp.data["timings"], {"ttft_ms": 80, "load_ms": 0, "tokens_per_s": 41.5})
+        gen = Generation.objects.get(pk=resp.data["generation_id"])
+        self.assertEqual((gen.prompt_tokens, gen.completion_tokens, gen.ttft_ms, gen.tokens_per_s), (12, 3, 80, 41.5))
+
+    def test_seeded_sampling_is_cached_per_seed(self):
+        self._post(params={"temperature": 0.8, "seed": 1})
+        self._post(params={"temperature": 0.8, "seed": 1})
+        self._post(params={"temperature": 0.8, "seed": 2})
+        self.assertEqual(self.generate.call_count, 2)
+
+    def test_sampled_or_bypassed_generations_always_hit_backend(self):
+        self._post(params={"temperature": 0.7})
+        self._post(params={"temperature": 0.7})
+        self._post(params={"temperature": 0}, use_cache=False)
+        self.assertEqual(self.generate.call_count, 3)
+        self.assertFalse(GenerationCacheEntry.objects.exists())
+
+    def test_endpoints_sharing_a_repo_id_do_not_share_cached_outputs(self):
+        for n in (1, 2):
+            HFModel.objects.create(slug=f"tgi-{n}", repo_id="mistral-7b", backend=ModelBackend.TGI,
+                                   endpoint_url=f"http://tgi-{n}.test:8080", is_active=True)
+        with patch.object(TGIBackend, "generate", side_effect=lambda url, prompt, params: GenResult(text=url, latency_ms=1)):
+            outputs = [self._post(model_slug=f"tgi-{n}", params={"temperature": 0}).data["output"] for n in (1, 2, 1)]
+        self.assertEqual(outputs, ["http://tgi-1.test:8080", "http://tgi-2.test:8080", "http://tgi-1.test:8080"])
+        self.assertEqual(GenerationCacheEntry.objects.count(), 2)
+
+    def test_stats_and_clear(self):
+        self._post(params={"temperature": 0})
+        resp = self.client.get(reverse("generation_cache"))
+        self.assertEqual(resp.data["entries"], 1)
+        resp = self.client.delete(reverse("generation_cache"))
+        self.assertEqual(resp.data["deleted"], 1)
+        self.assertEqual(generation_cache.stats()["entries"], 0)
+
+
+class GenerateBatchTests(APITestCase):
+    def setUp(self):
+        for slug in ("ollama-a", "ollama-b"):
+            HFModel.objects.create(slug=slug, repo_id=f"{slug}:7b", backend=ModelBackend.OLLAMA, is_active=True)
+
+    def _fake_generate(self, model, prompt, params, use_cache=True):
+        if prompt == "boom":
+            raise RuntimeError("backend down")
+        n = int(prompt.split()[-1])
+        time.sleep(0.002 * (6 - n))  # later items finish first
+        return GenResult(text=f"{model.slug}:{prompt}:{params.get('max_new_tokens')}", latency_ms=n)
+
+    def test_results_in_input_order_with_per_item_errors(self):
+        from apps.history.models import Generation
+        body = {
+            "model_slug": "ollama-a",
+            "params": {"max_new_tokens": 8},
+            "items": [
+                {"prompt": "p 0"},
+                {"prompt": "boom"},
+                {"prompt": "p 2", "model_slug": "ollama-b", "params": {"max_new_tokens": 4}},
+                {"prompt": "p 3", "model_slug": "missing"},
+                {"prompt": "p 4"},
+            ],
+            "concurrency": 4,
+        }
+        with patch("apps.inference.views.generate_for_model", side_effect=self._fake_generate), \
+                patch.object(Generation.objects, "bulk_create", wraps=Generation.objects.bulk_create) as bulk:
+            resp = self.client.post(reverse("generate_batch"), body, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        results = resp.data["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual(results[0]["output"], "ollama-a:p 0:8")
+        self.assertEqual(results[1]["error"], "backend down")
+        self.assertEqual(results[2]["output"], "ollama-b:p 2:4")
+        self.assertIn("not found", results[3]["error"])
+        self.assertEqual(resp.data["stats"]["errors"], 2)
+        bulk.assert_called_once()
+        self.assertEqual(
+            list(Generation.objects.order_by("id").values_list("id", "prompt")),
+            [(results[i]["generation_id"], f"p {i}") for i in (0, 2, 4)],
+        )
+
+    @override_settings(GENERATE_BATCH_MAX_CONCURRENCY=2)
+    def test_prompts_shorthand_and_concurrency_cap(self):
+        with patch("apps.inference.views.generate_for_model", side_effect=self._fake_generate):
+            resp = self.client.post(reverse("generate_batch"), {
+                "model_slug": "ollama-a", "prompts": ["p 1", "p 2", "p 3"], "concurrency": 50,
+            }, format="json")
+        self.assertEqual(resp.data["stats"]["concurrency"], 2)
+        self.assertEqual([r["output"] for r in resp.data["results"]], ["ollama-a:p 1:None", "ollama-a:p 2:None", "ollama-a:p 3:None"])
+
+    def test_rejects_missing_model_and_mixed_inputs(self):
+        url = reverse("generate_batch")
+        self.assertEqual(self.client.post(url, {"prompts": ["p 1"]}, format="json").status_code, 400)
+        resp = self.client.post(url, {"model_slug": "ollama-a", "prompts": ["p 1"], "items": [{"prompt": "p 2"}]}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+
+class PooledBackendTests(APITestCase):
+    def setUp(self):
+        self.requests = []
+
+        def handler(request):
+            self.requests.append(request)
+            body = json.loads(request.content)
+            if body["stream"]:
+                lines = [{"response": "Par"}, {"response": "is"}, {"response": "", "done": True}]
+                return httpx.Response(200, text="\n".join(json.dumps(x) for x in lines))
+            return httpx.Response(200, json={
+                "response": " Paris ", "done": True,
+                "prompt_eval_count": 12, "eval_count": 40,
+                "load_duration": 1_500_000_000, "prompt_eval_duration": 100_000_000, "eval_duration": 800_000_000,
+            })
+
+        patcher = patch.object(
+            transport, "_new_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        self.new_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        transport.close_clients()
+        self.addCleanup(transport.close_clients)
+
+    def test_sync_calls_share_one_client_per_origin(self):
+        backend = OllamaBackend(base_url="http://ollama.test:11434")
+        first = backend.generate("mistral:7b", "Capital of France?", {"temperature": 0.7})
+        second = backend.generate("mistral:7b", "Capital of France?", {"temperature": 0.7})
+        self.assertEqual((first.text, second.text), ("Paris", "Paris"))
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.new_client.call_count, 1)
+
+    def test_ollama_usage_and_phase_timings(self):
+        result = OllamaBackend(base_url="http://ollama.test:11434").generate("mistral:7b", "Capital?", {})
+        self.assertEqual(result.usage, {"prompt_tokens": 12, "completion_tokens": 40, "total_tokens": 52})
+        self.assertEqual(result.timings, {"ttft_ms": 1600, "load_ms": 1500, "tokens_per_s": 50.0})
+
+    def test_stream_shim_yields_chunks(self):
+        backend = OllamaBackend(base_url="http://ollama.test:11434")
+        chunks = list(backend.stream_generate("mistral:7b", "Capital of France?", {}))
+        self.assertEqual(chunks, ["Par", "is"])
+
+
+class BackendDispatchTests(APITestCase):
+    def test_tgi_model_dispatches_with_default_params(self):
+        model = HFModel.objects.create(
+            slug="tgi-test", display_name="TGI test", repo_id="mistralai/Mistral-7B-Instruct-v0.2",
+            backend=ModelBackend.TGI, endpoint_url="http://tgi.test:8080",
+            default_params={"temperature": 0.2, "max_new_tokens": 32},
+        )
+        with patch.object(TGIBackend, "generate", return_value=GenResult(text="ok", latency_ms=3)) as gen:
+            generate_for_model(model, "hi", {"max_new_tokens": 8})
+        target, prompt, params = gen.call_args.args
+        self.assertEqual((target, prompt), ("http://tgi.test:8080", "hi"))
+        self.assertEqual(params, {"temperature": 0.2, "max_new_tokens": 8})
+
+    def test_partial_request_params_keep_model_default_params(self):
+        HFModel.objects.create(
+            slug="tgi-test", display_name="TGI test", repo_id="m", backend=ModelBackend.TGI,
+            endpoint_url="http://tgi.test:8080", is_active=True,
+            default_params={"temperature": 0.2, "top_k": 5, "max_new_tokens": 32},
+        )
+        expected = {"temperature": 0.2, "top_k": 5, "max_new_tokens": 8}
+        with patch.object(TGIBackend, "generate", return_value=GenResult(text="ok", latency_ms=3)) as gen:
+            resp = self.client.post(reverse("generate"), {
+                "model_slug": "tgi-test", "prompt": "hi", "params": {"max_new_tokens": 8},
+            }, format="json")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(gen.call_args.args[2], expected)
+            resp = self.client.post(reverse("generate_batch"), {
+                "model_slug": "tgi-test", "items": [{"prompt": "a", "params": {"max_new_tokens": 8}}],
+            }, format="json")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(gen.call_args.args[2], expected)
+
+    def test_backend_instances_are_cached_per_endpoint(self):
+        a = get_backend(ModelBackend.OLLAMA, "http://a.test:11434")
+        self.assertIs(a, get_backend(ModelBackend.OLLAMA, "http://a.test:11434"))
+        self.assertIsNot(a, get_backend(ModelBackend.OLLAMA, "http://b.test:11434"))
+        self.assertEqual(a.base_url, "http://a.test:11434")
+
+    def test_endpoint_backends_require_endpoint_url(self):
+        model = HFModel.objects.create(slug="tgi-bare", display_name="TGI", repo_id="x", backend=ModelBackend.TGI)
+        with self.assertRaisesRegex(ValueError, "endpoint_url"):
+            generate_for_model(model, "hi", {})
+
+
+class MicroBatcherTests(APITestCase):
+    def test_concurrent_prompts_share_batches_and_get_their_own_output(self):
+        calls = []
+        batcher = MicroBatcher(
+            lambda prompts, params: calls.append(list(prompts)) or [p.upper() for p in prompts],
+            max_batch=4, window_ms=50,
+        )
+        results = {}
+        def call(prompt):
+            results[prompt] = batcher(prompt, {"temperature": 0}, "greedy")
+        threads = [threading.Thread(target=call, args=(f"p{i}",)) for i in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        self.assertEqual(results, {f"p{i}": f"P{i}" for i in range(8)})
+        self.assertEqual(sum(len(c) for c in calls), 8)
+        self.assertLess(len(calls), 8)
+        self.assertTrue(all(len(c) <= 4 for c in calls))
+
+    def test_ungrouped_prompts_run_alone_and_errors_reach_callers(self):
+        calls = []
+        def run(prompts, params):
+            calls.append(len(prompts))
+            if prompts == ["boom"]:
+                raise RuntimeError("oom")
+            return prompts
+        batcher = MicroBatcher(run, max_batch=8, window_ms=50)
+        futures = [batcher.submit(p, {"seed": 1}, None) for p in ("a", "b", "boom")]
+        self.assertEqual([f.result() for f in futures[:2]], ["a", "b"])
+        with self.assertRaisesRegex(RuntimeError, "oom"):
+            futures[2].result()
+        self.assertEqual(calls, [1, 1, 1])
+
+
+@override_settings(LOCAL_MODEL_MEMORY_BUDGET_MB=250)
+class LocalModelCacheTests(APITestCase):
+    SIZES_MB = {"small": 100, "medium": 120, "large": 130}
+
+    def setUp(self):
+        self.cache = LocalModelCache()
+        self.loads = []
+        def fake_load(repo_id):
+            self.loads.append(repo_id)
+            size = self.SIZES_MB[repo_id] * 1024 * 1024
+            self.cache._known_sizes[repo_id] = size
+            return LoadedModel(repo_id, tokenizer=object(), model=object(), size_bytes=size, load_ms=1)
+        patcher = patch.object(self.cache, "_load", side_effect=fake_load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _touch(self, repo_id):
+        with self.cache.use(repo_id):
+            pass
+
+    def _resident(self):
+        return [m["repo_id"] for m in self.cache.stats()["models"]]
+
+    def test_least_recently_used_model_is_evicted_to_fit_budget(self):
+        self._touch("small")
+        self._touch("medium")
+        self._touch("small")   # medium is now the LRU entry
+        self._touch("large")   # 100 + 120 + 130 > 250
+        self.assertEqual(self._resident(), ["large", "small"])
+        self.assertEqual(self.cache.stats()["resident_mb"], 230)
+        self._touch("small")
+        self.assertEqual(self.loads, ["small", "medium", "large"])  # cache hit, no reload
+
+    def test_models_in_use_are_not_evicted(self):
+        with self.cache.use("medium"):
+            self._touch("small")
+            self._touch("large")
+            self.assertIn("medium", self._resident())
+            self.assertFalse(self.cache.unload("medium"))
+        self.assertTrue(self.cache.unload("medium"))
+        self.assertNotIn("medium", self._resident())
+
+    def test_entry_is_pinned_before_the_cache_lock_is_released(self):
+        # Every time use() releases the cache lock, let a "concurrent" DELETE /local_models/ run.
+        cache, real_lock, attempts = self.cache, self.cache._lock, []
+
+        class InterleavingLock:
+            racing = True
+
+            def __enter__(self):
+                return real_lock.__enter__()
+
+            def __exit__(self, *exc):
+                real_lock.__exit__(*exc)
+                if self.racing:
+                    self.racing = False
+                    attempts.append(cache.unload("small"))
+                    self.racing = True
+
+        self._touch("small")
+        cache._lock = InterleavingLock()
+        with cache.use("small") as entry:
+            cache._lock.racing = False
+            self.assertIsNotNone(entry.model)
+        self.assertEqual(attempts, [False])
+
+
+def use_tiny_local_model(test) -> LoadedModel:
+    """Serve a random two-layer GPT-2 as local model "tiny" for the rest of `test`."""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    vocab = {w: i for i, w in enumerate(["<eos>", "[UNK]"] + [f"w{i}" for i in range(200)])}
+    tk = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tk.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok = PreTrainedTokenizerFast(tokenizer_object=tk, eos_token="<eos>", unk_token="[UNK]",
+                                  pad_token="<eos>", padding_side="left")
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(vocab_size=len(vocab), n_positions=128, n_embd=32,
+                                       n_layer=2, n_head=2, bos_token_id=0, eos_token_id=0)).eval()
+    cache = LocalModelCache()
+    entry = LoadedModel("tiny", tokenizer=tok, model=model, size_bytes=1, load_ms=0)
+    patch.object(cache, "_load", return_value=entry).start()
+    test.addCleanup(patch.stopall)
+    patch("apps.inference.backends.local_models", cache).start()
+    return entry
+
+
+class BackendStreamingTests(APITestCase):
+    def setUp(self):
+        def handler(request):
+            if request.url.path == "/generate_stream":
+                events = [
+                    {"token": {"text": "Par", "special": False}},
+                    {"token": {"text": "is", "special": False}},
+                    {"token": {"text": "</s>", "special": True}, "generated_text": "Paris"},
+                ]
+                return httpx.Response(200, text="".join(f"data:{json.dumps(e)}\n\n" for e in events))
+            chunks = [{"choices": [{"delta": {"role": "assistant"}}]},
+                      {"choices": [{"delta": {"content": "Par"}}]},
+                      {"choices": [{"delta": {"content": "is"}}]}]
+            body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=body)
+
+        patcher = patch.object(
+            transport, "_new_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        transport.close_clients()
+        self.addCleanup(transport.close_clients)
+
+    def _stream(self, slug):
+        resp = self.client.post(reverse("generate_stream"), {"model_slug": slug, "prompt": "Capital?"}, format="json")
+        events = b"".join(resp.streaming_content).decode().split("\n\n")
+        return [json.loads(e.split("data: ", 1)[1])["token"] for e in events if '"token"' in e]
+
+    def test_tgi_streams_non_special_tokens(self):
+        HFModel.objects.create(slug="tgi", display_name="TGI", repo_id="m", backend=ModelBackend.TGI,
+                               endpoint_url="http://tgi.test:8080")
+        self.assertEqual(self._stream("tgi"), ["Par", "is"])
+
+    def test_hf_router_streams_delta_content(self):
+        HFModel.objects.create(slug="router", display_name="Router", repo_id="m", backend=ModelBackend.HF_ROUTER)
+        self.assertEqual(self._stream("router"), ["Par", "is"])
+
+    @skipUnless(importlib.util.find_spec("torch"), "needs torch")
+    def test_local_streams_the_same_text_as_generate(self):
+        use_tiny_local_model(self)
+        params = {"temperature": 0, "max_new_tokens": 6}
+        chunks = list(LocalBackend().stream_generate("tiny", "w1 w2 w3", params))
+        self.assertTrue(chunks)
+        self.assertEqual("".join(chunks).split(), LocalBackend().generate_batch("tiny", ["w1 w2 w3"], params)[0].text.split())
+
+    @skipUnless(importlib.util.find_spec("torch"), "needs torch")
+    @override_settings(STREAM_TIMEOUT_SECS=30)
+    def test_local_stream_raises_generate_errors_without_waiting_for_timeout(self):
+        entry = use_tiny_local_model(self)
+        patch.object(entry.model, "generate", side_effect=RuntimeError("CUDA out of memory")).start()
+        t0 = time.perf_counter()
+        with self.assertRaisesRegex(RuntimeError, "out of memory"):
+            list(LocalBackend().stream_generate("tiny", "w1 w2 w3", {"max_new_tokens": 6}))
+        self.assertLess(time.perf_counter() - t0, 5)
+
+
+class SingleFlightTests(APITestCase):
+    def setUp(self):
+        self.model = HFModel.objects.create(
+            slug="ollama-test", display_name="Ollama test", repo_id="mistral:7b",
+            backend=ModelBackend.OLLAMA, is_active=True,
+        )
+
+    def _slow_generate(self, *args):
+        time.sleep(0.1)
+        return GenResult(text="Paris", latency_ms=100)
+
+    def _concurrently(self, n, fn):
+        results = [None] * n
+        def run(i):
+            results[i] = fn()
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        return results
+
+    def test_identical_concurrent_generations_share_one_backend_call(self):
+        params = {"temperature": 0.7}  # not cacheable: only coalescing can dedupe it
+        with patch("apps.inference.backends.OllamaBackend.generate", side_effect=self._slow_generate) as gen:
+            results = self._concurrently(5, lambda: generate_for_model(self.model, "Capital?", params))
+        self.assertEqual(gen.call_count, 1)
+        self.assertEqual({r.text for r in results}, {"Paris"})
+        self.assertEqual(len({id(r) for r in results}), 5)  # each caller owns its result
+
+    def test_use_cache_false_is_never_coalesced(self):
+        with patch("apps.inference.backends.OllamaBackend.generate", side_effect=self._slow_generate) as gen:
+            self._concurrently(3, lambda: generate_for_model(self.model, "Capital?", {}, use_cache=False))
+        self.assertEqual(gen.call_count, 3)
+
+    @override_settings(SINGLE_FLIGHT_CROSS_PROCESS=True)
+    def test_waits_for_result_published_by_another_process(self):
+        from django.core.cache import cache
+        flight = SingleFlight()
+        cache.add("singleflight:lock:k", time.time())  # another worker holds the key
+        def other_worker_finishes():
+            time.sleep(0.1)
+            cache.set("singleflight:result:k", (time.time(), "from-remote"))
+            cache.delete("singleflight:lock:k")
+        threading.Thread(target=other_worker_finishes).start()
+        self.assertEqual(flight.do("k", lambda: "local"), "from-remote")
+        self.assertEqual(flight.stats()["remote_followers"], 1)
+
+
+@override_settings(OLLAMA_HEALTH_INTERVAL_SECS=0, OLLAMA_EJECT_AFTER_FAILURES=2)
+class OllamaPoolTests(APITestCase):
+    def setUp(self):
+        self.hits = []
+        self.down = set()
+
+        def handler(request):
+            host = request.url.host
+            if host in self.down:
+                raise httpx.ConnectError("connection refused", request=request)
+            if request.url.path == "/api/tags":
+                return httpx.Response(200, json={"models": [{"name": "mistral:7b"}]})
+            if request.url.path == "/api/ps":
+                loaded = [{"name": "mistral:7b"}] if host == "b.test" else []
+                return httpx.Response(200, json={"models": loaded})
+            self.hits.append(host)
+            return httpx.Response(200, json={"response": host, "done": True})
+
+        patcher = patch.object(
+            transport, "_new_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        transport.close_clients()
+        self.addCleanup(transport.close_clients)
+        self.backend = OllamaBackend(base_url="http://a.test:11434, http://b.test:11434")
+
+    def test_least_outstanding_with_model_affinity(self):
+        pool = self.backend.pool
+        transport.run_sync(pool.probe_all())  # b has mistral loaded
+        self.assertEqual(self.backend.generate("mistral:7b", "hi", {}).text, "b.test")
+
+        leases = [pool.acquire("mistral:7b") for _ in range(4)]  # warm b takes the load first ...
+        self.assertEqual([r.url for r in leases].count("http://b.test:11434"), 4)
+        self.assertEqual(pool.acquire("mistral:7b").url, "http://a.test:11434")  # ... until it is 4 requests busier
+
+    @override_settings(OLLAMA_EJECT_AFTER_FAILURES=1)
+    def test_failing_replica_is_retried_elsewhere_and_ejected(self):
+        self.down.add("a.test")
+        for _ in range(3):
+            self.assertEqual(self.backend.generate("mistral:7b", "hi", {}).text, "b.test")
+        a = self.backend.pool.replicas[0]
+        self.assertFalse(a.up(time.monotonic()))
+        self.assertEqual(self.hits, ["b.test"] * 3)
+
+        self.down.clear()
+        transport.run_sync(self.backend.pool.probe(a))  # healthy probe re-admits it
+        self.assertTrue(a.up(time.monotonic()))
+
+
+class HostGuardTests(APITestCase):
+    def _client(self, origin, handler):
+        return httpx.AsyncClient(transport=GuardedTransport(httpx.MockTransport(handler), origin))
+
+    def _get_all(self, client, url, n):
+        async def run():
+            return await asyncio.gather(*(client.get(url) for _ in range(n)), return_exceptions=True)
+        return transport.run_sync(run())
+
+    @override_settings(HOST_CONCURRENCY_INITIAL=2, HOST_CONCURRENCY_MAX=2)
+    def test_concurrency_is_capped_per_host(self):
+        active, peak = [0], [0]
+
+        async def handler(request):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.02)
+            active[0] -= 1
+            return httpx.Response(200, json={})
+
+        client = self._client("http://capped.test", handler)
+        responses = self._get_all(client, "http://capped.test/x", 6)
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(guard_for("http://capped.test").limiter.in_flight, 0)
+
+    def test_limit_grows_on_success_and_halves_on_errors(self):
+        codes = iter([200] * 10 + [503])
+        client = self._client("http://aimd.test", lambda request: httpx.Response(next(codes)))
+        limiter = guard_for("http://aimd.test").limiter
+        self._get_all(client, "http://aimd.test/x", 10)
+        grown = limiter.limit
+        self.assertGreater(grown, 8)
+        self._get_all(client, "http://aimd.test/x", 1)
+        self.assertAlmostEqual(limiter.limit, grown / 2)
+
+    @override_settings(BREAKER_MIN_REQUESTS=3, BREAKER_COOLDOWN_SECS=0.05)
+    def test_breaker_fails_fast_then_recovers_through_a_trial_call(self):
+        calls, healthy = [], [False]
+
+        def handler(request):
+            calls.append(request.url.path)
+            if not healthy[0]:
+                raise httpx.ConnectError("connection refused", request=request)
+            return httpx.Response(200)
+
+        client = self._client("http://flaky.test", handler)
+        breaker = guard_for("http://flaky.test").breaker
+        self._get_all(client, "http://flaky.test/x", 3)
+        self.assertEqual(breaker.state, "open")
+
+        errors = self._get_all(client, "http://flaky.test/x", 2)
+        self.assertTrue(all(isinstance(e, CircuitOpenError) for e in errors))
+        self.assertEqual(len(calls), 3)  # failed fast, host not contacted
+
+        healthy[0] = True
+        time.sleep(0.06)
+        self.assertEqual(self._get_all(client, "http://flaky.test/x", 1)[0].status_code, 200)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_status_endpoint_reports_limits_and_breakers(self):
+        guard_for("http://status.test")
+        body = self.client.get(reverse("backend_status")).json()
+        self.assertEqual(body["hosts"]["http://status.test"]["breaker"]["state"], "closed")
+        self.assertIn("limit", body["hosts"]["http://status.test"])
+
+
+class LazyProviderTests(APITestCase):
+    HEAVY = ("torch", "transformers", "sentence_transformers", "rouge_score", "sacrebleu", "nltk")
+
+    def test_url_conf_does_not_import_ml_libraries(self):
+        code = (
+            "import os, sys, django; os.environ['DJANGO_SETTINGS_MODULE'] = 'thesis.settings'; django.setup(); "
+            "import thesis.urls, apps.eval.views, apps.inference.views, apps.inference.tasks; "
+            f"print(','.join(m for m in {self.HEAVY!r} if m in sys.modules))"
+        )
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=120,
+                             cwd=settings.BASE_DIR, check=True)
+        self.assertEqual(out.stdout.strip(), "")
+
+    def test_provider_builds_once(self):
+        calls = []
+        provider = Provider("test:provider", lambda: calls.append(1) or object())
+        self.assertFalse(provider.loaded)
+        self.assertIs(provider(), provider())
+        self.assertEqual(calls, [1])
+        self.assertIn({"name": "test:provider", "loaded": True, "load_ms": provider.load_ms}, provider_stats())
+
+
+class PrefixPromptTests(APITestCase):
+    def test_prefixed_prompt_is_a_plain_string_that_survives_pickling(self):
+        prompt = label_prompt("Water boils at 100°C")
+        self.assertEqual(prompt, LABEL_PROMPT_TEMPLATE.format(claim="Water boils at 100°C"))
+        self.assertTrue(prompt.startswith(prompt.prefix))
+        self.assertEqual(prompt.prefix, label_prompt("The moon is cheese").prefix)
+        self.assertEqual(pickle.loads(pickle.dumps(prompt)).prefix, prompt.prefix)
+
+    @override_settings(OLLAMA_KEEP_ALIVE="1h")
+    def test_ollama_requests_keep_the_model_resident(self):
+        payload = OllamaBackend(base_url="http://a.test:11434")._payload("mistral:7b", "hi", _norm_params({}), False)
+        self.assertEqual(payload["keep_alive"], "1h")
+
+    @skipUnless(importlib.util.find_spec("torch"), "needs torch")
+    def test_local_backend_reuses_prefix_kv_with_identical_output(self):
+        entry = use_tiny_local_model(self)
+        prefix = " ".join(f"w{i}" for i in range(40)) + "\n"
+        suffixes = ["w100 w150", "w101 w102 w103 w104", "w199"]
+        params = {"temperature": 0, "max_new_tokens": 6}
+        backend = LocalBackend()
+        plain = [backend.generate_batch("tiny", [prefix + s], params)[0] for s in suffixes]
+        reused = backend.generate_batch("tiny", [PrefixedPrompt(prefix, s) for s in suffixes], params)
+        again = backend.generate_batch("tiny", [PrefixedPrompt(prefix, suffixes[0])], params)
+
+        self.assertEqual([r.text for r in reused], [r.text for r in plain])
+        self.assertEqual([r.prompt_tokens for r in reused], [r.prompt_tokens for r in plain])
+        self.assertEqual(again[0].text, plain[0].text)
+        self.assertEqual(list(entry.prefixes), [prefix])
+
+
+class WarmPoolTests(APITestCase):
+    def setUp(self):
+        HFModel.objects.create(slug="ollama-test", repo_id="llama3:8b", backend=ModelBackend.OLLAMA, is_active=True)
+        HFModel.objects.create(slug="tgi-test", repo_id="x", backend=ModelBackend.TGI, is_active=True)
+        self.payloads = []
+
+        def handler(request):
+            self.payloads.append(json.loads(request.content))
+            return httpx.Response(200, json={"done": True, "done_reason": "load", "load_duration": 2_500_000_000})
+
+        patcher = patch.object(
+            transport, "_new_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        transport.close_clients()
+        self.addCleanup(transport.close_clients)
+
+    @override_settings(JUDGE_MODEL_OLLAMA="mistral:7b", OLLAMA_KEEP_ALIVE="30m",
+                       OLLAMA_KEEP_ALIVE_BY_MODEL={"mistral:7b": "-1"})
+    def test_preloads_active_models_and_judge_with_their_keep_alive(self):
+        resp = self.client.post(reverse("warm_pool"), {}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([(r["model"], r["ok"], r["load_ms"]) for r in resp.data["results"]],
+                         [("llama3:8b", True, 2500), ("mistral:7b", True, 2500)])
+        self.assertEqual(self.payloads, [{"model": "llama3:8b", "keep_alive": "30m"},
+                                         {"model": "mistral:7b", "keep_alive": "-1"}])
+        self.assertEqual(len(self.client.get(reverse("warm_pool")).data["models"]), 2)
@@ -0,0 +1,112 @@
+# apps/inference/transport.py
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import weakref
+from typing import AsyncIterator, Awaitable, Iterator, TypeVar
+
+import httpx
+from django.conf import settings
+
+from .limits import GuardedTransport
+
+T = TypeVar("T")
+
+# loop -> {origin: AsyncClient}. An AsyncClient is bound to the loop it was first used on,
+# so every event loop gets its own pool per origin.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_pid: int | None = None
+_loop_lock = threading.Lock()
+
+
+def _origin(url: str) -> str:
+    u = httpx.URL(url)
+    return f"{u.scheme}://{u.netloc.decode('ascii')}"
+
+
+def _new_async_client(origin: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=getattr(settings, "HTTP_POOL_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=getattr(settings, "HTTP_POOL_MAX_KEEPALIVE", 20),
+        keepalive_expiry=getattr(settings, "HTTP_KEEPALIVE_EXPIRY_SECS", 30),
+    )
+    transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(limits=limits)
+    if getattr(settings, "HOST_GUARD_ENABLED", True):
+        transport = GuardedTransport(transport, origin)
+    return httpx.AsyncClient(transport=transport, timeout=getattr(settings, "REQUEST_TIMEOUT_SECS", 120))
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    """
+    Shared keep-alive client for the origin (scheme://host:port) of `url`, on the running loop.
+    Pass full URLs to it; one connection pool serves every path on that origin.
+    """
+    loop = asyncio.get_running_loop()
+    origin = _origin(url)
+    with _clients_lock:
+        per_loop = _clients.setdefault(loop, {})
+        client = per_loop.get(origin)
+        if client is None or client.is_closed:
+            client = per_loop[origin] = _new_async_client(origin)
+    return client
+
+
+async def aclose_clients() -> None:
+    """Close the pools owned by the running loop."""
+    with _clients_lock:
+        clients = list(_clients.pop(asyncio.get_running_loop(), {}).values())
+    for client in clients:
+        await client.aclose()
+
+
+# ---------- sync shim ----------
+def _shared_loop() -> asyncio.AbstractEventLoop:
+    """
+    A long-lived event loop on a daemon thread, so sync callers (views, worker threads,
+    Celery tasks) reuse the same pools across calls. Recreated after fork (Celery prefork).
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid() or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="inference-http", daemon=True).start()
+        return _loop
+
+
+def run_sync(aw: Awaitable[T]) -> T:
+    """Run a coroutine on the shared loop and block until it completes."""
+    return asyncio.run_coroutine_threadsafe(aw, _shared_loop()).result()
+
+
+def run_background(aw: Awaitable[T]) -> "concurrent.futures.Future[T]":
+    """Schedule a coroutine on the shared loop without waiting for it (e.g. periodic probes)."""
+    return asyncio.run_coroutine_threadsafe(aw, _shared_loop())
+
+
+def iter_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    """Drive an async iterator on the shared loop, one item at a time."""
+    loop = _shared_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        # Consumer stopped early (client disconnect): release the upstream response.
+        aclose = getattr(agen, "aclose", None)
+        if aclose is not None:
+            asyncio.run_coroutine_threadsafe(aclose(), loop).result()
+
+
+def close_clients() -> None:
+    """Close the shared loop's pools (tests, shutdown)."""
+    if _loop is not None and _loop_pid == os.getpid() and not _loop.is_closed():
+        run_sync(aclose_clients())
@@ -1,12 +1,26 @@
 # apps/inference/urls.py
 from django.urls import path
-from .views import GenerateView, GenerateStreamView,GenerationListView, GenerationDetailView
+from .views import GenerateView, GenerateBatchView, GenerateStreamView,GenerationListView, GenerationDetailView
 from .views import LabelClaimView, LabelDatasetView
+from .views import (
+    LabelRunSubmitView, LabelRunDetailView, LabelRunCancelView, LabelRunResumeView, LabelRunDownloadView,
+)
+from .views import GenerationCacheView, LocalModelsView, BackendStatusView, WarmPoolView
 urlpatterns = [
     path("generate/", GenerateView.as_view(), name="generate"),
+    path("generate/batch/", GenerateBatchView.as_view(), name="generate_batch"),
     path("generate/stream/", GenerateStreamView.as_view(), name="generate_stream"),
     path("generations/", GenerationListView.as_view(), name="generation_list"),
     path("generations/<int:pk>/", GenerationDetailView.as_view(), name="generation_detail"),
     path("label/", LabelClaimView.as_view(), name="label_claim"),
-    path("label_dataset/", LabelDatasetView.as_view(), name="label_dataset")
+    path("label_dataset/", LabelDatasetView.as_view(), name="label_dataset"),
+    path("label_runs/", LabelRunSubmitView.as_view(), name="label_run_submit"),
+    path("label_runs/<int:pk>/", LabelRunDetailView.as_view(), name="label_run_detail"),
+    path("label_runs/<int:pk>/cancel/", LabelRunCancelView.as_view(), name="label_run_cancel"),
+    path("label_runs/<int:pk>/resume/", LabelRunResumeView.as_view(), name="label_run_resume"),
+    path("label_runs/<int:pk>/download/", LabelRunDownloadView.as_view(), name="label_run_download"),
+    path("cache/", GenerationCacheView.as_view(), name="generation_cache"),
+    path("local_models/", LocalModelsView.as_view(), name="local_models"),
+    path("backends/", BackendStatusView.as_view(), name="backend_status"),
+    path("warm/", WarmPoolView.as_view(), name="warm_pool"),
 ]
@@ -4,12 +4,14 @@ from __future__ import annotations
 import json
 import logging
 import csv
-import io
+import time
 from django.http import HttpResponse
 from typing import Generator, Optional
 import re
+from django.conf import settings
 from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 
@@ -19,8 +21,8 @@ from rest_framework.views import APIView
 
 from apps.models_registry.models import HFModel
 from apps.datasets.models import Dataset, DatasetRow
-from .serializers import GenerateRequestSerializer, GenerateStreamRequestSerializer
-from .router import generate_for_model, stream_for_model
+from .serializers import GenerateBatchRequestSerializer, GenerateRequestSerializer, GenerateStreamRequestSerializer
+from .router import generate_for_model, get_ollama, stream_for_model
 from apps.inference.backends import OllamaBackend 
 
 from rest_framework.generics import ListAPIView, RetrieveAPIView
@@ -34,7 +36,20 @@ from .serializers import (
 )
 from django.shortcuts import get_object_or_404
 from apps.models_registry.models import HFModel, ModelBackend
-from .serializers import LabelDatasetRequestSerializer
+from .serializers import LabelDatasetRequestSerializer, LabelRunRequestSerializer, LabelRunSerializer
+from .models import LabelChunk, LabelRun
+from .tasks import start_label_run
+from .cache import generation_cache
+from .singleflight import single_flight
+from .local_models import local_models
+from .limits import CircuitOpenError, guard_stats
+from .providers import provider_stats
+from .warm_pool import warm_pool
+from .concurrency import bounded_map
+from .labeling import (
+    JUDGE_FIELDS, LABEL_FIELDS, LabelStats, iter_label_rows, label_concurrency, label_prompt, label_rows,
+    _extract_label_and_justification,
+)
 logger = logging.getLogger(__name__)
 
 # History is optional: if the app/model isn't present yet, we just skip persisting.
@@ -73,7 +88,9 @@ class GenerateView(APIView):
         "model": "gemma3-4b-ollama",
         "latency_ms": 842,
         "finish_reason": "stop",   # when available from backend
-        "usage": {...},            # when available from backend
+        "usage": {"prompt_tokens": 12, "completion_tokens": 40, "total_tokens": 52},  # when reported
+        "timings": {"ttft_ms": 95, "load_ms": 0, "tokens_per_s": 48.7},               # when reported
+        "cached": false,           # true when served from the generation cache
         "output": "..."
       }
     """
@@ -89,7 +106,11 @@ class GenerateView(APIView):
 
         # Call backend
         try:
-            result = generate_for_model(model, prompt, params)
+            result = generate_for_model(model, prompt, params, use_cache=serializer.validated_data["use_cache"])
+        except CircuitOpenError as e:
+            # backend host is failing; tell the client to back off rather than retry at once
+            return Response({"error": "Backend unavailable", "detail": str(e)},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             logger.exception("Inference failed for slug=%s", model.slug)
             # Return a readable error instead of a 500
@@ -99,31 +120,128 @@ class GenerateView(APIView):
         gen_id: Optional[int] = None
         if Generation is not None:
             try:
-                gen = Generation.objects.create(
-                    user=request.user if getattr(request, "user", None) and request.user.is_authenticated else None,
-                    model_slug=model.slug,
-                    prompt=prompt,
-                    params=params,
-                    output=getattr(result, "text", "") or "",
-                    latency_ms=getattr(result, "latency_ms", None),
-                )
+                gen = _history_row(request, model, prompt, params, result)
+                gen.save()
                 gen_id = gen.id
             except Exception:
                 logger.exception("Failed to persist generation history (non-fatal).")
-        # apps/inference/views.py (inside post)
 
-        
-        return Response(
-            {
-                "generation_id": gen_id,
-                "model": model.slug,
-                "latency_ms": getattr(result, "latency_ms", None),
-                "finish_reason": getattr(result, "finish_reason", None),
-                "usage": getattr(result, "usage", None),
-                "output": getattr(result, "text", "") or "",
+        return Response(_generation_payload(gen_id, model, result), status=status.HTTP_200_OK)
+
+
+def _history_row(request, model: HFModel, prompt: str, params: dict, result):
+    """Unsaved history Generation for one backend result."""
+    return Generation(
+        user=request.user if getattr(request, "user", None) and request.user.is_authenticated else None,
+        model_slug=model.slug,
+        prompt=prompt,
+        params=params,
+        output=getattr(result, "text", "") or "",
+        latency_ms=getattr(result, "latency_ms", None),
+        prompt_tokens=getattr(result, "prompt_tokens", None),
+        completion_tokens=getattr(result, "completion_tokens", None),
+        ttft_ms=getattr(result, "ttft_ms", None),
+        load_ms=getattr(result, "load_ms", None),
+        tokens_per_s=getattr(result, "tokens_per_s", None),
+    )
+
+
+def _generation_payload(gen_id: Optional[int], model: HFModel, result) -> dict:
+    return {
+        "generation_id": gen_id,
+        "model": model.slug,
+        "latency_ms": getattr(result, "latency_ms", None),
+        "finish_reason": getattr(result, "finish_reason", None),
+        "usage": getattr(result, "usage", None),
+        "timings": getattr(result, "timings", None),
+        "cached": getattr(result, "cached", False),
+        "output": getattr(result, "text", "") or "",
+    }
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class GenerateBatchView(APIView):
+    """
+    Many prompts in one request, generated concurrently server-side.
+
+    JSON in (either "prompts" with the batch model/params, or "items" that may override them):
+      {
+        "model_slug": "gemma3-4b-ollama",
+        "params": {"temperature": 0.2, "max_new_tokens": 64},
+        "items": [
+          {"prompt": "..."},
+          {"prompt": "...", "model_slug": "mistral-7b-ollama", "params": {"max_new_tokens": 16}}
+        ],
+        "concurrency": 8,          # optional, capped by GENERATE_BATCH_MAX_CONCURRENCY
+        "use_cache": true
+      }
+
+    JSON out (200), results in input order; a failed item carries "error" instead of output:
+      {
+        "results": [
+          {"index": 0, "generation_id": 123, "model": "...", "latency_ms": 842, ..., "output": "..."},
+          {"index": 1, "model": "mistral-7b-ollama", "error": "..."}
+        ],
+        "stats": {"items": 2, "errors": 1, "concurrency": 8, "elapsed_ms": 910}
+      }
+    """
+    def post(self, request):
+        serializer = GenerateBatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        default_slug, default_params = data.get("model_slug"), data.get("params") or {}
+        items = [
+            (i, item.get("model_slug") or default_slug, item["prompt"], item.get("params") or default_params)
+            for i, item in enumerate(data["items"])
+        ]
+        models = {m.slug: m for m in HFModel.objects.filter(slug__in={slug for _, slug, _, _ in items}, is_active=True)}
+
+        requested = data.get("concurrency") or getattr(settings, "GENERATE_BATCH_CONCURRENCY", 4)
+        concurrency = max(1, min(int(requested), getattr(settings, "GENERATE_BATCH_MAX_CONCURRENCY", 16), len(items)))
+        use_cache = data["use_cache"]
+
+        def work(item):
+            index, slug, prompt, params = item
+            model = models.get(slug)
+            if model is None:
+                return index, slug, None, f"Model '{slug}' not found or inactive"
+            try:
+                return index, slug, generate_for_model(model, prompt, params, use_cache=use_cache), None
+            except Exception as e:
+                logger.warning("Batch item %s failed for slug=%s: %s", index, slug, e)
+                return index, slug, None, str(e)
+
+        t0 = time.perf_counter()
+        outcomes = list(bounded_map(work, items, concurrency=concurrency))
+        elapsed_ms = int((time.perf_counter() - t0) * 1000)
+
+        # One INSERT for the whole batch instead of one per item.
+        ids: dict[int, Optional[int]] = {}
+        if Generation is not None:
+            rows = [
+                (index, _history_row(request, models[slug], items[index][2], items[index][3], result))
+                for index, slug, result, error in outcomes if error is None
+            ]
+            try:
+                created = Generation.objects.bulk_create([gen for _, gen in rows])
+                ids = {index: gen.pk for (index, _), gen in zip(rows, created)}
+            except Exception:
+                logger.exception("Failed to persist batch generation history (non-fatal).")
+
+        results = [
+            {"index": index, "model": slug, "error": error} if error is not None
+            else {"index": index, **_generation_payload(ids.get(index), models[slug], result)}
+            for index, slug, result, error in outcomes
+        ]
+        return Response({
+            "results": results,
+            "stats": {
+                "items": len(results),
+                "errors": sum(1 for r in results if "error" in r),
+                "concurrency": concurrency,
+                "elapsed_ms": elapsed_ms,
             },
-            status=status.HTTP_200_OK,
-        )
+        }, status=status.HTTP_200_OK)
 
 
 @method_decorator(csrf_exempt, name="dispatch")  # dev-friendly; remove in prod if using CSRF/SessionAuth
@@ -132,7 +250,7 @@ class GenerateStreamView(APIView):
     SSE streaming endpoint. Emits:
       event: start -> {"status":"start"}
       (many)        -> {"token":"..."}  one small chunk per message
-      event: done  -> {"status":"done"}
+      event: done  -> {"status":"done", "ttft_ms": 120, "latency_ms": 2300, "chunks": 57}
 
     JSON in is identical to GenerateView.
     """
@@ -151,19 +269,27 @@ class GenerateStreamView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         def event_stream() -> Generator[str, None, None]:
+            t0 = time.time()
+            ttft_ms, chunks = None, 0
             # Start event
             yield _sse({"status": "start"}, event="start")
             try:
                 for token in token_gen:
                     # Each chunk/token as its own SSE event (default event type)
                     if token:
+                        if ttft_ms is None:
+                            ttft_ms = int((time.time() - t0) * 1000)
+                        chunks += 1
                         yield _sse({"token": token})
             except Exception as e:
                 logger.exception("Streaming error for slug=%s", model.slug)
                 # Send an SSE error event before closing
                 yield _sse({"error": str(e)}, event="error")
             # Done event
-            yield _sse({"status": "done"}, event="done")
+            yield _sse(
+                {"status": "done", "ttft_ms": ttft_ms, "latency_ms": int((time.time() - t0) * 1000), "chunks": chunks},
+                event="done",
+            )
 
         resp = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
         # Recommended headers for SSE
@@ -202,43 +328,28 @@ class GenerationDetailView(RetrieveAPIView):
 
 # datasets evaluation 
 
-def _normalize_label(s: str) -> Optional[str]:
-    if not s:
-        return None
-    t = s.strip().lower()
-    pos = {"accepted", "support", "supported", "true", "yes", "correct"}
-    neg = {"refuted", "reject", "rejected", "false", "no", "incorrect", "not supported"}
-    if t in pos: return "Accepted"
-    if t in neg: return "Refuted"
-    if any(k in t for k in ["refut", "false", "not supported", "incorrect"]): return "Refuted"
-    if any(k in t for k in ["accept", "support", "true", "correct", "supported"]): return "Accepted"
-    return None
-
-def _extract_label_and_justification(text: str) -> tuple[Optional[str], str]:
-    if not text:
-        return None, ""
-    # try JSON
-    try:
-        j = json.loads(text)
-        if isinstance(j, dict):
-            lab = _normalize_label(j.get("label", ""))
-            just = (j.get("justification", "") or "").strip()
-            if lab:
-                return lab, just
-    except Exception:
-        pass
-    # try "Label: ...", "Justification: ..."
-    m_lab = re.search(r"label\s*[:\-]\s*(.+)", text, re.I)
-    m_jus = re.search(r"(justification|reason|because)\s*[:\-]\s*(.+)", text, re.I)
-    lab2 = _normalize_label(m_lab.group(1)) if m_lab else None
-    jus2 = (m_jus.group(2).strip() if m_jus else "").strip()
-    if lab2:
-        return lab2, jus2
-    # heuristic: first sentence verdict + rest as reason
-    parts = re.split(r"(?<=[\.\!\?])\s+", text.strip(), maxsplit=1)
-    lab3 = _normalize_label(parts[0])
-    jus3 = (parts[1] if len(parts) > 1 else text).strip()
-    return lab3, jus3[:500]
+def _pick_label_model(model_slug: Optional[str]) -> Optional[HFModel]:
+    """
+    Explicit slug -> that active model on any backend (404 otherwise);
+    no slug -> first active OLLAMA model, falling back to the first active model.
+    """
+    if model_slug:
+        return get_object_or_404(HFModel, slug=model_slug, is_active=True)
+    active = HFModel.objects.filter(is_active=True).order_by("id")
+    return active.filter(backend=ModelBackend.OLLAMA).first() or active.first()
+
+def _no_label_model() -> Response:
+    return Response(
+        {"error": "no_active_model", "detail": "No active model available."},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+def _with_label_stats(resp, stats):
+    """Attach labeling throughput (see LabelStats.as_dict) as X-Label-* headers."""
+    for key, value in stats.as_dict().items():
+        if value is not None:
+            resp[f"X-Label-{key.replace('_', '-').title()}"] = str(value)
+    return resp
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -258,35 +369,17 @@ class LabelClaimView(APIView):
         model_slug: Optional[str] = s.validated_data.get("model_slug")
         params: dict = s.validated_data.get("params") or {}
 
-        # 2) Resolve model (OLLAMA only)
-        if model_slug:
-            model = get_object_or_404(
-                HFModel, slug=model_slug, is_active=True, backend=ModelBackend.OLLAMA
-            )
-        else:
-            model = (
-                HFModel.objects.filter(is_active=True, backend=ModelBackend.OLLAMA)
-                .order_by("id")
-                .first()
-            )
-            if not model:
-                return Response(
-                    {"error": "no_active_model", "detail": "No active OLLAMA model available."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        # 2) Resolve model
+        model = _pick_label_model(model_slug)
+        if not model:
+            return _no_label_model()
 
         # 3) Build prompt (JSON-only response for robust parsing)
-        prompt = (
-            "You are a binary fact checker. Given a CLAIM, decide if it is Accepted or Refuted, "
-            "and provide a BRIEF justification grounded in general knowledge.\n\n"
-            f"CLAIM: {claim}\n\n"
-            "Respond in JSON ONLY with keys: "
-            'label (Accepted|Refuted), justification (<= 2 sentences).'
-        )
+        prompt = label_prompt(claim)
 
         # 4) Call model
         try:
-            result = generate_for_model(model, prompt, params)  # returns GenResult(text, latency_ms)
+            result = generate_for_model(model, prompt, params, use_cache=s.validated_data["use_cache"])
         except Exception as e:
             logger.exception("inference failed (model=%s)", getattr(model, "slug", "?"))
             return Response(
@@ -335,12 +428,6 @@ class LabelClaimView(APIView):
             "raw": pretty_raw[:2000],  # cap size for safety
         }
         return Response(LabelResultSerializer(payload).data, status=status.HTTP_200_OK)
-def _clean_model_text(s: str) -> str:
-    s = (s or "").strip()
-    if s.startswith("```"):
-        s = re.sub(r"^```(?:json)?", "", s, flags=re.I).strip()
-        s = re.sub(r"```$", "", s).strip()
-    return s
 
 @method_decorator(csrf_exempt, name="dispatch")
 class LabelDatasetView(APIView):
@@ -349,17 +436,25 @@ class LabelDatasetView(APIView):
     Body:
       {
         "dataset_id": 123,
-        "model_slug": "mistral-7b",   # optional, default = first active OLLAMA model
+        "model_slug": "mistral-7b",   # optional, default = first active model (OLLAMA preferred)
         "limit": 500,                  # optional window (pagination)
         "offset": 0,                   # optional
         "max_rows": 2000,              # optional safety cap
-        "format": "csv" | "json"       # default csv
+        "format": "csv" | "json",      # default csv
+        "concurrency": 4,              # optional, requests in flight (capped per model)
+        "stream": false,               # optional, stream rows as they finish
+        "params": {"temperature": 0},  # optional generation params
+        "use_cache": true              # optional, false = bypass the generation cache
       }
 
     Returns:
       - CSV attachment (default) with columns:
         row_id, claim, reference, gold_label, pred_label, justification, model_slug, latency_ms
       - or JSON list if format=json
+      Rows are in row_id order. Throughput is reported in X-Label-* response headers
+      (rows, errors, concurrency, elapsed_s, rows_per_s, latency_p50_ms, latency_p95_ms).
+      With "stream": true the body is a StreamingHttpResponse emitting one CSV row
+      (or one NDJSON line for format=json) per labeled row; stats are logged instead.
     """
     MAX_ROWS_HARD_CAP = 5000  # server safety
 
@@ -378,16 +473,10 @@ class LabelDatasetView(APIView):
 
         ds = get_object_or_404(Dataset, id=dataset_id)
 
-        # Pick an OLLAMA model
-        if model_slug:
-            model = get_object_or_404(HFModel, slug=model_slug, is_active=True, backend=ModelBackend.OLLAMA)
-        else:
-            model = HFModel.objects.filter(is_active=True, backend=ModelBackend.OLLAMA).order_by("id").first()
-            if not model:
-                return Response(
-                    {"error": "no_active_model", "detail": "No active OLLAMA model available."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        # Pick the labeling model
+        model = _pick_label_model(model_slug)
+        if not model:
+            return _no_label_model()
 
         # Slice the dataset rows
         qs = DatasetRow.objects.filter(dataset=ds).order_by("id")
@@ -397,63 +486,256 @@ class LabelDatasetView(APIView):
             qs = qs[:limit]
         qs = qs[:max_rows]
 
-        prompt_tpl = (
-            "You are a binary fact checker. Given a CLAIM, decide if it is Accepted or Refuted, "
-            "and provide a BRIEF justification grounded in general knowledge.\n\n"
-            "CLAIM: {claim}\n\n"
-            "Respond in JSON ONLY with keys: label (Accepted|Refuted), justification (<= 2 sentences)."
+        concurrency = label_concurrency(model, s.validated_data.get("concurrency"))
+        params = s.validated_data.get("params") or {}
+        use_cache = s.validated_data["use_cache"]
+        filename = f"dataset_{ds.id}_labels_{model.slug}"
+
+        if s.validated_data.get("stream"):
+            # Rows go out as soon as they (and every row before them) are labeled;
+            # nothing is accumulated, so memory stays flat in dataset size.
+            stats = LabelStats(concurrency=concurrency)
+            rows = _log_label_stats(
+                iter_label_rows(
+                    model, qs.iterator(chunk_size=200), concurrency=concurrency,
+                    params=params, use_cache=use_cache, stats=stats,
+                ),
+                model, stats,
+            )
+            if out_format == "json":
+                resp = StreamingHttpResponse(_iter_ndjson(rows), content_type="application/x-ndjson")
+                resp["Content-Disposition"] = f'attachment; filename="{filename}.ndjson"'
+            else:
+                resp = StreamingHttpResponse(_iter_csv(rows, LABEL_FIELDS), content_type="text/csv; charset=utf-8")
+                resp["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+            resp["Cache-Control"] = "no-cache"
+            resp["X-Accel-Buffering"] = "no"
+            return resp
+
+        results, stats = label_rows(model, qs, concurrency=concurrency, params=params, use_cache=use_cache)
+
+        if out_format == "json":
+            return _with_label_stats(Response(results, status=200), stats)
+
+        # CSV response (default), written straight into the response body
+        resp = HttpResponse(content_type="text/csv; charset=utf-8")
+        writer = csv.DictWriter(resp, fieldnames=LABEL_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+        resp["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+        return _with_label_stats(resp, stats)
+
+class _Echo:
+    """File-like sink for csv.writer: returns each formatted line instead of buffering it."""
+    def write(self, value):
+        return value
+
+def _iter_csv(rows, fieldnames):
+    writer = csv.DictWriter(_Echo(), fieldnames=fieldnames)
+    yield writer.writeheader()
+    for r in rows:
+        yield writer.writerow(r)
+
+def _iter_json_array(rows):
+    yield "["
+    for i, r in enumerate(rows):
+        yield ("," if i else "") + json.dumps(r, ensure_ascii=False)
+    yield "]"
+
+def _iter_ndjson(rows):
+    for r in rows:
+        yield json.dumps(r, ensure_ascii=False) + "\n"
+
+def _log_label_stats(rows, model, stats):
+    """Pass rows through; log the run's throughput once the stream is exhausted."""
+    yield from rows
+    logger.info("Streamed %s labeled rows with model=%s: %s", stats.rows, model.slug, stats.as_dict())
+
+def _iter_run_results(run: LabelRun):
+    chunks = run.chunks.filter(status=LabelChunk.Status.DONE).order_by("index")
+    for chunk in chunks.iterator(chunk_size=4):
+        yield from chunk.results
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class LabelRunSubmitView(APIView):
+    """
+    POST /api/inference/label_runs/
+    Body:
+      {
+        "dataset_id": 123,
+        "model_slug": "mistral-7b",   # optional, default = first active model (OLLAMA preferred)
+        "limit": 100000,               # optional window
+        "offset": 0,                   # optional
+        "params": {...},               # optional generation params
+        "chunk_size": 200,             # optional rows per Celery task
+        "concurrency": 4,              # optional requests in flight per chunk task
+        "judge_model": "mistral:7b"    # optional: judge every justification against its reference
+      }
+
+    Returns 202 with the LabelRun; poll GET /api/inference/label_runs/<id>/ for progress.
+    With a judge_model the run has two phases: every row is labeled first, then judged, so
+    each model is loaded once rather than swapped per row.
+    """
+    def post(self, request):
+        s = LabelRunRequestSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+        ds = get_object_or_404(Dataset, id=s.validated_data["dataset_id"])
+        model = _pick_label_model(s.validated_data.get("model_slug"))
+        if not model:
+            return _no_label_model()
+
+        run = LabelRun.objects.create(
+            dataset=ds,
+            model_slug=model.slug,
+            params=s.validated_data.get("params") or {},
+            offset=s.validated_data.get("offset", 0),
+            limit=s.validated_data.get("limit"),
+            chunk_size=s.validated_data.get("chunk_size") or settings.LABEL_RUN_CHUNK_SIZE,
+            concurrency=label_concurrency(model, s.validated_data.get("concurrency")),
+            judge_model=s.validated_data.get("judge_model") or "",
+        )
+        return _dispatch_label_run(run, status.HTTP_202_ACCEPTED)
+
+
+def _dispatch_label_run(run: LabelRun, ok_status: int) -> Response:
+    try:
+        start_label_run.delay(run.id)
+    except Exception as e:
+        # Broker unreachable: keep the run so it can be resumed once Celery is back.
+        logger.exception("Could not dispatch LabelRun #%s", run.id)
+        return Response(
+            {"error": "dispatch_failed", "detail": str(e), "run": LabelRunSerializer(run).data},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
         )
+    run.refresh_from_db()
+    return Response(LabelRunSerializer(run).data, status=ok_status)
+
+
+class LabelRunDetailView(APIView):
+    """GET /api/inference/label_runs/<id>/ — status and progress"""
+    def get(self, request, pk: int):
+        run = get_object_or_404(LabelRun, pk=pk)
+        return Response(LabelRunSerializer(run).data, status=200)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class LabelRunCancelView(APIView):
+    """POST /api/inference/label_runs/<id>/cancel/ — queued chunks are skipped; running chunks finish."""
+    def post(self, request, pk: int):
+        run = get_object_or_404(LabelRun, pk=pk)
+        LabelRun.objects.filter(
+            pk=pk, status__in=[LabelRun.Status.PENDING, LabelRun.Status.RUNNING],
+        ).update(status=LabelRun.Status.CANCELLED, finished_at=timezone.now())
+        run.refresh_from_db()
+        return Response(LabelRunSerializer(run).data, status=200)
 
-        results = []
-        for row in qs:
-            claim = (row.claim or "").strip()
-            reference = (row.reference or "")
-            gold = (row.label or "")
-            pred_label = ""
-            justification = ""
-            latency_ms = ""
-
-            if claim:
-                try:
-                    prompt = prompt_tpl.format(claim=claim)
-                    result = generate_for_model(model, prompt, params={})
-                    cleaned = _clean_model_text(getattr(result, "text", "") or "")
-                    # reuse your helper from LabelClaimView:
-                    lab, jus = _extract_label_and_justification(cleaned)
-                    pred_label = lab or ""
-                    justification = (jus or "").strip().replace("\n", " ").strip('"')
-                    latency_ms = getattr(result, "latency_ms", "")
-                except Exception as e:
-                    logger.exception("Labeling failed for row=%s", row.id)
-                    justification = f"ERROR: {e}"
-
-            results.append({
-                "row_id": row.id,
-                "claim": claim,
-                "reference": reference,
-                "gold_label": gold,
-                "pred_label": pred_label,
-                "justification": justification,
-                "model_slug": model.slug,
-                "latency_ms": latency_ms,
-            })
+
+@method_decorator(csrf_exempt, name="dispatch")
+class LabelRunResumeView(APIView):
+    """POST /api/inference/label_runs/<id>/resume/ — re-dispatch chunks not checkpointed yet (e.g. after a crash)."""
+    def post(self, request, pk: int):
+        run = get_object_or_404(LabelRun, pk=pk)
+        if run.status in (LabelRun.Status.DONE, LabelRun.Status.CANCELLED):
+            return Response(
+                {"error": "not_resumable", "detail": f"Run is {run.status}."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return _dispatch_label_run(run, status.HTTP_202_ACCEPTED)
+
+
+class LabelRunDownloadView(APIView):
+    """
+    GET /api/inference/label_runs/<id>/download/?format=csv|json
+    Streams the rows of every completed chunk in row_id order (same columns as label_dataset,
+    plus the judge scores for runs with a judge_model).
+    Works on unfinished runs too; X-Label-Run-Status tells whether the file is complete.
+    """
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= picks the file type here, not a DRF renderer
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, pk: int):
+        run = get_object_or_404(LabelRun, pk=pk)
+        out_format = request.GET.get("format", "csv")
+        rows = _iter_run_results(run)
 
         if out_format == "json":
-            return Response(results, status=200)
-
-        # CSV response (default)
-        buf = io.StringIO()
-        writer = csv.DictWriter(buf, fieldnames=[
-            "row_id", "claim", "reference", "gold_label",
-            "pred_label", "justification", "model_slug", "latency_ms"
-        ])
-        writer.writeheader()
-        for r in results:
-            writer.writerow(r)
-        csv_bytes = buf.getvalue().encode("utf-8")
-        buf.close()
-
-        filename = f"dataset_{ds.id}_labels_{model.slug}.csv"
-        resp = HttpResponse(csv_bytes, content_type="text/csv; charset=utf-8")
-        resp["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return resp
\ No newline at end of file
+            resp = StreamingHttpResponse(_iter_json_array(rows), content_type="application/json")
+            ext = "json"
+        else:
+            fields = LABEL_FIELDS + JUDGE_FIELDS if run.judge_model else LABEL_FIELDS
+            resp = StreamingHttpResponse(_iter_csv(rows, fields), content_type="text/csv; charset=utf-8")
+            ext = "csv"
+        resp["Content-Disposition"] = f'attachment; filename="dataset_{run.dataset_id}_run_{run.id}_{run.model_slug}.{ext}"'
+        resp["X-Label-Run-Status"] = run.status
+        return resp
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class GenerationCacheView(APIView):
+    """
+    GET    /api/inference/cache/ — entries, hit/miss/store/eviction counters (this process) and hit rate,
+                                   plus single-flight counters (calls that shared an in-flight one)
+    DELETE /api/inference/cache/ — drop every cached generation
+    """
+    def get(self, request):
+        return Response({**generation_cache.stats(), "single_flight": single_flight.stats()}, status=200)
+
+    def delete(self, request):
+        return Response({"deleted": generation_cache.clear()}, status=200)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class LocalModelsView(APIView):
+    """
+    GET    /api/inference/local_models/               — LocalBackend models in memory (size, load time, uses) and budget
+    DELETE /api/inference/local_models/?repo_id=...   — unload one model (409 while it is generating)
+    """
+    def get(self, request):
+        return Response(local_models.stats(), status=200)
+
+    def delete(self, request):
+        repo_id = request.query_params.get("repo_id")
+        if not repo_id:
+            return Response({"error": "repo_id_required"}, status=status.HTTP_400_BAD_REQUEST)
+        if repo_id not in local_models:
+            return Response({"error": "not_loaded", "repo_id": repo_id}, status=status.HTTP_404_NOT_FOUND)
+        if not local_models.unload(repo_id):
+            return Response({"error": "in_use", "repo_id": repo_id}, status=status.HTTP_409_CONFLICT)
+        return Response(local_models.stats(), status=200)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class BackendStatusView(APIView):
+    """
+    GET /api/inference/backends/ — live routing state of the backends (this process):
+      {"ollama": {"replicas": [{"url": ..., "up": true, "outstanding": 2, "loaded": ["mistral:7b"], ...}]},
+       "hosts": {"http://localhost:11434": {"limit": 9.4, "in_flight": 3, "waiting": 0, "baseline_ms": 820.0,
+                                            "breaker": {"state": "closed", "failure_rate": 0.0, ...}, ...}},
+       "providers": [{"name": "torch", "loaded": false, "load_ms": null}, ...]}   # lazily imported libraries
+    """
+    def get(self, request):
+        return Response(
+            {"ollama": get_ollama().pool.stats(), "hosts": guard_stats(), "providers": provider_stats()},
+            status=200,
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class WarmPoolView(APIView):
+    """
+    GET  /api/inference/warm/ — last warm-up result per model (load_ms, errors)
+    POST /api/inference/warm/ — preload models now, one at a time
+      {"model_slugs": ["mistral-7b"],   # optional, default = every active Ollama/local model
+       "judge": true}                   # optional, also JUDGE_MODEL_OLLAMA (default true)
+    """
+    def get(self, request):
+        return Response(warm_pool.stats(), status=200)
+
+    def post(self, request):
+        slugs = request.data.get("model_slugs")
+        if slugs is not None and not isinstance(slugs, list):
+            return Response({"error": "model_slugs must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        results = warm_pool.preload(slugs, judge=bool(request.data.get("judge", True)))
+        return Response({"results": results}, status=200)
@@ -0,0 +1,91 @@
+# apps/inference/warm_pool.py
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+
+from django.conf import settings
+
+from apps.models_registry.models import HFModel, ModelBackend
+from .local_models import local_models
+from .router import get_ollama
+
+logger = logging.getLogger(__name__)
+
+# Backends whose weights we control; hosted/remote ones (HF endpoints, TGI, router) are not preloaded.
+WARMABLE_BACKENDS = (ModelBackend.OLLAMA, ModelBackend.LOCAL)
+
+
+class WarmPool:
+    """
+    Keeps the models we are about to use loaded, so the first request after idle (or after a
+    switch between the candidate and the judge model) does not pay the full load.
+
+    `preload()` warms the active Ollama/local HFModels and JUDGE_MODEL_OLLAMA, one at a time so
+    loads do not compete for memory. Ollama models are loaded with their keep_alive
+    (OLLAMA_KEEP_ALIVE_BY_MODEL / OLLAMA_KEEP_ALIVE). Bulk jobs call `warm()` at the start of
+    each phase instead of alternating models per row (see tasks.start_judge_phase).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last: dict[tuple[str, str], dict] = {}  # (backend, model) -> last warm-up result
+
+    def targets(self, slugs: Optional[Iterable[str]] = None, judge: bool = True) -> list[tuple[str, str]]:
+        """(backend, model name) pairs to warm: the given (or all active) warmable HFModels, plus the judge."""
+        qs = HFModel.objects.filter(is_active=True, backend__in=WARMABLE_BACKENDS)
+        if slugs is not None:
+            qs = qs.filter(slug__in=list(slugs))
+        pairs = [(m.backend, m.repo_id) for m in qs.order_by("slug")]
+        if judge:
+            pairs.append((ModelBackend.OLLAMA, getattr(settings, "JUDGE_MODEL_OLLAMA", "mistral:7b")))
+        return list(dict.fromkeys(pairs))
+
+    def warm(self, backend: str, model: str) -> dict:
+        """Load one model; failures are reported, not raised."""
+        t0 = time.time()
+        result = {"backend": backend, "model": model, "ok": True, "load_ms": None, "error": None}
+        try:
+            if backend == ModelBackend.OLLAMA:
+                result["load_ms"] = get_ollama().preload(model).load_ms
+            elif backend == ModelBackend.LOCAL:
+                with local_models.use(model) as entry:
+                    result["load_ms"] = entry.load_ms if entry.uses == 1 else 0
+            else:
+                result["ok"], result["error"] = False, f"backend {backend} is not preloadable"
+        except Exception as e:
+            logger.warning("Warm-up of %s model %s failed: %s", backend, model, e)
+            result["ok"], result["error"] = False, str(e)
+        result["elapsed_ms"] = int((time.time() - t0) * 1000)
+        result["at"] = time.time()
+        with self._lock:
+            self._last[(backend, model)] = result
+        return result
+
+    def warm_model(self, model: HFModel) -> Optional[dict]:
+        if model.backend not in WARMABLE_BACKENDS:
+            return None
+        return self.warm(model.backend, model.repo_id)
+
+    def preload(self, slugs: Optional[Iterable[str]] = None, judge: bool = True) -> list[dict]:
+        return [self.warm(backend, model) for backend, model in self.targets(slugs, judge)]
+
+    def preload_in_background(self) -> threading.Thread:
+        def run():
+            try:
+                results = self.preload()
+                logger.info("Warm pool preloaded %s/%s models", sum(r["ok"] for r in results), len(results))
+            except Exception:
+                logger.exception("Warm pool preload failed (non-fatal).")
+        thread = threading.Thread(target=run, name="warm-pool", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"models": sorted(self._last.values(), key=lambda r: r["at"], reverse=True)}
+
+
+warm_pool = WarmPool()
@@ -1,7 +1,9 @@
+import asyncio
 import json
-import math
+import time
+from apps.inference.transport import run_sync
 from .prompts import EVALUATION_PROMPT_TEMPLATE
-from .vllm_client import query_vllm_for_completion, get_top_logits_from_vllm
+from .vllm_client import aquery_vllm_for_completion, aget_top_logits_from_vllm
 
 DIMENSIONS = [
     "correctness",
@@ -25,39 +27,52 @@ def safe_parse_json(text):
     return {"error": "Model did not return valid JSON", "raw_output": text}
 
 
-def evaluate_with_vllm(model_name, candidate, reference, decoding_params):
+def dimension_prompt(dim, reference, candidate):
+    # shared context first, dimension last: the six probes for a row share their prefix
+    return f"""
+Given the following context, assign a score from 1 to 5.
+REFERENCE: {reference}
+CANDIDATE: {candidate}
+Score the **{dim}** of the CANDIDATE. Respond ONLY with a single number from 1 to 5.
+"""
+
+
+def normalize_score_tokens(top_tokens):
+    """Keep the numeric tokens 1-5 and renormalize their probabilities."""
+    numeric_tokens = [
+        t for t in top_tokens if t["token"].strip() in ["1", "2", "3", "4", "5"]
+    ]
+    s = sum(t["prob"] for t in numeric_tokens) or 1
+    return [
+        {"token": t["token"].strip(), "prob": round(t["prob"] / s, 3)}
+        for t in numeric_tokens
+    ]
+
+
+async def aevaluate_with_vllm(model_name, candidate, reference, decoding_params):
+    t0 = time.perf_counter()
+
     # 1️⃣ Format evaluation prompt
     formatted_prompt = EVALUATION_PROMPT_TEMPLATE.format(
         reference=reference,
         candidate=candidate,
     )
+    dim_prompts = [dimension_prompt(dim, reference, candidate) for dim in DIMENSIONS]
 
-    # 2️⃣ Query vLLM for the JSON scores
-    response_text = query_vllm_for_completion(model_name, formatted_prompt, decoding_params)
+    # 2️⃣ + 3️⃣ The JSON scores and the per-dimension score-token logits are independent:
+    # send the scoring call and ONE batched request with all dimension probes concurrently,
+    # two overlapping round-trips instead of seven serial ones.
+    response_text, dim_top_tokens = await asyncio.gather(
+        aquery_vllm_for_completion(model_name, formatted_prompt, decoding_params),
+        aget_top_logits_from_vllm(model_name, dim_prompts, decoding_params),
+    )
     scores = safe_parse_json(response_text)
 
-    # 3️⃣ For each dimension, query logits focused on numeric score tokens
-    dim_logits = {}
-    for dim in DIMENSIONS:
-        dim_prompt = f"""
-Given the following context, assign a score from 1 to 5 for **{dim}**.
-REFERENCE: {reference}
-CANDIDATE: {candidate}
-Respond ONLY with a single number from 1 to 5.
-"""
-        top_tokens = get_top_logits_from_vllm(model_name, dim_prompt, decoding_params)
-
-        # Filter to numeric tokens and normalize probabilities
-        numeric_tokens = [
-            t for t in top_tokens if t["token"].strip() in ["1", "2", "3", "4", "5"]
-        ]
-        s = sum(t["prob"] for t in numeric_tokens) or 1
-        normalized = [
-            {"token": t["token"].strip(), "prob": round(t["prob"] / s, 3)}
-            for t in numeric_tokens
-        ]
-
-        dim_logits[dim] = normalized
+    # Demultiplex: probe i belongs to DIMENSIONS[i] (the client raises if any probe is missing)
+    dim_logits = {
+        dim: normalize_score_tokens(top_tokens)
+        for dim, top_tokens in zip(DIMENSIONS, dim_top_tokens, strict=True)
+    }
 
     # 4️⃣ Return structured result
     result = {
@@ -67,6 +82,11 @@ Respond ONLY with a single number from 1 to 5.
             {"dimension": dim, "top_tokens": dim_logits.get(dim, [])}
             for dim in DIMENSIONS
         ],
+        "latency_ms": int((time.perf_counter() - t0) * 1000),
     }
 
     return result
+
+
+def evaluate_with_vllm(model_name, candidate, reference, decoding_params):
+    return run_sync(aevaluate_with_vllm(model_name, candidate, reference, decoding_params))
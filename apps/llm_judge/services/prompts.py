@@ -1,17 +1,13 @@
+# Rubric first, REFERENCE/CANDIDATE last: the leading part is identical for every row, so
+# vLLM's automatic prefix caching serves it from KV cache instead of recomputing it.
 EVALUATION_PROMPT_TEMPLATE = """
 You are a strict evaluator.
-Compare the CANDIDATE answer to the REFERENCE answer and assign numeric scores from 1 to 5 for each of the following metrics:
+Compare the CANDIDATE answer to the REFERENCE answer given at the end and assign numeric scores from 1 to 5 for each of the following metrics:
 correctness, relevance, proficiency, helpfulness, level_of_detail, and creativity.
 
 Return ONLY a JSON object in this exact format (no explanations, no text, no code fences):
 {{"correctness": 1-5, "relevance": 1-5, "proficiency": 1-5, "helpfulness": 1-5, "level_of_detail": 1-5, "creativity": 1-5, "overall": 1-5}}
 
-REFERENCE:
-{reference}
-
-CANDIDATE:
-{candidate}
-
 SCORING CRITERIA:
 
 1. CORRECTNESS (1–5)
@@ -68,8 +64,14 @@ Compute using this formula:
 - If correctness = 1 or relevance = 1, overall = 1.
 
 INSTRUCTIONS:
-1. Read REFERENCE and CANDIDATE carefully.
+1. Read REFERENCE and CANDIDATE below carefully.
 2. Assign scores (1–5) per metric.
 3. Compute overall using the formula.
 4. Return ONLY the JSON object above — no commentary, no text, no code fences.
+
+REFERENCE:
+{reference}
+
+CANDIDATE:
+{candidate}
 """
\ No newline at end of file
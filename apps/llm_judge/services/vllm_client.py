@@ -1,12 +1,16 @@
 import os
 import math
-import requests
+
+from apps.inference.transport import get_async_client, run_sync
 
 VLLM_API_BASE = os.getenv("VLLM_API_BASE", "http://localhost:8000/v1")
 VLLM_API_KEY = os.getenv("VLLM_API_KEY", "EMPTY")
 
+# Both calls go through the shared keep-alive pool for VLLM_API_BASE.
+# The sync functions are shims over the async ones for existing callers.
+
 # -- 1️⃣ Full completion request (to get JSON scores)
-def query_vllm_for_completion(model_name, prompt, params):
+async def aquery_vllm_for_completion(model_name, prompt, params):
     url = f"{VLLM_API_BASE}/completions"
     headers = {"Authorization": f"Bearer {VLLM_API_KEY}"}
     payload = {
@@ -18,13 +22,18 @@ def query_vllm_for_completion(model_name, prompt, params):
         "top_k": params.get("top_k", 40),
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = await get_async_client(url).post(url, headers=headers, json=payload)
     response.raise_for_status()
     data = response.json()
     return data["choices"][0]["text"].strip()
 
-# -- 2️⃣ Logits request (top token probabilities)
-def get_top_logits_from_vllm(model_name, prompt, params):
+
+def query_vllm_for_completion(model_name, prompt, params):
+    return run_sync(aquery_vllm_for_completion(model_name, prompt, params))
+
+
+# -- 2️⃣ Logits request (top token probabilities); a list of prompts is sent as one batched request
+async def aget_top_logits_from_vllm(model_name, prompt, params):
     url = f"{VLLM_API_BASE}/completions"
     headers = {"Authorization": f"Bearer {VLLM_API_KEY}"}
     payload = {
@@ -38,11 +47,27 @@ def get_top_logits_from_vllm(model_name, prompt, params):
         "echo": False,
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = await get_async_client(url).post(url, headers=headers, json=payload)
     response.raise_for_status()
     data = response.json()
 
-    logprobs = data["choices"][0]["logprobs"]["top_logprobs"][0]
+    if not isinstance(prompt, list):
+        return _top_tokens(data["choices"][0])
+
+    # A list of prompts gets one choice per prompt, tagged with the prompt's index.
+    by_index = {c.get("index"): c for c in data["choices"]}
+    missing = [i for i in range(len(prompt)) if i not in by_index]
+    if missing:
+        raise ValueError(f"vLLM returned no choice for prompt(s) {missing} of {len(prompt)}")
+    return [_top_tokens(by_index[i]) for i in range(len(prompt))]
+
+
+def _top_tokens(choice):
+    logprobs = choice["logprobs"]["top_logprobs"][0]
     tokens = [{"token": t, "prob": round(math.exp(v), 5)} for t, v in logprobs.items()]
     tokens.sort(key=lambda x: x["prob"], reverse=True)
-    return tokens[:10]
\ No newline at end of file
+    return tokens[:10]
+
+
+def get_top_logits_from_vllm(model_name, prompt, params):
+    return run_sync(aget_top_logits_from_vllm(model_name, prompt, params))
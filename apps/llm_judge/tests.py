@@ -1,3 +1,61 @@
+import json
+import math
+from unittest.mock import patch
+
+import httpx
 from django.test import TestCase
 
-# Create your tests here.
+from apps.inference import transport
+from apps.llm_judge.services.evaluator import DIMENSIONS, evaluate_with_vllm
+
+
+class FakeVllm:
+    """/v1/completions stand-in: answers a list of prompts with shuffled, index-tagged choices."""
+    def __init__(self):
+        self.requests = []
+        self.drop = set()  # prompt indexes to leave out of the response
+
+    def __call__(self, request):
+        body = json.loads(request.content)
+        self.requests.append(body)
+        if not isinstance(body["prompt"], list):
+            return httpx.Response(200, json={"choices": [{"index": 0, "text": '{"correctness": 4, "overall": 4}'}]})
+        choices = []
+        for i, prompt in enumerate(body["prompt"]):
+            if i in self.drop:
+                continue
+            dim = next(d for d in DIMENSIONS if f"**{d}**" in prompt)
+            best = str(DIMENSIONS.index(dim) % 5 + 1)  # each dimension gets its own top score
+            top = {best: math.log(0.6), "3" if best != "3" else "4": math.log(0.2), " the": math.log(0.1)}
+            choices.append({"index": i, "text": best, "logprobs": {"top_logprobs": [top]}})
+        return httpx.Response(200, json={"choices": choices[::-1]})
+
+
+class VllmEvaluatorTests(TestCase):
+    def setUp(self):
+        self.vllm = FakeVllm()
+        patcher = patch.object(
+            transport, "_new_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(self.vllm)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        transport.close_clients()
+        self.addCleanup(transport.close_clients)
+
+    def test_dimension_probes_go_out_as_one_batched_request(self):
+        result = evaluate_with_vllm("judge", "The sun orbits the Earth.", "The Earth orbits the Sun.", {"temperature": 0})
+
+        self.assertEqual(len(self.vllm.requests), 2)
+        probes = next(r for r in self.vllm.requests if isinstance(r["prompt"], list))
+        self.assertEqual((len(probes["prompt"]), probes["max_tokens"], probes["logprobs"]), (len(DIMENSIONS), 1, 10))
+        self.assertEqual(result["scores"], {"correctness": 4, "overall": 4})
+        self.assertEqual([d["dimension"] for d in result["dimensions"]], DIMENSIONS)
+        for i, d in enumerate(result["dimensions"]):
+            self.assertEqual(d["top_tokens"][0], {"token": str(i % 5 + 1), "prob": 0.75})  # demultiplexed, " the" dropped
+        self.assertIn("latency_ms", result)
+
+    def test_missing_dimension_probe_is_an_error_not_an_empty_result(self):
+        self.vllm.drop = {2}
+        with self.assertRaisesRegex(ValueError, r"no choice for prompt\(s\) \[2\] of 6"):
+            evaluate_with_vllm("judge", "The sun orbits the Earth.", "The Earth orbits the Sun.", {"temperature": 0})
@@ -1,5 +1,5 @@
 // src/api.ts - Corrected API client for Django backend
-import type { GenerationResp, MetricsResp, JudgeScores, BackendGenerationResp } from "./types";
+import type { GenerationResp, MetricsResp, MetricsBatchResp, JudgeScores, JudgeBatchResp, BackendGenerationResp } from "./types";
 import type { DatasetUploadResponse } from "./types"; 
 import type { InferenceModel, LabelDatasetRequest, LabelDatasetRowResult } from "./types";
 import type { JudgeSamplingPayload, JudgeSamplingResponse } from "./types";
@@ -259,6 +259,13 @@ export const api = {
       metrics: ["bleu", "rouge", "cosine"],
     }),
 
+  /** POST /api/evaluate/batch/ (EvaluateBatchView): many pairs in one request */
+  evaluateMetricsBatch: (items: { generation_id: number; reference: string }[]) =>
+    post<MetricsBatchResp>(join(PATHS.evaluate, "/batch/"), {
+      items,
+      metrics: ["bleu", "rouge", "cosine"],
+    }),
+
   /** Overload: accept id or generation object */
   evaluateByGeneration: async (
     genOrId: number | GenerationResp,
@@ -287,6 +294,16 @@ export const api = {
       judge_model: judge_model || undefined,
     }),
 
+  /** POST /api/evaluate/judge/batch/ (JudgeBatchView): many rows, each with its own reference */
+  judgeBatch: (
+    items: { generation_id?: number; reference: string; candidate?: string }[],
+    judge_model?: string
+  ) =>
+    post<JudgeBatchResp>(join(PATHS.evaluate, "/judge/batch/"), {
+      items,
+      judge_model: judge_model || undefined,
+    }),
+
   /** Overload: accept id or generation object; auto-fill candidate when available */
   judgeByGeneration: async (
     genOrId: number | GenerationResp,
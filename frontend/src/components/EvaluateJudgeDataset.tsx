@@ -20,61 +20,68 @@ interface Props {
   previewLimit?: number;
 }
 
+// Rows per POST /api/evaluate/judge/batch/ (server caps at JUDGE_BATCH_MAX_ITEMS); the server
+// judges each chunk concurrently, chunks keep a long dataset from running into HTTP timeouts.
+const JUDGE_CHUNK = 100;
+
 const EvaluateJudgeDataset: React.FC<Props> = ({ rows, previewLimit = 3 }) => {
   const [judgeResults, setJudgeResults] = useState<
     Record<number, JudgeScores & { error?: string }>
   >({});
   const [loading, setLoading] = useState(false);
 
-  const runJudgePreview = async () => {
-    setLoading(true);
-    const results: Record<number, JudgeScores & { error?: string }> = {};
-    const previewRows = rows.slice(0, previewLimit);
+  const failed = (error: string): JudgeScores & { error?: string } => ({
+    correctness: 0,
+    relevance: 0,
+    fluency: 0,
+    overall: 0,
+    error,
+  });
 
-    for (let i = 0; i < previewRows.length; i++) {
-      const row = previewRows[i];
+  /** Judge rows through the batch endpoint, JUDGE_CHUNK rows per request; results align with `batch`. */
+  const judgeRows = async (batch: LabelDatasetRowResult[]) => {
+    const out: (JudgeScores & { error?: string })[] = [];
+    for (let start = 0; start < batch.length; start += JUDGE_CHUNK) {
+      const chunk = batch.slice(start, start + JUDGE_CHUNK);
       try {
-        const res = await api.judge(
-          row.generation_id ?? i,
-          row.reference,
-          row.justification
+        const resp = await api.judgeBatch(
+          chunk.map((row) => ({
+            generation_id: row.generation_id ?? undefined,
+            reference: row.reference,
+            candidate: row.justification,
+          }))
         );
-        results[row.generation_id ?? i] = res;
+        const byIndex = new Map(resp.results.map((r) => [r.index, r]));
+        chunk.forEach((_, i) => {
+          const item = byIndex.get(i);
+          out.push(
+            item?.scores ? item.scores : failed(item?.error || "Judge failed")
+          );
+        });
       } catch (err: any) {
-        results[row.generation_id ?? i] = {
-          correctness: 0,
-          relevance: 0,
-          fluency: 0,
-          overall: 0,
-          error: err.message || "Judge failed",
-        };
+        chunk.forEach(() => out.push(failed(err.message || "Judge failed")));
       }
     }
+    return out;
+  };
+
+  const runJudgePreview = async () => {
+    setLoading(true);
+    const results: Record<number, JudgeScores & { error?: string }> = {};
+    const previewRows = rows.slice(0, previewLimit);
+    const scores = await judgeRows(previewRows);
+    previewRows.forEach((row, i) => {
+      results[row.generation_id ?? i] = scores[i];
+    });
     setJudgeResults(results);
     setLoading(false);
   };
 
   const downloadFull = async () => {
-    const results: (LabelDatasetRowResult & JudgeScores)[] = [];
-    for (let i = 0; i < rows.length; i++) {
-      const row = rows[i];
-      try {
-        const res = await api.judge(
-          row.generation_id ?? i,
-          row.reference,
-          row.justification
-        );
-        results.push({ ...row, ...res });
-      } catch {
-        results.push({
-          ...row,
-          correctness: 0,
-          relevance: 0,
-          fluency: 0,
-          overall: 0,
-        });
-      }
-    }
+    const scores = await judgeRows(rows);
+    const results: (LabelDatasetRowResult & JudgeScores)[] = rows.map(
+      (row, i) => ({ ...row, ...scores[i] })
+    );
 
     const header = [
       "claim",
@@ -47,6 +47,9 @@ const normalizeBleu = (v?: number) => {
   return clamp01(v); // already 0–1
 };
 
+// Rows per POST /api/evaluate/batch/, well under the server's EVALUATE_BATCH_MAX_ITEMS (5000).
+const METRICS_CHUNK = 1000;
+
 const EvaluateMetricsDataset: React.FC<Props> = ({ rows }) => {
   const [busy, setBusy] = useState(false);
   const [results, setResults] = useState<RowWithMetrics[]>([]);
@@ -55,38 +58,42 @@ const EvaluateMetricsDataset: React.FC<Props> = ({ rows }) => {
   async function evaluateJustifications() {
     setBusy(true);
     try {
-      const evaluated: RowWithMetrics[] = [];
-      for (const row of rows) {
+      // METRICS_CHUNK rows per request (the server caps at EVALUATE_BATCH_MAX_ITEMS); a failed
+      // chunk only flags its own rows. Rows without an id/reference are flagged locally.
+      const evaluable = rows.filter((row) => row.generation_id && row.reference);
+      const byRow = new Map<LabelDatasetRowResult, { metrics?: MetricsResp["metrics"]; error?: string }>();
+      for (let start = 0; start < evaluable.length; start += METRICS_CHUNK) {
+        const chunk = evaluable.slice(start, start + METRICS_CHUNK);
         try {
-          if (row.generation_id && row.reference) {
-            const resp = await api.evaluateMetrics(
-              row.generation_id,
-              row.reference
-            );
-            evaluated.push({
-              ...row,
-              metrics: resp.metrics,
-              gold_label: normalizeLabel(row.gold_label),
-              pred_label: normalizeLabel(row.pred_label),
-            });
-          } else {
-            evaluated.push({
-              ...row,
-              gold_label: normalizeLabel(row.gold_label),
-              pred_label: normalizeLabel(row.pred_label),
-              error: "Missing generation_id or reference",
-            });
-          }
-        } catch (err: any) {
-          console.error(`Failed to evaluate row ${row.row_id}`, err);
-          evaluated.push({
-            ...row,
-            gold_label: normalizeLabel(row.gold_label),
-            pred_label: normalizeLabel(row.pred_label),
-            error: err.message || "Eval failed",
-          });
+          const resp = await api.evaluateMetricsBatch(
+            chunk.map((row) => ({
+              generation_id: row.generation_id as number,
+              reference: row.reference as string,
+            }))
+          );
+          const byIndex = new Map(resp.results.map((r) => [r.index, r]));
+          chunk.forEach((row, i) =>
+            byRow.set(row, byIndex.get(i) ?? { error: "Missing from batch response" })
+          );
+        } catch (e: any) {
+          console.error("Batch evaluation chunk failed", e);
+          chunk.forEach((row) => byRow.set(row, { error: e.message || "Eval failed" }));
         }
       }
+
+      const evaluated: RowWithMetrics[] = rows.map((row) => {
+        const item = byRow.get(row);
+        return {
+          ...row,
+          gold_label: normalizeLabel(row.gold_label),
+          pred_label: normalizeLabel(row.pred_label),
+          ...(item
+            ? item.error
+              ? { error: item.error }
+              : { metrics: item.metrics }
+            : { error: "Missing generation_id or reference" }),
+        };
+      });
       setResults(evaluated);
       setError(null);
     } catch (e: any) {
@@ -21,6 +21,19 @@ export interface MetricsResp {
   };
 }
 
+export interface MetricsBatchItemResult {
+  index: number;
+  generation_id: number;
+  evaluation_id?: number;
+  metrics?: MetricsResp["metrics"];
+  error?: string;
+}
+
+export interface MetricsBatchResp {
+  results: MetricsBatchItemResult[];
+  stats: { items: number; evaluated: number; errors: number; elapsed_ms: number };
+}
+
 export interface JudgeScores {
   correctness: number;
   relevance: number;
@@ -28,6 +41,19 @@ export interface JudgeScores {
   overall: number;
 }
 
+export interface JudgeBatchItemResult {
+  index: number;
+  generation_id?: number | null;
+  evaluation_id?: number;
+  scores?: JudgeScores;
+  error?: string;
+}
+
+export interface JudgeBatchResp {
+  results: JudgeBatchItemResult[];
+  stats: { items: number; judged: number; errors: number; concurrency: number; elapsed_ms: number };
+}
+
 // Helper type for API responses that may have either format
 export interface BackendGenerationResp {
   generation_id: number;
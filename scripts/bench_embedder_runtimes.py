@@ -0,0 +1,102 @@
+"""
+Embedding runtimes (EMBEDDING_RUNTIME) vs the fp32 baseline: throughput and cosine drift.
+
+    python scripts/bench_embedder_runtimes.py --dataset 3          # claims vs references of Dataset #3
+    python scripts/bench_embedder_runtimes.py --tiny               # random offline BERT, synthetic rows
+    python scripts/bench_embedder_runtimes.py --dataset 3 --runtimes torch,int8 --max-drift 0.02
+
+Every runtime embeds the same texts, each row's claim and reference. The drift columns
+compare the runtime with "torch" (fp32). vec_cos_min is the worst cosine between a text's
+two embeddings.
+pair_drift is the absolute change of the claim/reference cosine that the metric reports,
+given as mean, p95 and max. With --max-drift the script exits 1 when any runtime's max
+pair_drift is above the limit, so a switch can be gated in CI. Runtimes that cannot load
+here (e.g. onnx without sentence-transformers[onnx]) are reported and skipped.
+"""
+import argparse, os, sys, pathlib, time
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path: sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thesis.settings")
+import django
+django.setup()
+
+import numpy as np
+from django.conf import settings
+from apps.eval.embeddings import EMBEDDING_RUNTIMES, load_model, paired_cosine
+
+
+def dataset_pairs(dataset_id: int, rows: int) -> tuple[list[str], list[str]]:
+    from apps.datasets.models import DatasetRow
+    qs = DatasetRow.objects.filter(dataset_id=dataset_id).exclude(reference="").order_by("id")[:rows]
+    pairs = [(r.claim, r.reference) for r in qs]
+    if not pairs:
+        sys.exit(f"Dataset #{dataset_id} has no rows with a reference")
+    return [c for c, _ in pairs], [r for _, r in pairs]
+
+
+def synthetic_pairs(rows: int) -> tuple[list[str], list[str]]:
+    words = lambda seed, n: " ".join(f"w{(seed * 31 + j * 7) % 500}" for j in range(n))
+    return [words(r, 12 + r % 9) for r in range(rows)], [words(r // 2 + 10_000, 20) for r in range(rows)]
+
+
+def embed(model, texts: list[str], batch_size: int) -> tuple[np.ndarray, float]:
+    model.encode(texts[:batch_size], batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False)  # warm up
+    t0 = time.perf_counter()
+    vecs = model.encode(texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(vecs, dtype=np.float32), time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = ap.add_mutually_exclusive_group()
+    source.add_argument("--dataset", type=int, help="Dataset id (claims vs references)")
+    source.add_argument("--tiny", action="store_true", help="random offline model, synthetic rows")
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--runtimes", default=",".join(EMBEDDING_RUNTIMES))
+    ap.add_argument("--max-drift", type=float, help="fail if any max pair_drift is above this")
+    args = ap.parse_args()
+
+    if args.tiny:
+        sys.path.insert(0, str(BASE_DIR / "scripts"))
+        from bench_embeddings import build_tiny_model
+        name = build_tiny_model()
+    else:
+        name = settings.EMBEDDING_MODEL
+    candidates, references = dataset_pairs(args.dataset, args.rows) if args.dataset else synthetic_pairs(args.rows)
+    texts = list(dict.fromkeys([*candidates, *references]))
+    index = {t: i for i, t in enumerate(texts)}
+    cand_idx, ref_idx = [index[c] for c in candidates], [index[r] for r in references]
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+
+    print(f"model={name} pairs={len(candidates)} texts={len(texts)} batch_size={batch_size}")
+    print(f"{'runtime':>8} {'texts/s':>9} {'speedup':>8} {'vec_cos_min':>12} {'drift_mean':>11} {'drift_p95':>10} {'drift_max':>10}")
+    baseline = None
+    failed = []
+    for runtime in [r.strip() for r in args.runtimes.split(",") if r.strip()]:
+        try:
+            vecs, elapsed = embed(load_model(name, runtime), texts, batch_size)
+        except Exception as e:
+            print(f"{runtime:>8} skipped: {e}")
+            continue
+        scores = paired_cosine(vecs[cand_idx], vecs[ref_idx])
+        rate = len(texts) / elapsed
+        if baseline is None:
+            if runtime != "torch":
+                sys.exit("list torch first: it is the baseline")
+            baseline = (vecs, scores, rate)
+            print(f"{runtime:>8} {rate:>9.1f} {1.0:>8.2f} {'-':>12} {'-':>11} {'-':>10} {'-':>10}")
+            continue
+        base_vecs, base_scores, base_rate = baseline
+        vec_cos = np.einsum("ij,ij->i", vecs, base_vecs)
+        drift = np.abs(scores - base_scores)
+        print(f"{runtime:>8} {rate:>9.1f} {rate / base_rate:>8.2f} {vec_cos.min():>12.4f} "
+              f"{drift.mean():>11.4f} {np.percentile(drift, 95):>10.4f} {drift.max():>10.4f}")
+        if args.max_drift is not None and drift.max() > args.max_drift:
+            failed.append(f"{runtime}: max drift {drift.max():.4f} > {args.max_drift}")
+    if failed:
+        sys.exit("; ".join(failed))
+
+
+if __name__ == "__main__":
+    main()
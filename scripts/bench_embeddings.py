@@ -0,0 +1,94 @@
+"""
+Cosine similarity for a dataset: per-pair encode (old compute_cosine) vs batched + cached.
+
+    python scripts/bench_embeddings.py --tiny                 # random offline BERT, no download
+    python scripts/bench_embeddings.py                        # EMBEDDING_MODEL
+    python scripts/bench_embeddings.py --rows 5000 --refs 200
+
+"per-pair" calls encode([candidate, reference]) once per row, as compute_cosine used to.
+"batched-cold" embeds each distinct text once, in EMBEDDING_BATCH_SIZE batches, into an
+empty store. "batched-warm" runs the same job again with a fresh Embedder on that store,
+as a later sweep or another worker would.
+"""
+import argparse, os, sys, pathlib, tempfile, time
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path: sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thesis.settings")
+import django
+django.setup()
+
+import numpy as np
+from django.conf import settings
+from apps.eval.embeddings import Embedder, EmbeddingStore, load_model, paired_cosine
+
+
+def build_tiny_model() -> str:
+    """Random 2-layer BERT sentence encoder saved to a temp dir (no download needed)."""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import BertConfig, BertModel, PreTrainedTokenizerFast
+
+    path = tempfile.mkdtemp(prefix="tiny-bert-")
+    vocab = {w: i for i, w in enumerate(["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + [f"w{i}" for i in range(500)])}
+    tk = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tk.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(
+        tokenizer_object=tk, unk_token="[UNK]", pad_token="[PAD]", cls_token="[CLS]", sep_token="[SEP]",
+    ).save_pretrained(path)
+    torch.manual_seed(0)
+    BertModel(BertConfig(
+        vocab_size=len(vocab), hidden_size=128, num_hidden_layers=2, num_attention_heads=4, intermediate_size=256,
+    )).save_pretrained(path)
+    return path
+
+
+def dataset(rows: int, refs: int) -> tuple[list[str], list[str]]:
+    """Justifications are all different; references repeat, as claims share gold evidence."""
+    words = lambda seed, n: " ".join(f"w{(seed * 31 + j * 7) % 500}" for j in range(n))
+    references = [words(r % refs + 10_000, 20) for r in range(rows)]
+    candidates = [words(r, 12 + r % 9) for r in range(rows)]
+    return candidates, references
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tiny", action="store_true", help="random offline model instead of EMBEDDING_MODEL")
+    ap.add_argument("--rows", type=int, default=2000)
+    ap.add_argument("--refs", type=int, default=100, help="distinct references among the rows")
+    args = ap.parse_args()
+
+    name = build_tiny_model() if args.tiny else settings.EMBEDDING_MODEL
+    model = load_model(name)
+    candidates, references = dataset(args.rows, args.refs)
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+
+    def per_pair():
+        out = []
+        for c, r in zip(candidates, references):
+            emb = model.encode([c, r], normalize_embeddings=True, show_progress_bar=False)
+            out.append(float(np.dot(emb[0], emb[1])))
+        return np.array(out)
+
+    root = tempfile.mkdtemp(prefix="emb-store-")
+
+    def batched():
+        emb = Embedder(name, store=EmbeddingStore(root, name), batch_size=batch_size)
+        vecs = emb.encode([*candidates, *references])
+        return paired_cosine(vecs[:len(candidates)], vecs[len(candidates):])
+
+    model.encode(["w1 w2"], normalize_embeddings=True)  # load weights and warm kernels
+    print(f"model={name} rows={args.rows} distinct_refs={args.refs} batch_size={batch_size}")
+    print(f"{'path':>13} {'elapsed_s':>10} {'rows/s':>10}")
+    results = {}
+    for label, fn in (("per-pair", per_pair), ("batched-cold", batched), ("batched-warm", batched)):
+        t0 = time.perf_counter()
+        results[label] = fn()
+        elapsed = time.perf_counter() - t0
+        print(f"{label:>13} {elapsed:>10.3f} {args.rows / elapsed:>10.1f}")
+    drift = float(np.max(np.abs(results["per-pair"] - results["batched-warm"])))
+    print(f"max |cosine difference| per-pair vs batched: {drift:.2e}")
+
+
+if __name__ == "__main__":
+    main()
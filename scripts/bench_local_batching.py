@@ -0,0 +1,87 @@
+"""
+Throughput of LocalBackend micro-batching at different batch sizes.
+
+    python scripts/bench_local_batching.py --model sshleifer/tiny-gpt2
+    python scripts/bench_local_batching.py --tiny          # offline: random 2-layer GPT-2
+
+Fires --requests concurrent generations per batch size (LOCAL_BATCH_MAX_SIZE) and prints
+wall time, requests/s and the mean batch size the scheduler actually formed.
+"""
+import argparse, os, sys, pathlib, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path: sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thesis.settings")
+import django
+django.setup()
+
+from django.conf import settings
+from apps.inference.backends import LocalBackend
+from apps.inference.local_models import local_models
+
+
+def build_tiny_model() -> str:
+    """Random 2-layer GPT-2 + word-level tokenizer saved to a temp dir (no download needed)."""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    path = tempfile.mkdtemp(prefix="tiny-gpt2-")
+    vocab = {w: i for i, w in enumerate(["<eos>", "[UNK]"] + [f"w{i}" for i in range(500)])}
+    tk = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tk.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tk, eos_token="<eos>", unk_token="[UNK]").save_pretrained(path)
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=len(vocab), n_positions=256, n_embd=128, n_layer=2, n_head=4,
+                        bos_token_id=0, eos_token_id=0)
+    GPT2LMHeadModel(config).save_pretrained(path)
+    return path
+
+
+def run(model: str, n_requests: int, batch_size: int, max_new_tokens: int) -> dict:
+    settings.LOCAL_BATCH_MAX_SIZE = batch_size
+    LocalBackend._batchers.clear()
+    backend = LocalBackend()
+    prompts = [" ".join(f"w{(i * 7 + j) % 500}" for j in range(8 + i % 5)) for i in range(n_requests)]
+    params = {"temperature": 0, "max_new_tokens": max_new_tokens}
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_requests) as pool:
+        list(pool.map(lambda prompt: backend.generate(model, prompt, params), prompts))
+    elapsed = time.perf_counter() - t0
+
+    batcher = LocalBackend._batchers.get(model)
+    return {
+        "batch_size": batch_size,
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(n_requests / elapsed, 2),
+        "mean_batch": batcher.mean_batch_size if batcher else 1.0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default="sshleifer/tiny-gpt2")
+    ap.add_argument("--tiny", action="store_true", help="use a random offline model instead of --model")
+    ap.add_argument("--requests", type=int, default=32)
+    ap.add_argument("--batch-sizes", default="1,2,4,8,16")
+    ap.add_argument("--max-new-tokens", type=int, default=16)
+    ap.add_argument("--window-ms", type=float, default=10)
+    args = ap.parse_args()
+
+    model = build_tiny_model() if args.tiny else args.model
+    settings.LOCAL_BATCH_WINDOW_MS = args.window_ms
+    with local_models.use(model):  # load once, outside the timings
+        pass
+    run(model, 4, 1, 2)          # warm-up
+
+    print(f"model={model} requests={args.requests} max_new_tokens={args.max_new_tokens}")
+    print(f"{'batch':>5} {'elapsed_s':>10} {'req/s':>8} {'mean_batch':>10}")
+    for size in (int(x) for x in args.batch_sizes.split(",")):
+        r = run(model, args.requests, size, args.max_new_tokens)
+        print(f"{r['batch_size']:>5} {r['elapsed_s']:>10} {r['req_per_s']:>8} {r['mean_batch']:>10}")
+
+
+if __name__ == "__main__":
+    main()
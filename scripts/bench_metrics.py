@@ -0,0 +1,76 @@
+"""
+BLEU + ROUGE throughput: a new scorer per pair vs long-lived scorers vs the metric pool.
+
+    python scripts/bench_metrics.py                       # 5000 pairs, METRICS_WORKERS processes
+    python scripts/bench_metrics.py --pairs 20000 --workers 8
+
+"per-call" builds a RougeScorer and calls sacrebleu.corpus_bleu for every pair, as
+compute_rouge/compute_bleu used to. "reused" scores in the calling thread with the module's
+long-lived scorers. "pool" shards the pairs across worker processes (metrics.score_lexical).
+The first pool run includes worker start-up, so it is reported separately from a warm run.
+"""
+import argparse, os, sys, pathlib, time
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path: sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thesis.settings")
+import django
+django.setup()
+
+import numpy as np
+import sacrebleu
+from django.conf import settings
+from rouge_score import rouge_scorer
+from apps.eval import metrics
+
+
+def pairs(n: int) -> tuple[list[str], list[str]]:
+    words = ["river", "longer", "shorter", "claim", "evidence", "supports", "refutes", "the", "is", "not",
+             "population", "capital", "founded", "century", "largest", "city", "country", "than", "was", "of"]
+    text = lambda seed, k: " ".join(words[(seed * 7 + j * 3) % len(words)] for j in range(k))
+    return [text(i, 25 + i % 15) for i in range(n)], [text(i // 3 + 1000, 30) for i in range(n)]
+
+
+def per_call(candidates, references) -> dict:
+    bleu, r1, rl = [], [], []
+    for c, r in zip(candidates, references):
+        bleu.append(sacrebleu.corpus_bleu([c], [[r]]).score / 100.0)
+        s = rouge_scorer.RougeScorer(['rouge1', 'rougeLsum'], use_stemmer=True).score(r, c)
+        r1.append(s["rouge1"].fmeasure)
+        rl.append(s["rougeLsum"].fmeasure)
+    return {"bleu": np.array(bleu), "rouge1": np.array(r1), "rougeL": np.array(rl)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pairs", type=int, default=5000)
+    ap.add_argument("--workers", type=int, default=0, help="pool size (default METRICS_WORKERS / CPU count)")
+    args = ap.parse_args()
+
+    if args.workers:
+        settings.METRICS_WORKERS = args.workers
+    settings.METRICS_POOL_MIN_PAIRS = 1
+    candidates, references = pairs(args.pairs)
+    want = ("bleu", "rouge")
+
+    runs = [
+        ("per-call", lambda: per_call(candidates, references)),
+        ("reused", lambda: metrics.lexical_scores(candidates, references, want)),
+        ("pool-cold", lambda: metrics.score_lexical(candidates, references, want)),
+        ("pool-warm", lambda: metrics.score_lexical(candidates, references, want)),
+    ]
+    print(f"pairs={args.pairs} workers={metrics.metric_workers()} cpus={os.cpu_count()}")
+    print(f"{'path':>10} {'elapsed_s':>10} {'pairs/s':>10}")
+    results = {}
+    for label, fn in runs:
+        t0 = time.perf_counter()
+        results[label] = fn()
+        elapsed = time.perf_counter() - t0
+        print(f"{label:>10} {elapsed:>10.3f} {args.pairs / elapsed:>10.1f}")
+    metrics.shutdown_metric_pool()
+    same = all(np.allclose(results["per-call"][k], results["pool-warm"][k]) for k in results["per-call"])
+    print(f"pool scores identical to per-call: {same}")
+
+
+if __name__ == "__main__":
+    main()
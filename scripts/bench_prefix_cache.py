@@ -0,0 +1,96 @@
+"""
+Prompt-processing time saved per row by prefix KV reuse (PrefixedPrompt).
+
+    python scripts/bench_prefix_cache.py --tiny                      # LocalBackend, random offline GPT-2
+    python scripts/bench_prefix_cache.py --local sshleifer/tiny-gpt2
+    python scripts/bench_prefix_cache.py --ollama mistral:7b         # label prompt against OLLAMA_BASE_URL
+    python scripts/bench_prefix_cache.py --ollama mistral:7b --template judge
+
+Each row is generated twice with max_new_tokens=1, so the time is almost all prompt
+processing. "variable-first" puts the per-row part before the fixed instructions, as the
+old templates effectively did, so nothing can be reused. "prefix-first" is the
+PrefixedPrompt layout. For Ollama the prompt_eval time is ttft_ms - load_ms from the
+backend's own timings. For LocalBackend it is the generate latency.
+"""
+import argparse, os, sys, pathlib, statistics, time
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path: sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thesis.settings")
+import django
+django.setup()
+
+from django.conf import settings
+from apps.inference.prompts import PrefixedPrompt
+
+
+def local_rows(n: int) -> tuple[str, list[str]]:
+    prefix = " ".join(f"w{i % 500}" for i in range(180)) + "\n"
+    return prefix, [" ".join(f"w{(r * 13 + j) % 500}" for j in range(4 + r % 4)) for r in range(n)]
+
+
+def template_rows(template: str, n: int) -> tuple[str, list[str]]:
+    claims = [f"Claim number {r}: the river Nile is longer than {4000 + r * 17} km." for r in range(n)]
+    if template == "judge":
+        from apps.eval.judge import PROMPT_PREFIX, PROMPT_SUFFIX
+        return PROMPT_PREFIX, [PROMPT_SUFFIX.format(reference=c, candidate=c.replace("longer", "shorter")) for c in claims]
+    from apps.inference.labeling import LABEL_PROMPT_PREFIX, LABEL_PROMPT_SUFFIX
+    return LABEL_PROMPT_PREFIX, [LABEL_PROMPT_SUFFIX.format(claim=c) for c in claims]
+
+
+def measure(generate, prompts: list[str]) -> list[float]:
+    out = []
+    for prompt in prompts:
+        t0 = time.perf_counter()
+        result = generate(prompt)
+        wall_ms = (time.perf_counter() - t0) * 1000
+        if result.ttft_ms is not None:  # backend reported its prompt phase
+            out.append(result.ttft_ms - (result.load_ms or 0))
+        else:
+            out.append(wall_ms)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = ap.add_mutually_exclusive_group(required=True)
+    target.add_argument("--tiny", action="store_true", help="LocalBackend with a random offline model")
+    target.add_argument("--local", metavar="REPO_ID", help="LocalBackend with this Transformers model")
+    target.add_argument("--ollama", metavar="MODEL", help="Ollama model at OLLAMA_BASE_URL")
+    ap.add_argument("--template", choices=("label", "judge"), default="label", help="prompt for --ollama")
+    ap.add_argument("--rows", type=int, default=20)
+    args = ap.parse_args()
+
+    params = {"temperature": 0, "max_new_tokens": 1}
+    if args.ollama:
+        from apps.inference.router import get_ollama
+        backend, model = get_ollama(), args.ollama
+        prefix, suffixes = template_rows(args.template, args.rows)
+    else:
+        from apps.inference.backends import LocalBackend
+        settings.LOCAL_BATCH_MAX_SIZE = 1  # one row per call, so timings are per row
+        backend = LocalBackend()
+        if args.tiny:
+            sys.path.insert(0, str(BASE_DIR / "scripts"))
+            from bench_local_batching import build_tiny_model
+            model = build_tiny_model()
+            prefix, suffixes = local_rows(args.rows)
+        else:
+            model = args.local
+            prefix, suffixes = template_rows("label", args.rows)
+    generate = lambda prompt: backend.generate(model, prompt, params)
+    generate(PrefixedPrompt(prefix, suffixes[0]))  # load the model and warm the prefix
+
+    variable_first = measure(generate, [s + "\n" + prefix for s in suffixes])
+    prefix_first = measure(generate, [PrefixedPrompt(prefix, s) for s in suffixes])
+
+    base, reused = statistics.mean(variable_first), statistics.mean(prefix_first)
+    print(f"model={model} rows={args.rows} prefix_chars={len(prefix)}")
+    print(f"{'layout':>15} {'prompt_ms/row':>14} {'p50':>8}")
+    print(f"{'variable-first':>15} {base:>14.1f} {statistics.median(variable_first):>8.1f}")
+    print(f"{'prefix-first':>15} {reused:>14.1f} {statistics.median(prefix_first):>8.1f}")
+    print(f"saved per row: {base - reused:.1f} ms ({(1 - reused / base) * 100 if base else 0:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Cold-start cost of the Django project: time-to-ready and peak RSS of fresh processes.
+
+    python scripts/bench_startup.py                      # manage.py check + first request, 3 runs each
+    python scripts/bench_startup.py --eager              # same, with the ML libraries imported up front
+    python scripts/bench_startup.py --max-ms 3000 --max-rss-mb 300   # exit 1 past a budget (CI)
+
+"check" runs `manage.py check`. "first-request" starts Python, runs django.setup(), and
+serves GET /api/inference/local_models/ through the test client, which loads the whole URL
+conf (every app's views). Each process is timed from spawn to exit, and its peak RSS comes
+from wait4(). The "heavy" column lists the ML libraries that ended up imported, so a
+module-level `import torch` in a new module shows up here. --eager imports them first,
+which is how every process started before they moved behind apps.inference.providers.
+"""
+import argparse, os, sys, pathlib, statistics, subprocess, time
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+HEAVY = ("torch", "transformers", "sentence_transformers", "rouge_score", "sacrebleu", "nltk")
+EAGER = "import sentence_transformers, rouge_score.rouge_scorer, sacrebleu; "
+
+FIRST_REQUEST = (
+    "import os, sys; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thesis.settings'); "
+    "{eager}import django; django.setup(); "
+    "from django.test import Client; "
+    "r = Client(HTTP_HOST='localhost').get('/api/inference/local_models/'); assert r.status_code == 200, r.status_code; "
+    "print('heavy=' + ','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+CHECK = (
+    "import os, sys; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thesis.settings'); "
+    "{eager}from django.core.management import execute_from_command_line; "
+    "execute_from_command_line(['manage.py', 'check']); "
+    "print('heavy=' + ','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+
+
+def run_once(code: str) -> tuple[float, float, str]:
+    """(wall ms, peak RSS MB, heavy modules) of one fresh interpreter running `code`."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    out, err = proc.stdout.read().decode(), proc.stderr.read().decode()
+    exit_code = os.waitstatus_to_exitcode(status)
+    if exit_code != 0:
+        sys.exit(f"child failed ({exit_code}):\n{err}")
+    heavy = next((line[6:] for line in out.splitlines() if line.startswith("heavy=")), "")
+    return wall_ms, usage.ru_maxrss / 1024, heavy  # ru_maxrss is KiB on Linux
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--eager", action="store_true", help="import the ML libraries up front (the old behaviour)")
+    ap.add_argument("--max-ms", type=float, help="fail if a median time-to-ready is above this")
+    ap.add_argument("--max-rss-mb", type=float, help="fail if a median peak RSS is above this")
+    args = ap.parse_args()
+
+    eager = EAGER if args.eager else ""
+    over = []
+    print(f"{'phase':>14} {'ready_ms':>9} {'rss_mb':>8}  heavy")
+    for phase, template in (("check", CHECK), ("first-request", FIRST_REQUEST)):
+        runs = [run_once(template.format(eager=eager, heavy=HEAVY)) for _ in range(args.runs)]
+        ms = statistics.median(r[0] for r in runs)
+        rss = statistics.median(r[1] for r in runs)
+        print(f"{phase:>14} {ms:>9.0f} {rss:>8.1f}  {runs[-1][2] or '-'}")
+        if args.max_ms is not None and ms > args.max_ms:
+            over.append(f"{phase}: {ms:.0f} ms > {args.max_ms:.0f} ms")
+        if args.max_rss_mb is not None and rss > args.max_rss_mb:
+            over.append(f"{phase}: {rss:.1f} MB > {args.max_rss_mb:.1f} MB")
+    if over:
+        sys.exit("over budget: " + "; ".join(over))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Latency of one vLLM judge evaluation: seven serial round-trips vs scoring + one batched probe request.
+
+    python scripts/bench_vllm_judge.py                              # simulated vLLM, 80 ms per request
+    python scripts/bench_vllm_judge.py --simulate-ms 300 --per-prompt-ms 10
+    python scripts/bench_vllm_judge.py --live --model facebook/opt-125m   # real server at VLLM_API_BASE
+
+"sequential" is the old evaluate_with_vllm: the JSON-scores completion, then one
+get_top_logits_from_vllm call per DIMENSIONS entry, each waiting for the previous one.
+"batched" is the current evaluate_with_vllm: the scoring call and one /v1/completions
+request carrying all dimension probes run concurrently. The simulated server answers
+after --simulate-ms, plus --per-prompt-ms for each extra prompt in a batch, so both
+paths pay the same per-prompt cost and only the round-trips differ.
+"""
+import argparse, asyncio, json, math, os, sys, pathlib, statistics, time
+from unittest.mock import patch
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path: sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thesis.settings")
+import django
+django.setup()
+
+import httpx
+from apps.inference import transport
+from apps.llm_judge.services.evaluator import (
+    DIMENSIONS, dimension_prompt, evaluate_with_vllm, normalize_score_tokens, safe_parse_json,
+)
+from apps.llm_judge.services.prompts import EVALUATION_PROMPT_TEMPLATE
+from apps.llm_judge.services.vllm_client import get_top_logits_from_vllm, query_vllm_for_completion
+
+
+def sequential(model_name, candidate, reference, params) -> dict:
+    scores = safe_parse_json(query_vllm_for_completion(
+        model_name, EVALUATION_PROMPT_TEMPLATE.format(reference=reference, candidate=candidate), params,
+    ))
+    return {"scores": scores, "dimensions": [
+        {"dimension": dim, "top_tokens": normalize_score_tokens(
+            get_top_logits_from_vllm(model_name, dimension_prompt(dim, reference, candidate), params))}
+        for dim in DIMENSIONS
+    ]}
+
+
+def simulated_vllm(latency_ms: float, per_prompt_ms: float, counter: list):
+    async def handler(request):
+        body = json.loads(request.content)
+        prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+        counter[0] += 1
+        await asyncio.sleep((latency_ms + per_prompt_ms * (len(prompts) - 1)) / 1000)
+        if body["max_tokens"] > 1:
+            return httpx.Response(200, json={"choices": [{"index": 0, "text": '{"correctness": 4, "overall": 4}'}]})
+        top = {"4": math.log(0.7), "3": math.log(0.2), " the": math.log(0.1)}
+        return httpx.Response(200, json={"choices": [
+            {"index": i, "text": "4", "logprobs": {"top_logprobs": [top]}} for i in range(len(prompts))
+        ]})
+    return handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20)
+    ap.add_argument("--model", default="facebook/opt-125m")
+    ap.add_argument("--live", action="store_true", help="use the vLLM server at VLLM_API_BASE")
+    ap.add_argument("--simulate-ms", type=float, default=80.0, help="simulated latency per request")
+    ap.add_argument("--per-prompt-ms", type=float, default=5.0, help="simulated cost of each extra batched prompt")
+    args = ap.parse_args()
+
+    requests = [0]
+    if not args.live:
+        handler = simulated_vllm(args.simulate_ms, args.per_prompt_ms, requests)
+        patch.object(transport, "_new_async_client",
+                     side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler))).start()
+
+    rows = [(f"Claim {r}: the Nile is shorter than {4000 + r * 17} km.", f"Claim {r}: the Nile is longer than {4000 + r * 17} km.")
+            for r in range(args.rows)]
+    params = {"temperature": 0.0, "top_p": 1.0, "top_k": 1}
+    print(f"rows={args.rows} target={'live ' + args.model if args.live else f'simulated {args.simulate_ms:.0f} ms/request'}")
+    print(f"{'path':>10} {'p50_ms':>8} {'mean_ms':>8} {'requests/row':>13}")
+    results = {}
+    for label, fn in (("sequential", sequential), ("batched", evaluate_with_vllm)):
+        fn(args.model, *rows[0], params)  # warm the connection pool
+        requests[0], times, out = 0, [], []
+        for candidate, reference in rows:
+            t0 = time.perf_counter()
+            out.append(fn(args.model, candidate, reference, params))
+            times.append((time.perf_counter() - t0) * 1000)
+        results[label] = out
+        per_row = f"{requests[0] / len(rows):.0f}" if not args.live else "-"
+        print(f"{label:>10} {statistics.median(times):>8.0f} {statistics.mean(times):>8.0f} {per_row:>13}")
+    same = all(a["dimensions"] == b["dimensions"] for a, b in zip(results["sequential"], results["batched"]))
+    print(f"per-dimension results identical: {same}")
+    transport.close_clients()
+
+
+if __name__ == "__main__":
+    main()
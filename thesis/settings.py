@@ -15,12 +15,73 @@ import os
 
 HUGGINGFACE_TOKEN = os.getenv("HUGGINGFACE_TOKEN","") or os.getenv("HF_TOKEN","")
 HF_ROUTER_BASE_URL = os.getenv("HF_ROUTER_BASE_URL","https://router.huggingface.co/v1")
+# One URL, or several comma-separated Ollama replicas to balance across.
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_HEALTH_INTERVAL_SECS = float(os.getenv("OLLAMA_HEALTH_INTERVAL_SECS", "10"))  # /api/tags + /api/ps probes
+OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "3"))
+OLLAMA_EJECT_SECS = float(os.getenv("OLLAMA_EJECT_SECS", "30"))
+OLLAMA_COLD_PENALTY = int(os.getenv("OLLAMA_COLD_PENALTY", "4"))  # outstanding requests a warm replica may carry before a cold one wins
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps a model (and its prompt cache) loaded; "" = server default
+# Per-model overrides, keyed by Ollama model name, e.g. {"mistral:7b": "-1"} (never unload the judge).
+OLLAMA_KEEP_ALIVE_BY_MODEL = {}
+# Warm pool: preload active Ollama/local HFModels and JUDGE_MODEL_OLLAMA when the server starts
+# (also: `manage.py warm_models`, POST /api/inference/warm/).
+WARM_POOL_ON_STARTUP = os.getenv("WARM_POOL_ON_STARTUP", "0") == "1"
 DEFAULT_MAX_NEW_TOKENS = int(os.getenv("DEFAULT_MAX_NEW_TOKENS","256"))
 ABSOLUTE_MAX_NEW_TOKENS = 1024
 REQUEST_TIMEOUT_SECS = 120
 STREAM_TIMEOUT_SECS = 300
 
+# Keep-alive pools shared by the inference backends and the vLLM judge client (one per origin).
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECS", "30"))
+
+# Per-host guard on those pools: AIMD concurrency limit driven by latency and errors,
+# plus a circuit breaker that fails fast while a host is unhealthy.
+HOST_GUARD_ENABLED = os.getenv("HOST_GUARD_ENABLED", "1") == "1"
+HOST_CONCURRENCY_INITIAL = int(os.getenv("HOST_CONCURRENCY_INITIAL", "8"))
+HOST_CONCURRENCY_MIN = int(os.getenv("HOST_CONCURRENCY_MIN", "1"))
+HOST_CONCURRENCY_MAX = int(os.getenv("HOST_CONCURRENCY_MAX", "64"))
+HOST_LATENCY_TOLERANCE = float(os.getenv("HOST_LATENCY_TOLERANCE", "3.0"))  # x baseline latency before backing off
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_COOLDOWN_SECS = float(os.getenv("BREAKER_COOLDOWN_SECS", "30"))
+
+# LocalBackend micro-batching: concurrent prompts for one model arriving within the window
+# share a single generate() call (1 disables batching).
+LOCAL_BATCH_MAX_SIZE = int(os.getenv("LOCAL_BATCH_MAX_SIZE", "8"))
+LOCAL_BATCH_WINDOW_MS = float(os.getenv("LOCAL_BATCH_WINDOW_MS", "10"))
+# Memory budget for LocalBackend models (LRU-evicted past it); 0 = 60% of physical RAM.
+LOCAL_MODEL_MEMORY_BUDGET_MB = int(os.getenv("LOCAL_MODEL_MEMORY_BUDGET_MB", "0"))
+# KV state of PrefixedPrompt prefixes kept per local model (LRU).
+LOCAL_PREFIX_CACHE_SIZE = int(os.getenv("LOCAL_PREFIX_CACHE_SIZE", "8"))
+
+# POST /api/inference/generate/batch/: items per request and backend calls in flight per request.
+GENERATE_BATCH_MAX_ITEMS = int(os.getenv("GENERATE_BATCH_MAX_ITEMS", "500"))
+GENERATE_BATCH_CONCURRENCY = int(os.getenv("GENERATE_BATCH_CONCURRENCY", "4"))
+GENERATE_BATCH_MAX_CONCURRENCY = int(os.getenv("GENERATE_BATCH_MAX_CONCURRENCY", "16"))
+
+# Dataset labeling worker pool (requests kept in flight per run).
+# Per-model caps are keyed by HFModel.slug, e.g. {"mistral-7b": 2}.
+LABEL_CONCURRENCY = int(os.getenv("LABEL_CONCURRENCY", "4"))
+LABEL_MAX_CONCURRENCY = int(os.getenv("LABEL_MAX_CONCURRENCY", "16"))
+LABEL_MODEL_CONCURRENCY = {}
+
+# Persistent cache for deterministic (temperature 0 or seeded) generations.
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "1") == "1"
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "50000"))
+GENERATION_CACHE_TTL_SECS = int(os.getenv("GENERATION_CACHE_TTL_SECS", str(7 * 24 * 3600)))
+
+# Single-flight: identical in-flight generations share one backend call. Cross-process
+# coalescing takes a lock in the Django cache, so it needs a shared one (REDIS_CACHE_URL).
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+SINGLE_FLIGHT_CROSS_PROCESS = os.getenv("SINGLE_FLIGHT_CROSS_PROCESS", "0") == "1"
+SINGLE_FLIGHT_CACHE = "default"
+if os.getenv("REDIS_CACHE_URL"):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": os.getenv("REDIS_CACHE_URL")}}
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -100,6 +161,34 @@ REST_FRAMEWORK = {
 }
 # LLM-as-Judge (Ollama)
 JUDGE_MODEL_OLLAMA = "mistral:7b"  # override via env if you like
+# Judge calls in flight for bulk judging (POST /api/evaluate/judge/batch/ and rejudge/, manage.py batch_judge).
+JUDGE_CONCURRENCY = int(os.getenv("JUDGE_CONCURRENCY", "4"))
+JUDGE_MAX_CONCURRENCY = int(os.getenv("JUDGE_MAX_CONCURRENCY", "16"))
+# Most (candidate, reference) pairs accepted by POST /api/evaluate/judge/batch/
+JUDGE_BATCH_MAX_ITEMS = int(os.getenv("JUDGE_BATCH_MAX_ITEMS", "1000"))
+
+# POST /api/evaluate/batch/: (generation_id, reference) pairs per request.
+EVALUATE_BATCH_MAX_ITEMS = int(os.getenv("EVALUATE_BATCH_MAX_ITEMS", "5000"))
+
+# BLEU/ROUGE worker processes for large metric jobs (0 = one per CPU, 1 = score in-process).
+METRICS_WORKERS = int(os.getenv("METRICS_WORKERS", "0"))
+METRICS_POOL_MIN_PAIRS = int(os.getenv("METRICS_POOL_MIN_PAIRS", "500"))
+
+# Sentence embeddings for cosine: texts are encoded in batches and cached on disk by
+# (model, text hash) in a memory-mapped store; an empty EMBEDDING_CACHE_DIR keeps no store.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "embeddings"))
+# torch (fp32), int8 (dynamic quantization, CPU) or onnx (needs sentence-transformers[onnx]);
+# check drift first with scripts/bench_embedder_runtimes.py.
+EMBEDDING_RUNTIME = os.getenv("EMBEDDING_RUNTIME", "torch")
+# Optional shared embedding process (`manage.py embedding_server`), so a host holds one model copy
+# instead of one per worker: "unix:///tmp/embeddings.sock" or "http://127.0.0.1:8765". Empty = in-process.
+EMBEDDING_SERVER_URL = os.getenv("EMBEDDING_SERVER_URL", "")
+EMBEDDING_SERVER_TIMEOUT_SECS = float(os.getenv("EMBEDDING_SERVER_TIMEOUT_SECS", "30"))
+EMBEDDING_SERVER_RETRY_SECS = float(os.getenv("EMBEDDING_SERVER_RETRY_SECS", "30"))  # skip it this long after a failure
+EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", "256"))    # texts per encode, across clients
+EMBEDDING_SERVER_WINDOW_MS = float(os.getenv("EMBEDDING_SERVER_WINDOW_MS", "5"))
 
 TEMPLATES = [
     {
@@ -173,3 +262,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_RESULT_BACKEND = "redis://redis:6379/0"
+# Label runs: long tasks are acked after they finish so a crashed worker's chunk is redelivered.
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+LABEL_RUN_CHUNK_SIZE = int(os.getenv("LABEL_RUN_CHUNK_SIZE", "200"))
+# A chunk whose worker has not checked in for this long is presumed dead and may be re-dispatched on resume.
+LABEL_CHUNK_STALE_SECS = int(os.getenv("LABEL_CHUNK_STALE_SECS", "300"))